@@ -1,40 +1,91 @@
 # agents/base_agent.py
 import json
-import ollama
+import time
 import logging
-from typing import Dict, List, Callable, Any
-from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Callable, Any, Optional, Tuple, Union
+from urllib.parse import urlparse
+from agents.errors import (AgentError, ModelError, ToolExecutionError, CircuitOpenError,
+                           DeadlineExceededError, StructuredOutputError)
+from agents.messages import Message, Conversation
+from agents.recording import record_chat, record_model_call, record_tool_call
+from agents.resilience import Deadline, ResiliencePolicy, is_transient
+from agents.schema import compile_schema, parse_json
+from agents.tool_cache import DEFAULT_POLICIES, CachePolicy, ToolCache
+from agents.usage import record_tool_usage, record_usage
+from utils.lazy import lazy_import
+
+ollama = lazy_import("ollama")
 
 logger = logging.getLogger(__name__)
 
-@dataclass
-class ResponseMessage:
-    role: str
-    content: str
+# Kept for backwards compatibility; messages are now slotted Message objects
+ResponseMessage = Message
+
+# Shared across requests instead of one copy per conversation
+SYSTEM_MESSAGE = Message("system", "You are a helpful assistant.")
+
+REPAIR_MESSAGE = Message("system", "You correct invalid JSON. Reply with JSON only, matching the given schema.")
+
+# Tools are called with keyword arguments, so anything else goes back to the model
+NOT_AN_OBJECT = "arguments must be a JSON object"
 
 class BaseAgent:
-    def __init__(self, model_name: str = "qwen3:30b"):
+    def __init__(self, model_name: str = "qwen3:30b", client: Any = None,
+                 policy: Optional[ResiliencePolicy] = None, structured_output: Optional[bool] = None,
+                 answer_schema: Optional[Dict] = None, repair_attempts: Optional[int] = None):
         """
         Initialize the base agent with a specified model
         
         Args:
             model_name: Ollama model to use for responses
+            client: Object with an ollama-compatible chat() method
+                    (defaults to an ollama.Client using the policy's model timeout)
+            policy: Deadlines, retries and circuit breaker settings
+                    (defaults to AgentConfig.from_env())
+            structured_output: Validate tool arguments (and answers, given an
+                               answer_schema) and repair invalid ones with a
+                               schema-constrained retry (default AgentConfig)
+            answer_schema: JSON schema final answers must match in structured mode;
+                           passed to Ollama as `format`
+            repair_attempts: Repair retries per invalid output (default AgentConfig)
         """
+        if policy is None or structured_output is None or repair_attempts is None:
+            # Imported here: config.settings imports agents that subclass BaseAgent
+            from config.settings import AgentConfig
+            config = AgentConfig.from_env()
+            policy = policy or ResiliencePolicy.from_config(config)
+            structured_output = config.structured_output if structured_output is None else structured_output
+            repair_attempts = config.structured_repair_attempts if repair_attempts is None else repair_attempts
         self.model_name = model_name
+        self.client = client
+        self.policy = policy
+        self.structured_output = structured_output
+        self.answer_schema = answer_schema
+        self.repair_attempts = repair_attempts
+        self._answer_validator = compile_schema(answer_schema) if answer_schema else None
         self.tools = {}
         self.tool_schemas = []
+        self._validators: Dict[str, Callable[[Any], List[str]]] = {}
+        self.tool_cache = ToolCache()
         
-    def register_tool(self, schema: Dict, function: Callable):
+    def register_tool(self, schema: Dict, function: Callable, cache: Optional[CachePolicy] = None):
         """
         Register a function as an available tool
         
+        Results are memoized according to the tool's cache policy; tools
+        without a policy in DEFAULT_POLICIES are always executed. The
+        parameter schema is compiled once for argument validation.
+        
         Args:
             schema: OpenAI-compatible function schema
             function: Python function to execute when tool is called
+            cache: Cache policy (defaults to DEFAULT_POLICIES for the tool name)
         """
         tool_name = schema["function"]["name"]
-        self.tools[tool_name] = function
+        policy = cache or DEFAULT_POLICIES.get(tool_name, CachePolicy())
+        self.tools[tool_name] = self.tool_cache.wrap(tool_name, function, policy)
         self.tool_schemas.append(schema)
+        self._validators[tool_name] = compile_schema(schema["function"].get("parameters"))
         
     def chat(self, message: str) -> str:
         """
@@ -45,69 +96,290 @@ class BaseAgent:
             
         Returns:
             Agent's response after processing tools if needed
+            
+        Raises:
+            AgentError: ModelError, ToolExecutionError, DeadlineExceededError,
+                        CircuitOpenError or StructuredOutputError when the request fails
+        """
+        deadline = Deadline(self.policy.request_deadline)
+        with record_chat(message, type(self).__name__) as recording:
+            try:
+                return recording.done(self._respond(message, deadline))
+            except AgentError as e:
+                logger.warning("Error processing request in BaseAgent.chat: %s", e)
+                raise
+            except Exception as e:
+                logger.exception("Error processing request in BaseAgent.chat")
+                raise AgentError(f"Error processing request: {str(e)}") from e
+            
+    def _respond(self, message: str, deadline: Deadline, model_name: Optional[str] = None) -> str:
         """
-        system_message = ResponseMessage("system", "You are a helpful assistant.")
-        user_message = ResponseMessage("user", f"Answer this question: {message}")
+        Answer a message, running a tool-call round if the model asks for one
+        
+        Args:
+            message: User input message
+            deadline: Request deadline
+            model_name: Model to use instead of self.model_name
+            
+        Returns:
+            Final answer, validated in structured mode
+        """
+        # Initial response from model; a `format` schema would stop it
+        # from calling tools, so it is only sent to tool-less agents
+        conversation = self._new_conversation(message)
+        response = self._generate(conversation, model_name, deadline=deadline,
+                                  format=None if self.tools else self._answer_format())
+        
+        # Check if model wants to call tools
+        if response["message"].get("tool_calls"):
+            return self._handle_tool_calls(conversation, response, deadline, model_name)
+        return self._checked_answer(response, message, deadline, model_name)
+            
+    def _new_conversation(self, message: str) -> Conversation:
+        """Start a conversation for a single user message"""
+        return Conversation([SYSTEM_MESSAGE, Message("user", f"Answer this question: {message}")])
+            
+    def _model_client(self) -> Any:
+        """
+        Client used for model calls, created on first use
 
-        try:
-            # Initial response from model
-            response = ollama.chat(
-                model=self.model_name,
-                messages=[system_message.__dict__, 
-                          user_message.__dict__],
-                #tools=self.tool_schemas
-            )
+        A HedgedClient when HEDGE_ENABLED is set, otherwise an ollama.Client;
+        either uses the policy's model timeout, cut short by the request deadline.
+        """
+        if self.client is None:
+            from config.settings import AgentConfig
+            config = AgentConfig.from_env()
+            if config.hedge_enabled:
+                from agents.hedging import HedgedClient
+                self.client = HedgedClient.from_config(config, timeout=self.policy.model_timeout)
+            else:
+                from agents.clients import ollama_client
+                self.client = ollama_client(timeout=self.policy.model_timeout)
+        return self.client
             
-            # Check if model wants to call tools
-            #if response.get("message", {}).get("tool_calls"):
-            #    return self._handle_tool_calls(message, response)
-            #else:
-            #    return response["message"]["content"]
-                
-        except Exception as e:
-            logger.exception("Error processing request in BaseAgent.chat")
-            return f"Error processing request: {str(e)}"
+    def _generate(self, message: Union[str, Conversation], model_name: Optional[str] = None,
+                  use_tools: bool = True, deadline: Optional[Deadline] = None,
+                  format: Optional[Dict] = None) -> Dict:
+        """
+        Send a prompt or conversation to the model and return the raw response
+        
+        Transient failures are retried with jittered backoff within the
+        request deadline; each model has its own circuit breaker.
+        
+        Args:
+            message: User input message or an existing conversation
+            model_name: Model to use instead of self.model_name
+            use_tools: Offer the registered tools to the model
+            deadline: Request deadline (a fresh one is started if omitted)
+            format: JSON schema the reply must follow (Ollama structured outputs)
             
-    def _handle_tool_calls(self, original_message: str, response: Dict) -> str:
+        Returns:
+            Raw Ollama chat response (includes token counts and durations)
+        """
+        conversation = message if isinstance(message, Conversation) else self._new_conversation(message)
+        model = model_name or self.model_name
+        deadline = deadline or Deadline(self.policy.request_deadline)
+        extra = {"format": format} if format else {}
+
+        client = self._model_client()
+        start = time.perf_counter()
+        response = self.policy.call(
+            lambda: client.chat(
+                model=model,
+                messages=conversation.as_dicts(),
+                tools=(self.tool_schemas or None) if use_tools else None,
+                **extra
+            ),
+            key=f"model:{model}",
+            deadline=deadline,
+            error_cls=ModelError
+        )
+        seconds = time.perf_counter() - start
+        record_usage(response, seconds)
+        record_model_call(model, seconds, response)
+        return response
+            
+    def _handle_tool_calls(self, conversation: Conversation, response: Dict,
+                           deadline: Optional[Deadline] = None, model_name: Optional[str] = None) -> str:
         """
         Execute tool calls and return final response
         
         Args:
-            original_message: Original user message
+            conversation: Conversation so far (tool results are appended in place)
             response: Model response containing tool calls
+            deadline: Request deadline
+            model_name: Model to use instead of self.model_name
             
         Returns:
             Final response after executing tools
         """
-        messages = [
-            {"role": "user", "content": original_message},
-            response["message"]
-        ]
+        deadline = deadline or Deadline(self.policy.request_deadline)
+        assistant_message = conversation.append(Message.from_response(response["message"]))
         
         # Execute each tool call
-        for tool_call in response["message"]["tool_calls"]:
+        for tool_call in assistant_message.tool_calls:
             function_name = tool_call["function"]["name"]
-            function_args = json.loads(tool_call["function"]["arguments"])
             
             if function_name in self.tools:
-                # Execute the function
-                try:
-                    result = self.tools[function_name](**function_args)
-                except Exception:
-                    logger.exception("Tool %s failed", function_name)
-                    result = f"Error executing tool {function_name}"
+                function_args, problems = self._tool_arguments(
+                    function_name, tool_call["function"]["arguments"], conversation, deadline, model_name)
+                # Execute the function; failures are reported back to the model
+                if problems:
+                    result = f"Error: invalid arguments for {function_name}: {'; '.join(problems)}"
+                else:
+                    try:
+                        result = self._run_tool(function_name, function_args, deadline)
+                    except CircuitOpenError as e:
+                        result = f"Tool {function_name} is temporarily unavailable: {e}"
+                    except ToolExecutionError:
+                        logger.exception("Tool %s failed", function_name)
+                        result = f"Error executing tool {function_name}"
                 
                 # Add tool result to conversation
-                messages.append({
-                    "role": "tool",
-                    "content": str(result),
-                    "tool_call_id": tool_call.get("id", "")
-                })
+                conversation.add("tool", str(result), tool_name=function_name)
         
         # Get final response from model
-        final_response = ollama.chat(
-            model=self.model_name,
-            messages=messages
-        )
+        final_response = self._generate(conversation, model_name, use_tools=False, deadline=deadline,
+                                        format=self._answer_format())
+        
+        return self._checked_answer(final_response, conversation, deadline, model_name)
+
+    def _answer_format(self) -> Optional[Dict]:
+        return self.answer_schema if self.structured_output else None
+
+    def _tool_arguments(self, name: str, arguments: Any, conversation: Conversation,
+                        deadline: Deadline, model_name: Optional[str] = None) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Decode and validate a tool call's arguments, repairing them in structured mode
+
+        Without structured output only malformed JSON and non-object
+        arguments are caught; the model then sees the error as the tool
+        result instead of the round failing.
+
+        Returns:
+            (arguments, problems); problems is empty when the arguments can be used
+        """
+        if arguments is None:
+            arguments = {}
+        if not self.structured_output:
+            try:
+                args = json.loads(arguments) if isinstance(arguments, str) else arguments
+            except ValueError as e:
+                return None, [f"not valid JSON ({e})"]
+            if not isinstance(args, dict):
+                return None, [NOT_AN_OBJECT]
+            return args, []
+
+        validator = self._validators[name]
+        args, problems = parse_json(arguments, validator)
+        if not problems and not isinstance(args, dict):
+            problems = [NOT_AN_OBJECT]
+        if problems:
+            logger.warning("Invalid arguments for %s: %s", name, "; ".join(problems))
+            schema = next(s["function"] for s in self.tool_schemas if s["function"]["name"] == name)
+            task = (f"Arguments for the tool {name} ({schema.get('description', '')}) "
+                    f"requested for: {_user_request(conversation)}")
+            args, problems = self._repair(task, arguments, problems, schema.get("parameters") or {},
+                                          validator, deadline, model_name)
+            if not problems and not isinstance(args, dict):
+                problems = [NOT_AN_OBJECT]
+        return args, problems
+
+    def _checked_answer(self, response: Dict, request: Union[str, Conversation], deadline: Deadline,
+                        model_name: Optional[str] = None) -> str:
+        """
+        Final answer text, validated against answer_schema in structured mode
+
+        Raises:
+            StructuredOutputError: If the answer is still invalid after repair
+        """
+        content = response["message"]["content"]
+        if not self.structured_output or self._answer_validator is None:
+            return content
+        value, problems = parse_json(content, self._answer_validator)
+        if not problems:
+            return content
+        logger.warning("Answer does not match its schema: %s", "; ".join(problems))
+        task = f"The answer to: {_user_request(request)}"
+        value, problems = self._repair(task, content, problems, self.answer_schema,
+                                       self._answer_validator, deadline, model_name)
+        if problems:
+            raise StructuredOutputError(f"Answer does not match its schema: {'; '.join(problems)}")
+        return json.dumps(value)
+
+    def _repair(self, task: str, output: Any, problems: List[str], schema: Dict,
+                validator: Callable[[Any], List[str]], deadline: Deadline,
+                model_name: Optional[str] = None) -> Tuple[Any, List[str]]:
+        """
+        Ask for a corrected value with a schema-constrained call
+
+        Only the request, the invalid output and the problems are sent, not
+        the conversation, so a repair costs a short prompt instead of a full
+        round trip.
+
+        Returns:
+            (value, problems) from the last attempt
+        """
+        value = None
+        for _ in range(self.repair_attempts):
+            bad = output if isinstance(output, str) else json.dumps(output, default=str)
+            prompt = (f"{task}\n\nInvalid JSON:\n{bad}\n\nProblems:\n"
+                      + "\n".join(f"- {p}" for p in problems)
+                      + f"\n\nSchema:\n{json.dumps(schema)}\n\nReturn the corrected JSON.")
+            response = self._generate(Conversation([REPAIR_MESSAGE, Message("user", prompt)]), model_name,
+                                      use_tools=False, deadline=deadline, format=schema)
+            output = response["message"]["content"]
+            value, problems = parse_json(output, validator)
+            if not problems:
+                break
+        return value, problems
         
-        return final_response["message"]["content"]
+    def _run_tool(self, function_name: str, function_args: Dict, deadline: Deadline) -> Any:
+        """
+        Run a tool behind its circuit breaker with a per-call timeout
+        
+        Web tools get one breaker per target host, other tools one per name.
+        Only exceptions and timeouts count as breaker failures. Tools report
+        bad input as strings starting with "Error"; those go back to the model
+        unchanged, since the tool itself is working.
+        """
+        url = function_args.get("url")
+        key = f"tool:{urlparse(url).netloc}" if isinstance(url, str) and url else f"tool:{function_name}"
+        tool = self.tools[function_name]
+        timeout = deadline.cap(self.policy.tool_timeout)
+        
+        def call():
+            try:
+                return self.policy.run_with_timeout(lambda: tool(**function_args), timeout, function_name)
+            except DeadlineExceededError:
+                # Only a blown request deadline aborts the request; a slow tool is reported to the model
+                deadline.check(function_name)
+                raise ToolExecutionError(f"Error: {function_name} timed out after {timeout:.1f}s")
+            except Exception as e:
+                if isinstance(e, AgentError) or is_transient(e):
+                    raise
+                # A crashing tool counts against its breaker (policy.call would not count it)
+                raise ToolExecutionError(f"{function_name} failed: {e}") from e
+            
+        start = time.perf_counter()
+        try:
+            result = self.policy.call(call, key=key, deadline=deadline, error_cls=ToolExecutionError)
+        except ToolExecutionError as e:
+            seconds = time.perf_counter() - start
+            record_tool_usage(seconds)
+            record_tool_call(function_name, seconds, str(e), error=True)
+            # Timeouts are reported to the model like the tool's own error strings
+            if e.__cause__ is None and str(e).startswith("Error"):
+                return str(e)
+            raise
+        seconds = time.perf_counter() - start
+        record_tool_usage(seconds)
+        record_tool_call(function_name, seconds, result,
+                         error=isinstance(result, str) and result.startswith("Error"))
+        return result
+
+def _user_request(request: Union[str, Conversation]) -> str:
+    """The user's message from a request or the first user turn of a conversation"""
+    if isinstance(request, str):
+        return request
+    return next((m.content for m in request if m.role == "user"), "")
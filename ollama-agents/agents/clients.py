@@ -0,0 +1,76 @@
+# agents/clients.py
+"""
+Ollama clients whose timeouts stop at the request deadline.
+
+ollama.Client only takes a fixed timeout. DeadlineTransport lowers each
+HTTP request's timeouts to the time left on the deadline of the
+ResiliencePolicy.call in progress, so a slow model cannot hold a request
+past its deadline. Inside collect_responses() it also records every
+response it opens, so another thread can abort one with abort_response()
+without closing the client and its connection pool. Imported on first
+use: it loads httpx and ollama.
+"""
+import socket
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+import httpx
+import ollama
+
+from agents.resilience import current_deadline
+
+_open_responses: contextvars.ContextVar = contextvars.ContextVar("open_responses", default=None)
+
+@contextmanager
+def collect_responses() -> Iterator[List[httpx.Response]]:
+    """Collect the HTTP responses DeadlineTransport opens inside the block"""
+    responses: List[httpx.Response] = []
+    token = _open_responses.set(responses)
+    try:
+        yield responses
+    finally:
+        _open_responses.reset(token)
+
+def abort_response(response: httpx.Response):
+    """
+    Abort a response that another thread is reading
+
+    Closing a socket does not wake a thread blocked reading it, so the
+    socket is shut down instead; the reader then fails and closes the
+    response itself, and the pool drops the broken connection.
+    """
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream is not None else None
+    if sock is None:
+        response.close()
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        # Already closed
+        pass
+
+class DeadlineTransport(httpx.HTTPTransport):
+    """HTTP transport that caps connect/read/write/pool timeouts at current_deadline()"""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        deadline = current_deadline()
+        timeouts = request.extensions.get("timeout")
+        if deadline is not None and timeouts:
+            request.extensions["timeout"] = {name: deadline.cap(value) for name, value in timeouts.items()}
+        response = super().handle_request(request)
+        responses = _open_responses.get()
+        if responses is not None:
+            responses.append(response)
+        return response
+
+def ollama_client(host: Optional[str] = None, timeout: Optional[float] = None) -> Any:
+    """
+    Create an ollama.Client bounded by the request deadline
+
+    Args:
+        host: Ollama URL (defaults to OLLAMA_HOST)
+        timeout: Per-call timeout; the remaining deadline applies when shorter
+    """
+    return ollama.Client(host=host, timeout=timeout, transport=DeadlineTransport())
@@ -1,53 +1,45 @@
 # agents/error_handler.py
 import logging
-import traceback
 from functools import wraps
 from typing import Callable, Any
-
-class AgentError(Exception):
-    """Base exception for agent-related errors"""
-    
-    pass
-
-class ToolExecutionError(AgentError):
-    """Exception raised when tool execution fails"""
-    pass
-
-class ModelError(AgentError):
-    """Exception raised when model interaction fails"""
-    pass
+from agents.base_agent import BaseAgent
+from agents.errors import (
+    AgentError,
+    ToolExecutionError,
+    ModelError,
+    DeadlineExceededError,
+    CircuitOpenError,
+)
+from logging_config import configure_logging
 
 def setup_logging():
-    """Configure logging for the agent"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('agent.log'),
-            logging.StreamHandler()
-        ]
-    )
+    """Configure logging for the agent (idempotent, safe to call per agent)"""
+    configure_logging(log_file='agent.log')
     return logging.getLogger('ai_agent')
 
 def error_handler(func: Callable) -> Callable:
     """
-    Decorator for handling and logging function errors
+    Decorator for logging function errors and raising them as AgentError
     
     Args:
         func: Function to wrap with error handling
         
     Returns:
-        Wrapped function with error handling
+        Wrapped function; failures surface as AgentError subclasses so
+        callers can tell them apart from answers
     """
     @wraps(func)
     def wrapper(*args, **kwargs) -> Any:
         logger = logging.getLogger('ai_agent')
         try:
             return func(*args, **kwargs)
+        except AgentError as e:
+            logger.error("Error in %s: %s", func.__name__, e)
+            raise
         except Exception as e:
-            logger.error(f"Error in {func.__name__}: {str(e)}")
-            logger.debug(f"Traceback: {traceback.format_exc()}")
-            return f"Error executing {func.__name__}: {str(e)}"
+            logger.error("Error in %s: %s", func.__name__, e)
+            logger.debug("Traceback for %s", func.__name__, exc_info=True)
+            raise AgentError(f"Error executing {func.__name__}: {str(e)}") from e
     return wrapper
 
 # Enhanced BaseAgent with error handling
@@ -59,7 +51,7 @@ class RobustAgent(BaseAgent):
     @error_handler
     def chat(self, message: str) -> str:
         """Chat method with enhanced error handling"""
-        self.logger.info(f"Processing message: {message[:50]}...")
+        self.logger.info("Processing message: %.50s...", message)
         return super().chat(message)
         
     def validate_tool_schema(self, schema: dict) -> bool:
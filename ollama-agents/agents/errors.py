@@ -0,0 +1,36 @@
+# agents/errors.py
+from typing import Optional
+
+class AgentError(Exception):
+    """Base exception for agent-related errors"""
+    
+    # HTTP status the web layers return for this error
+    status_code = 500
+
+class ToolExecutionError(AgentError):
+    """Exception raised when tool execution fails"""
+    status_code = 500
+
+class ModelError(AgentError):
+    """Exception raised when model interaction fails"""
+    status_code = 502
+
+class StructuredOutputError(ModelError):
+    """Exception raised when a structured answer still fails its schema after repair"""
+    status_code = 502
+
+class InvalidWebhookError(AgentError):
+    """Exception raised when a job's webhook URL is not allowed"""
+    status_code = 400
+
+class DeadlineExceededError(AgentError):
+    """Exception raised when a call runs past its deadline"""
+    status_code = 504
+
+class CircuitOpenError(AgentError):
+    """Exception raised when a circuit breaker is rejecting calls"""
+    status_code = 503
+    
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,279 @@
+# agents/hedging.py
+import time
+import weakref
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agents.resilience import current_deadline
+from config.settings import AgentConfig
+from utils.diagnostics import register_source
+
+logger = logging.getLogger(__name__)
+
+class _Attempt:
+    def __init__(self, index: int, host: Optional[str], model: str):
+        self.index = index
+        self.host = host
+        self.model = model
+        self.responses: List[Any] = []
+        self.cancelled = False
+        self.content: List[str] = []
+        self.tool_calls: List[Any] = []
+        self.last = None
+
+    def add(self, chunk: Any):
+        self.content.append(chunk["message"].get("content") or "")
+        self.tool_calls.extend(chunk["message"].get("tool_calls") or [])
+        self.last = chunk
+
+    def cancel(self):
+        """Stop reading this attempt and abort its HTTP response"""
+        self.cancelled = True
+        if not self.responses:
+            return
+        # Only this attempt's connection is dropped; the target's client
+        # and its other pooled connections stay open
+        from agents.clients import abort_response
+        for response in list(self.responses):
+            try:
+                abort_response(response)
+            except Exception:
+                logger.debug("Failed to close hedged attempt %s", self.index, exc_info=True)
+
+_clients: "weakref.WeakSet[HedgedClient]" = weakref.WeakSet()
+
+def _ollama_client(host: Optional[str], timeout: Optional[float]) -> Any:
+    # Imported here: it loads httpx and ollama
+    from agents.clients import ollama_client
+    return ollama_client(host, timeout)
+
+@contextmanager
+def _collect_responses(attempt: _Attempt) -> Iterator[None]:
+    """Record the HTTP responses an attempt opens so cancel() can close them"""
+    from agents.clients import collect_responses
+    with collect_responses() as responses:
+        attempt.responses = responses
+        yield
+
+class HedgedClient:
+    def __init__(self, hosts: Optional[List[str]] = None, models: Optional[List[str]] = None,
+                 hedge_delay: Optional[float] = None, fallback_delay: float = 2.0,
+                 min_samples: int = 20, window: int = 200, timeout: Optional[float] = None,
+                 client_factory: Optional[Callable[[Optional[str], Optional[float]], Any]] = None):
+        """
+        Initialize a client that races the same chat request on two targets
+
+        Either two hosts (same model) or two models (same host) can be given.
+        The hedge is started after hedge_delay seconds; pass 0 to start both
+        at once, or None to use the p95 of recent first-chunk latencies.
+        One client is built per host and reused by every request.
+
+        Args:
+            hosts: Ollama hosts to race, primary first
+            models: Models to race, primary first (overrides the requested model)
+            hedge_delay: Fixed delay before firing the hedge
+            fallback_delay: Delay used until enough latency samples exist
+            min_samples: Samples needed before the adaptive p95 is used
+            window: Number of recent first-chunk latencies kept
+            timeout: HTTP timeout of each target's client (the model timeout)
+            client_factory: Builds the client for a host (defaults to agents.clients.ollama_client)
+        """
+        hosts = hosts or [None]
+        models = models or [None]
+        if len(hosts) < 2 and len(models) < 2:
+            raise ValueError("Hedging needs at least two hosts or two models")
+        self.targets: List[Tuple[Optional[str], Optional[str]]] = [
+            (hosts[i % len(hosts)], models[i % len(models)]) for i in range(2)
+        ]
+        self.hedge_delay = hedge_delay
+        self.fallback_delay = fallback_delay
+        self.min_samples = min_samples
+        self.timeout = timeout
+        factory = client_factory or _ollama_client
+        self.clients: Dict[Optional[str], Any] = {}
+        for host, _ in self.targets:
+            if host not in self.clients:
+                self.clients[host] = factory(host, timeout)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.metrics = {
+            "requests": 0,
+            "hedges_fired": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "cancelled": 0,
+            "errors": 0,
+        }
+        _clients.add(self)
+
+    @classmethod
+    def from_config(cls, config: AgentConfig, **kwargs) -> Optional['HedgedClient']:
+        """Build a hedged client from config, or None when hedging is disabled"""
+        if not config.hedge_enabled:
+            return None
+        kwargs.setdefault("timeout", config.model_timeout)
+        return cls(hosts=config.hedge_hosts, models=config.hedge_models,
+                   hedge_delay=config.hedge_delay, **kwargs)
+
+    def current_delay(self) -> float:
+        """Delay before the hedge fires for the next request"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.min_samples:
+            return self.fallback_delay
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def chat(self, model: str, messages: List[Dict], **kwargs) -> Dict:
+        """
+        Run a chat request, returning whichever target finishes first
+
+        Attempts keep streaming until one completes, so a target that fails
+        mid-stream falls back to the other; the rest are then cancelled.
+
+        Args:
+            model: Model requested by the caller
+            messages: Chat messages
+            **kwargs: Extra arguments passed to ollama.Client.chat
+
+        Returns:
+            Response dict shaped like an Ollama chat response
+
+        Raises:
+            TimeoutError: If no target finishes before the current request deadline
+        """
+        kwargs.pop("stream", None)
+        deadline = current_deadline()
+        state = {"streaming": False, "winner": None, "error": None, "failed": 0, "launching": True}
+        first_chunk = threading.Event()
+        finished = threading.Event()
+        attempts: List[_Attempt] = []
+
+        def run(attempt: _Attempt, started: float):
+            stream = None
+            try:
+                with _collect_responses(attempt):
+                    stream = self.clients[attempt.host].chat(model=attempt.model, messages=messages,
+                                                             stream=True, **kwargs)
+                    for chunk in stream:
+                        if attempt.cancelled:
+                            return
+                        with self._lock:
+                            if not state["streaming"]:
+                                state["streaming"] = True
+                                self._latencies.append(time.perf_counter() - started)
+                                first_chunk.set()
+                        attempt.add(chunk)
+            except Exception as e:
+                if attempt.cancelled:
+                    return
+                logger.warning("Hedged attempt %s on %s failed: %s", attempt.index, attempt.host, e)
+                with self._lock:
+                    state["failed"] += 1
+                    state["error"] = e
+                    all_failed = not state["launching"] and state["failed"] == len(attempts)
+                # Wake the caller so a failed primary is hedged without waiting
+                first_chunk.set()
+                if all_failed:
+                    finished.set()
+                return
+            finally:
+                if stream is not None:
+                    stream.close()
+
+            with self._lock:
+                if state["winner"] is None and not attempt.cancelled:
+                    state["winner"] = attempt
+                    finished.set()
+
+        def start(index: int):
+            host, target_model = self.targets[index]
+            attempt = _Attempt(index, host, target_model or model)
+            with self._lock:
+                attempts.append(attempt)
+            # Copy the context so the attempt's HTTP calls see the request deadline
+            threading.Thread(target=contextvars.copy_context().run,
+                             args=(run, attempt, time.perf_counter()), daemon=True).start()
+
+        with self._lock:
+            self.metrics["requests"] += 1
+
+        start(0)
+        delay = self.current_delay()
+        first_chunk.wait(delay if deadline is None else min(delay, deadline.remaining()))
+        with self._lock:
+            needs_hedge = not state["streaming"] and state["winner"] is None
+            if needs_hedge:
+                self.metrics["hedges_fired"] += 1
+        if needs_hedge:
+            start(1)
+
+        with self._lock:
+            state["launching"] = False
+            if state["winner"] is None and state["failed"] == len(attempts):
+                finished.set()
+        if not finished.wait(None if deadline is None else deadline.remaining()):
+            state["error"] = TimeoutError("Hedged request did not finish before the deadline")
+
+        with self._lock:
+            # Cancelled under the lock, so no attempt can still become the winner
+            winner = state["winner"]
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancel()
+            if winner is None:
+                self.metrics["errors"] += 1
+            else:
+                self.metrics["hedge_wins" if winner.index else "primary_wins"] += 1
+                self.metrics["cancelled"] += len(attempts) - 1
+
+        if winner is None:
+            raise state["error"] or RuntimeError("Hedged request failed")
+        return self._build_response(winner)
+
+    def _build_response(self, attempt: _Attempt) -> Dict:
+        """Assemble an attempt's streamed chunks into a single chat response"""
+        message = {"role": "assistant", "content": "".join(attempt.content)}
+        if attempt.tool_calls:
+            message["tool_calls"] = attempt.tool_calls
+        response = {
+            "model": attempt.model,
+            "message": message,
+            "done": True,
+            "hedge": {"target": attempt.index, "host": attempt.host},
+        }
+        if attempt.last is not None:
+            for key in ("prompt_eval_count", "eval_count", "total_duration", "eval_duration"):
+                response[key] = attempt.last.get(key)
+        return response
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get hedging counters and the current hedge delay
+
+        Returns:
+            Dict of hedge metrics
+        """
+        with self._lock:
+            metrics = dict(self.metrics)
+        metrics["hedge_delay"] = self.current_delay()
+        return metrics
+
+def hedging_metrics() -> Dict[str, Any]:
+    """Hedging counters summed over every hedged client in this process"""
+    totals: Dict[str, Any] = {}
+    delays = []
+    for client in list(_clients):
+        metrics = client.get_metrics()
+        delays.append(metrics.pop("hedge_delay"))
+        for name, value in metrics.items():
+            totals[name] = totals.get(name, 0) + value
+    totals["hedge_delay"] = max(delays) if delays else None
+    return totals
+
+register_source("hedging", hedging_metrics)
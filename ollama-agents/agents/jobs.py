@@ -0,0 +1,444 @@
+# agents/jobs.py
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import ipaddress
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from agents.errors import AgentError, InvalidWebhookError
+from agents.usage import nested_usage, track_usage
+from utils.diagnostics import register_source
+from utils.fastjson import dumps_str, loads
+from utils.lazy import lazy_import
+
+requests = lazy_import("requests")
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    session_id TEXT,
+    messages TEXT NOT NULL,
+    outputs TEXT NOT NULL DEFAULT '[]',
+    timings TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    webhook_url TEXT,
+    rate_charge TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    lease_until REAL,
+    lease_owner TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+WEBHOOK_SCHEMES = ("http", "https")
+
+def check_webhook_url(url: str, allow_private: bool = False):
+    """
+    Reject webhook URLs that would let a caller reach internal services
+
+    Args:
+        url: Webhook URL given with the job
+        allow_private: Accept hosts that resolve to loopback, private,
+                       link-local or reserved addresses (local development)
+
+    Raises:
+        InvalidWebhookError: If the scheme is not http(s), the host does not
+                             resolve or any of its addresses is not public
+    """
+    try:
+        parsed = urlparse(url)
+        port = parsed.port
+    except ValueError as e:
+        raise InvalidWebhookError(f"Invalid webhook_url: {e}") from e
+    if parsed.scheme not in WEBHOOK_SCHEMES or not parsed.hostname:
+        raise InvalidWebhookError("webhook_url must be an http or https URL")
+    if allow_private:
+        return
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError) as e:
+        raise InvalidWebhookError(f"webhook_url host cannot be resolved: {parsed.hostname}") from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not address.is_global:
+            raise InvalidWebhookError(f"webhook_url must not point to a non-public address ({address})")
+
+class JobStore:
+    def __init__(self, path: str = "jobs.db"):
+        """
+        SQLite-backed job table shared by every worker process
+
+        Args:
+            path: Database file
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "rate_charge" not in columns:
+            # Databases created before jobs carried their rate-limit reservation
+            conn.execute("ALTER TABLE jobs ADD COLUMN rate_charge TEXT")
+        if "lease_owner" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, messages: List[str], session_id: str, webhook_url: Optional[str],
+               rate_charge: Optional[Dict[str, Any]] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, session_id, messages, webhook_url, rate_charge, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, session_id, dumps_str(messages), webhook_url,
+             dumps_str(rate_charge) if rate_charge else None, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim_next(self, lease_seconds: float) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job, or a running job whose lease
+        expired (its worker died or the server restarted)
+
+        The job's "lease" is a token that later updates must present; once
+        the job has been claimed again, updates with the old token are refused.
+        """
+        conn = self._connect()
+        now = time.time()
+        lease = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) "
+                "ORDER BY created LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, started = COALESCE(started, ?), lease_until = ?, lease_owner = ? "
+                "WHERE id = ?",
+                (RUNNING, now, now + lease_seconds, lease, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = self._to_dict(row)
+        job["status"] = RUNNING
+        job["lease"] = lease
+        # Internal: bucket keys can contain API keys, so get() never returns them
+        job["rate_charge"] = loads(row["rate_charge"]) if row["rate_charge"] else None
+        return job
+
+    def _update(self, sql: str, params: tuple, job_id: str, lease: Optional[str]) -> bool:
+        """Run an UPDATE on one job, only while it is held under `lease` when one is given"""
+        if lease is None:
+            cursor = self._connect().execute(f"{sql} WHERE id = ?", (*params, job_id))
+        else:
+            cursor = self._connect().execute(f"{sql} WHERE id = ? AND lease_owner = ?", (*params, job_id, lease))
+        return cursor.rowcount == 1
+
+    def extend_lease(self, job_id: str, lease: str, lease_seconds: float) -> bool:
+        """Keep a running job owned; False if another worker has claimed it"""
+        return self._update("UPDATE jobs SET lease_until = ?", (time.time() + lease_seconds,), job_id, lease)
+
+    def record_turn(self, job_id: str, outputs: List[str], timings: List[Dict], lease_seconds: float,
+                    lease: Optional[str] = None) -> bool:
+        """Store a finished turn and extend the lease; False if the lease was lost"""
+        return self._update("UPDATE jobs SET outputs = ?, timings = ?, lease_until = ?",
+                            (dumps_str(outputs), dumps_str(timings), time.time() + lease_seconds), job_id, lease)
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None, lease: Optional[str] = None) -> bool:
+        """Mark a job finished; False if the lease was lost"""
+        return self._update("UPDATE jobs SET status = ?, error = ?, finished = ?, lease_until = NULL, "
+                            "lease_owner = NULL", (status, error, time.time()), job_id, lease)
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        messages = loads(row["messages"])
+        outputs = loads(row["outputs"])
+        end = row["finished"] or time.time()
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "session_id": row["session_id"],
+            "messages": messages,
+            "outputs": outputs,
+            "progress": len(outputs) / len(messages) if messages else 1.0,
+            "timings": loads(row["timings"]),
+            "error": row["error"],
+            "webhook_url": row["webhook_url"],
+            "created": row["created"],
+            "started": row["started"],
+            "finished": row["finished"],
+            "elapsed": end - row["started"] if row["started"] else None,
+        }
+
+class JobQueue:
+    def __init__(self, store: JobStore, agent_factory: Callable[[], Any], workers: int = 2,
+                 lease_seconds: float = 600.0, poll_interval: float = 1.0, webhook_timeout: float = 10.0,
+                 allow_private_webhooks: bool = False, limiter: Any = None):
+        """
+        Worker pool that runs queued agent jobs in the background
+
+        Args:
+            store: Job persistence
+            agent_factory: Returns the agent used to run turns
+            workers: Number of worker threads in this process
+            lease_seconds: How long a claimed job stays owned without a heartbeat;
+                           a heartbeat thread renews the leases of running jobs
+                           every third of this
+            poll_interval: Seconds between polls for jobs queued by other processes
+            webhook_timeout: Timeout for completion webhooks
+            allow_private_webhooks: Accept webhooks on loopback and private addresses
+            limiter: RateLimiter that finished jobs settle their real token usage against
+        """
+        self.store = store
+        self.agent_factory = agent_factory
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.webhook_timeout = webhook_timeout
+        self.allow_private_webhooks = allow_private_webhooks
+        self.limiter = limiter
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Job ID -> lease token of the jobs this process is running
+        self._held: Dict[str, str] = {}
+        self._held_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (also resumes jobs left over from a restart)"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def check_webhook(self, webhook_url: Optional[str]):
+        """Raise InvalidWebhookError unless the webhook URL may be called"""
+        if webhook_url:
+            check_webhook_url(webhook_url, self.allow_private_webhooks)
+
+    def submit(self, messages: List[str], session_id: str = "default",
+               webhook_url: Optional[str] = None,
+               rate_charge: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Queue a job of one or more agent turns
+
+        Args:
+            messages: Turns to run in order
+            session_id: Session the job belongs to
+            webhook_url: URL to POST the finished job to (checked by check_webhook)
+            rate_charge: Rate-limit reservation made at submission
+                         ({"keys": [...], "estimate": n}), settled against the
+                         job's real usage when it finishes
+
+        Returns:
+            The stored job
+
+        Raises:
+            InvalidWebhookError: If the webhook URL is not allowed
+        """
+        self.check_webhook(webhook_url)
+        job_id = self.store.create(messages, session_id, webhook_url, rate_charge)
+        self._wakeup.set()
+        return self.store.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth for diagnostics"""
+        counts = self.store.counts()
+        return {"queued": counts.get(QUEUED, 0), "running": counts.get(RUNNING, 0),
+                "failed": counts.get(FAILED, 0), "workers": self.workers}
+
+    def _work(self):
+        # Nothing may end the loop except stop(): a dead thread silently shrinks the pool
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim_next(self.lease_seconds)
+            except Exception:
+                logger.exception("Claiming a job failed")
+                self._stop.wait(self.poll_interval)
+                continue
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                self._run(job)
+            except Exception:
+                # Left running; another worker takes it over when the lease expires
+                logger.exception("Job %s could not be completed", job["id"])
+
+    def _heartbeat(self):
+        """Renew the leases of running jobs so a long turn is not claimed again"""
+        while not self._stop.wait(max(self.lease_seconds / 3, 0.01)):
+            with self._held_lock:
+                held = list(self._held.items())
+            for job_id, lease in held:
+                try:
+                    if not self.store.extend_lease(job_id, lease, self.lease_seconds):
+                        logger.warning("Lost the lease on job %s", job_id)
+                except Exception:
+                    logger.exception("Renewing the lease on job %s failed", job_id)
+
+    def _run(self, job: Dict[str, Any]):
+        with self._held_lock:
+            self._held[job["id"]] = job["lease"]
+        try:
+            owned, tokens = self._run_turns(job)
+        finally:
+            with self._held_lock:
+                self._held.pop(job["id"], None)
+        if not owned:
+            # Another worker claimed the job; it settles and notifies
+            logger.warning("Job %s was claimed by another worker; dropping this run's result", job["id"])
+            return
+        # Turns finished by an earlier run were not settled: that process stopped
+        earlier = sum(t.get("total_tokens", 0) for t in job["timings"])
+        self._settle(job, earlier + tokens)
+        self._notify(self.store.get(job["id"]))
+
+    def _run_turns(self, job: Dict[str, Any]) -> Tuple[bool, int]:
+        """
+        Run the job's remaining turns and store the outcome
+
+        Returns:
+            (owned, tokens): owned is False if the job's lease was lost, after
+            which nothing more is stored; tokens were spent by this run
+        """
+        logger.info("Running job %s (%d turns)", job["id"], len(job["messages"]))
+        outputs = list(job["outputs"])
+        timings = list(job["timings"])
+        lease = job["lease"]
+        with track_usage() as total:
+            try:
+                agent = self.agent_factory()
+                # Resume after the last completed turn
+                for index in range(len(outputs), len(job["messages"])):
+                    start = time.perf_counter()
+                    with nested_usage() as usage:
+                        outputs.append(agent.chat(job["messages"][index]))
+                    timings.append({
+                        "turn": index,
+                        "seconds": time.perf_counter() - start,
+                        **usage.as_dict(),
+                    })
+                    if not self.store.record_turn(job["id"], outputs, timings, self.lease_seconds, lease):
+                        return False, total.total_tokens
+                owned = self.store.finish(job["id"], SUCCEEDED, lease=lease)
+            except AgentError as e:
+                logger.warning("Job %s failed: %s", job["id"], e)
+                owned = self.store.finish(job["id"], FAILED, str(e), lease)
+            except Exception as e:
+                logger.exception("Job %s crashed", job["id"])
+                owned = self.store.finish(job["id"], FAILED, str(e), lease)
+        return owned, total.total_tokens
+
+    def _settle(self, job: Dict[str, Any], tokens: int):
+        """Replace the submitter's rate-limit reservation with the job's real usage"""
+        charge = job.get("rate_charge")
+        if self.limiter is None or not charge:
+            return
+        # Imported here: only needed when rate limiting is on
+        from utils.rate_limit import RateDecision
+        try:
+            self.limiter.settle(RateDecision(True, charged=charge["keys"]), charge["estimate"], tokens)
+        except Exception:
+            logger.exception("Settling rate limits for job %s failed", job["id"])
+
+    def _notify(self, job: Dict[str, Any]):
+        """POST the finished job to its webhook, if it has one"""
+        if not job or not job["webhook_url"]:
+            return
+        try:
+            # Checked again: the host may resolve differently than at submission
+            self.check_webhook(job["webhook_url"])
+            response = requests.post(job["webhook_url"], data=dumps_str(job),
+                                     headers={"Content-Type": "application/json"},
+                                     timeout=self.webhook_timeout, allow_redirects=False)
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning("Webhook for job %s failed: %s", job["id"], e)
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """
+    Process-wide job queue, started on first use
+
+    Returns:
+        Running JobQueue configured from AgentConfig
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from agents.registry import get_agent
+                from config.settings import AgentConfig
+
+                config = AgentConfig.from_env()
+                limiter = None
+                if config.rate_limit_enabled:
+                    from utils.rate_limit import get_rate_limiter
+                    limiter = get_rate_limiter(config)
+                queue = JobQueue(JobStore(config.job_db_path), lambda: get_agent("advanced"),
+                                 workers=config.job_workers, lease_seconds=config.job_lease_seconds,
+                                 allow_private_webhooks=config.job_webhook_allow_private, limiter=limiter)
+                queue.start()
+                register_source("jobs", queue.stats)
+                _queue = queue
+    return _queue
+
+def _reset_after_fork():
+    global _queue, _queue_lock
+    _queue = None
+    _queue_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
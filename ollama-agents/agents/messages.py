@@ -0,0 +1,120 @@
+# agents/messages.py
+import sys
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.fastjson import dumps
+
+class Message:
+    """
+    Compact, immutable chat message
+
+    Uses __slots__ instead of a per-instance __dict__. The slots are the only
+    stored form; the dict and JSON forms are built when asked for, so history
+    costs less memory than the plain dicts sent to the model. Immutable so one
+    instance (e.g. the system prompt) can be shared across requests.
+    """
+    __slots__ = ("role", "content", "tool_calls", "tool_name")
+
+    def __init__(self, role: str, content: str = "", tool_calls: Optional[List[Dict]] = None,
+                 tool_name: Optional[str] = None):
+        """
+        Args:
+            role: system, user, assistant or tool
+            content: Message text
+            tool_calls: Tool calls requested by the assistant
+            tool_name: Name of the tool that produced a tool message
+        """
+        object.__setattr__(self, "role", sys.intern(role))
+        object.__setattr__(self, "content", content)
+        object.__setattr__(self, "tool_calls", tool_calls)
+        object.__setattr__(self, "tool_name", tool_name)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Message is immutable")
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role!r}, content={self.content[:40]!r})"
+
+    @classmethod
+    def from_response(cls, message: Any) -> 'Message':
+        """
+        Build a message from an Ollama response message (dict or model)
+
+        Args:
+            message: The "message" field of a chat response
+
+        Returns:
+            Equivalent Message with tool calls as plain dicts
+        """
+        tool_calls = message.get("tool_calls") or None
+        if tool_calls:
+            tool_calls = [
+                {"function": {"name": call["function"]["name"],
+                              "arguments": call["function"]["arguments"]}}
+                for call in tool_calls
+            ]
+        return cls(message.get("role") or "assistant", message.get("content") or "", tool_calls)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Dict form accepted by ollama.chat (a new dict per call)
+
+        Returns:
+            Message as a dict
+        """
+        data = {"role": self.role, "content": self.content}
+        if self.tool_calls:
+            data["tool_calls"] = self.tool_calls
+        if self.tool_name:
+            data["tool_name"] = self.tool_name
+        return data
+
+    def to_json(self) -> bytes:
+        """Serialized JSON form"""
+        return dumps(self.as_dict())
+
+class Conversation:
+    """
+    Append-only message history
+
+    Stores only the messages; the dict and JSON forms are built per call,
+    which is cheap next to the model call they are built for.
+    """
+    __slots__ = ("_messages",)
+
+    def __init__(self, messages: Optional[List[Message]] = None):
+        self._messages: List[Message] = list(messages or ())
+
+    def append(self, message: Message) -> Message:
+        """
+        Add a message to the end of the history
+
+        Args:
+            message: Message to add
+
+        Returns:
+            The appended message
+        """
+        self._messages.append(message)
+        return message
+
+    def add(self, role: str, content: str = "", **kwargs) -> Message:
+        """Create and append a message"""
+        return self.append(Message(role, content, **kwargs))
+
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        """Messages in the form accepted by ollama.chat"""
+        return [message.as_dict() for message in self._messages]
+
+    def to_json(self) -> bytes:
+        """Serialize the history as a JSON array"""
+        return dumps(self.as_dicts())
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self._messages)
+
+    def __getitem__(self, index: int) -> Message:
+        return self._messages[index]
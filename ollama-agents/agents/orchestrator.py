@@ -0,0 +1,394 @@
+# agents/orchestrator.py
+import re
+import json
+import time
+import logging
+import threading
+import contextvars
+import dataclasses
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from agents.base_agent import BaseAgent
+from agents.errors import AgentError, DeadlineExceededError
+from agents.recording import record_chat
+from agents.resilience import Deadline
+from agents.usage import Usage, current_usage, track_usage
+from config.settings import AgentConfig
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# Specialist agents a plan may use
+AGENT_KINDS = ("web", "file", "general")
+
+PLANNER_PROMPT = """Split the task below into at most {max_tasks} sub-tasks for specialist agents.
+Agents: "web" (fetch text and links from web pages), "file" (read, write and list workspace files),
+"general" (reasoning only, no tools).
+Sub-tasks that do not depend on each other run in parallel; list real dependencies only.
+Reply with JSON only, in this form:
+[{{"id": "t1", "agent": "web", "prompt": "...", "depends_on": []}}]
+
+Task: {task}"""
+
+MERGE_PROMPT = """Combine the sub-task results below into one answer to the original task.
+
+Task: {task}
+
+{results}"""
+
+@dataclass
+class Task:
+    id: str
+    prompt: str
+    agent: str = "general"
+    depends_on: List[str] = field(default_factory=list)
+
+@dataclass
+class NodeResult:
+    id: str
+    agent: str
+    depends_on: List[str]
+    status: str = SKIPPED
+    output: str = ""
+    error: Optional[str] = None
+    ready_at: Optional[float] = None   # seconds from the start of the run
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    usage: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def seconds(self) -> Optional[float]:
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def waited(self) -> Optional[float]:
+        """Time spent ready but waiting for a concurrency slot"""
+        if self.ready_at is None or self.started is None:
+            return None
+        return self.started - self.ready_at
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**dataclasses.asdict(self), "seconds": self.seconds, "waited": self.waited}
+
+@dataclass
+class OrchestrationResult:
+    answer: str
+    nodes: List[NodeResult]
+    usage: Dict[str, int]
+    seconds: float
+    budget_exhausted: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "answer": self.answer,
+            "seconds": self.seconds,
+            "usage": self.usage,
+            "budget_exhausted": self.budget_exhausted,
+            "trace": [node.as_dict() for node in self.nodes],
+        }
+
+def parse_plan(text: str, max_tasks: int) -> List[Task]:
+    """
+    Parse and validate a planner reply
+
+    Args:
+        text: Model output expected to contain a JSON list of tasks
+        max_tasks: Maximum number of tasks kept
+
+    Returns:
+        Tasks in dependency order
+
+    Raises:
+        ValueError: If the plan is missing, malformed or cyclic
+    """
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if not match:
+        raise ValueError("planner reply contains no JSON list")
+    tasks = []
+    for i, item in enumerate(json.loads(match.group())[:max_tasks]):
+        agent = item.get("agent") if item.get("agent") in AGENT_KINDS else "general"
+        tasks.append(Task(str(item.get("id") or f"t{i + 1}"), str(item["prompt"]), agent,
+                          [str(d) for d in item.get("depends_on") or []]))
+    return topological_order(tasks)
+
+def topological_order(tasks: List[Task]) -> List[Task]:
+    """Order tasks so dependencies come first; raise ValueError on unknown ids or cycles"""
+    by_id = {task.id: task for task in tasks}
+    if len(by_id) != len(tasks):
+        raise ValueError("duplicate task ids")
+    for task in tasks:
+        missing = [d for d in task.depends_on if d not in by_id]
+        if missing:
+            raise ValueError(f"task {task.id} depends on unknown tasks {missing}")
+    ordered, done = [], set()
+    pending = list(tasks)
+    while pending:
+        ready = [t for t in pending if all(d in done for d in t.depends_on)]
+        if not ready:
+            raise ValueError("task dependencies contain a cycle")
+        for task in ready:
+            ordered.append(task)
+            done.add(task.id)
+            pending.remove(task)
+    return ordered
+
+class Orchestrator(BaseAgent):
+    def __init__(self, config: Optional[AgentConfig] = None, client: Any = None,
+                 max_concurrency: Optional[int] = None, max_tokens: Optional[int] = None,
+                 time_budget: Optional[float] = None):
+        """
+        Plan a task into a DAG of sub-tasks, run them on specialist agents
+        concurrently, and merge the results
+
+        Args:
+            config: Agent configuration (defaults to AgentConfig.from_env())
+            client: ollama-compatible client shared by every sub-agent
+            max_concurrency: Sub-tasks running at once
+            max_tokens: Token budget shared by planning, sub-tasks and merging;
+                        sub-tasks already running when it runs out still finish
+            time_budget: Seconds for the whole run
+        """
+        self.config = config or AgentConfig.from_env()
+        super().__init__(self.config.model_name, client=client)
+        self.max_concurrency = max_concurrency or self.config.orchestrator_max_concurrency
+        self.max_tokens = max_tokens if max_tokens is not None else self.config.orchestrator_max_tokens
+        self.time_budget = time_budget if time_budget is not None else self.config.orchestrator_time_budget
+        self.max_tasks = self.config.orchestrator_max_tasks
+        # Tool instances are shared by every sub-agent and created on first use
+        self._file_manager = None
+        self._web_scraper = None
+        self._tool_lock = threading.Lock()
+
+    @property
+    def file_manager(self):
+        if self._file_manager is None:
+            with self._tool_lock:
+                if self._file_manager is None:
+                    from agents.tools.file_manager import FileManager
+                    self._file_manager = FileManager()
+        return self._file_manager
+
+    @property
+    def web_scraper(self):
+        if self._web_scraper is None:
+            with self._tool_lock:
+                if self._web_scraper is None:
+                    from agents.tools.web_scraper import WebScraper
+                    self._web_scraper = WebScraper()
+        return self._web_scraper
+
+    def _sub_agent(self, kind: str, deadline: Deadline) -> BaseAgent:
+        """A specialist agent whose request deadline is what is left of the run"""
+        policy = dataclasses.replace(self.policy, request_deadline=deadline.remaining())
+        agent = BaseAgent(self.model_name, client=self._model_client(), policy=policy)
+        # Sub-agents share the orchestrator's tool cache
+        agent.tool_cache = self.tool_cache
+        if kind == "web":
+            from agents.tools.web_scraper import get_web_tool_schemas
+            schemas = get_web_tool_schemas()
+            agent.register_tool(schemas[0], lambda **kw: self.web_scraper.extract_text(**kw))
+            agent.register_tool(schemas[1], lambda **kw: self.web_scraper.extract_links(**kw))
+        elif kind == "file":
+            from agents.tools.file_manager import get_file_tool_schemas
+            schemas = get_file_tool_schemas()
+            agent.register_tool(schemas[0], lambda **kw: self.file_manager.read_file(**kw))
+            agent.register_tool(schemas[1], lambda **kw: self.file_manager.write_file(**kw))
+            agent.register_tool(schemas[2], lambda **kw: self.file_manager.list_files(**kw))
+        return agent
+
+    def plan(self, task: str, deadline: Optional[Deadline] = None) -> List[Task]:
+        """
+        Ask the model to split a task into sub-tasks
+
+        Falls back to a single general task when the plan cannot be used.
+        """
+        response = self._generate(PLANNER_PROMPT.format(task=task, max_tasks=self.max_tasks),
+                                  use_tools=False, deadline=deadline)
+        try:
+            tasks = parse_plan(response["message"]["content"], self.max_tasks)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("Unusable plan (%s); running the task on one agent", e)
+            tasks = []
+        return tasks or [Task("t1", task, "general")]
+
+    def run(self, task: str, tasks: Optional[List[Task]] = None) -> OrchestrationResult:
+        """
+        Plan (unless tasks are given), execute the DAG and merge the results
+
+        Args:
+            task: The user's task
+            tasks: Predefined sub-tasks; skips the planning call
+
+        Returns:
+            Final answer with per-node timing trace and token usage
+
+        Raises:
+            AgentError: If no sub-task succeeded; the tokens spent are still
+                        added to the caller's usage collector
+        """
+        start = time.perf_counter()
+        deadline = Deadline(self.time_budget)
+        outer = current_usage()
+        totals = Usage()
+        try:
+            return self._run(task, tasks, deadline, totals, start)
+        finally:
+            if outer is not None:
+                outer.merge(totals)
+
+    def _run(self, task: str, tasks: Optional[List[Task]], deadline: Deadline, totals: Usage,
+             start: float) -> OrchestrationResult:
+        with track_usage() as usage:
+            try:
+                tasks = topological_order(tasks) if tasks else self.plan(task, deadline)
+            finally:
+                totals.merge(usage)
+
+        nodes = {t.id: NodeResult(t.id, t.agent, list(t.depends_on)) for t in tasks}
+        by_id = {t.id: t for t in tasks}
+        exhausted = self._execute(by_id, nodes, deadline, totals, start)
+
+        answer = ""
+        trace = [nodes[t.id] for t in tasks]
+        succeeded = [node for node in trace if node.status == SUCCEEDED]
+        if len(tasks) == 1 and succeeded:
+            answer = succeeded[0].output
+        elif succeeded:
+            merge = NodeResult("merge", "general", [t.id for t in tasks])
+            trace.append(merge)
+            exhausted = exhausted or self._over_budget(totals, deadline)
+            if exhausted:
+                merge.error = f"{exhausted} budget exhausted"
+            else:
+                merge.ready_at = merge.started = time.perf_counter() - start
+                answer = self._merge(task, succeeded, merge, deadline, totals)
+                merge.finished = time.perf_counter() - start
+        if not succeeded:
+            raise AgentError(f"Every sub-task failed ({exhausted or 'see trace'})")
+        if not answer:
+            # Partial result: whatever the sub-tasks produced
+            answer = "\n\n".join(f"[{n.id}] {n.output}" for n in succeeded)
+        return OrchestrationResult(answer, trace, totals.as_dict(), time.perf_counter() - start, exhausted)
+
+    def _merge(self, task: str, succeeded: List[NodeResult], merge: NodeResult,
+               deadline: Deadline, totals: Usage) -> str:
+        """Combine sub-task outputs into one answer ("" if the merge call fails)"""
+        results = "\n\n".join(f"[{n.id}] {n.output[:self.config.orchestrator_result_chars]}" for n in succeeded)
+        with track_usage() as usage:
+            try:
+                response = self._generate(MERGE_PROMPT.format(task=task, results=results),
+                                          use_tools=False, deadline=deadline)
+                merge.status, merge.output = SUCCEEDED, response["message"]["content"]
+            except AgentError as e:
+                merge.status, merge.error = FAILED, str(e)
+        merge.usage = usage.as_dict()
+        totals.merge(usage)
+        return merge.output
+
+    def _over_budget(self, totals: Usage, deadline: Deadline) -> Optional[str]:
+        if self.max_tokens and totals.total_tokens >= self.max_tokens:
+            return "tokens"
+        if deadline.remaining() == 0:
+            return "time"
+        return None
+
+    def _execute(self, tasks: Dict[str, Task], nodes: Dict[str, NodeResult], deadline: Deadline,
+                 totals: Usage, start: float) -> Optional[str]:
+        """
+        Run ready tasks concurrently until the DAG is done or a budget runs out
+
+        Budgets are checked before each task starts and again whenever one
+        finishes. Tasks already running are not interrupted, so the token
+        budget can be overshot by what up to max_concurrency in-flight tasks
+        use after it runs out.
+        """
+        pending = dict(tasks)
+        running = {}
+        exhausted = None
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="orchestrator") as pool:
+            while pending or running:
+                # Tasks whose dependencies failed can never run
+                for task_id, task in list(pending.items()):
+                    failed = [d for d in task.depends_on if nodes[d].status in (FAILED, SKIPPED)
+                              and d not in pending and d not in running.values()]
+                    if failed:
+                        nodes[task_id].error = f"dependency failed: {', '.join(failed)}"
+                        del pending[task_id]
+
+                exhausted = exhausted or self._over_budget(totals, deadline)
+                if exhausted:
+                    for task_id in pending:
+                        nodes[task_id].error = f"{exhausted} budget exhausted"
+                    pending.clear()
+
+                now = time.perf_counter() - start
+                ready = [t for t in pending.values() if all(nodes[d].status == SUCCEEDED for d in t.depends_on)]
+                for task in ready:
+                    if nodes[task.id].ready_at is None:
+                        nodes[task.id].ready_at = now
+                    if len(running) < self.max_concurrency:
+                        del pending[task.id]
+                        # Copy the context so log fields, recording and usage follow the node
+                        context = contextvars.copy_context()
+                        future = pool.submit(context.run, self._run_node, task, nodes, deadline, start)
+                        running[future] = task.id
+
+                if not running:
+                    break
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    totals.merge(future.result())
+                    del running[future]
+        return exhausted
+
+    def _run_node(self, task: Task, nodes: Dict[str, NodeResult], deadline: Deadline, start: float) -> Usage:
+        node = nodes[task.id]
+        prompt = task.prompt
+        if task.depends_on:
+            context = "\n\n".join(f"[{d}] {nodes[d].output[:self.config.orchestrator_result_chars]}"
+                                  for d in task.depends_on)
+            prompt = f"{prompt}\n\nResults of earlier steps:\n{context}"
+        node.started = time.perf_counter() - start
+        with track_usage() as usage:
+            try:
+                deadline.check(f"sub-task {task.id}")
+                node.output = self._sub_agent(task.agent, deadline).chat(prompt)
+                node.status = SUCCEEDED
+            except DeadlineExceededError as e:
+                node.status, node.error = FAILED, str(e)
+            except AgentError as e:
+                logger.warning("Sub-task %s failed: %s", task.id, e)
+                node.status, node.error = FAILED, str(e)
+        node.finished = time.perf_counter() - start
+        node.usage = usage.as_dict()
+        return usage
+
+    def chat(self, message: str) -> str:
+        """
+        Run a task through plan, concurrent sub-tasks and merge
+
+        Args:
+            message: User task
+
+        Returns:
+            Merged answer
+        """
+        with record_chat(message, type(self).__name__) as recording:
+            try:
+                result = self.run(message)
+            except AgentError as e:
+                logger.warning("Error processing request in Orchestrator.chat: %s", e)
+                raise
+            except Exception as e:
+                logger.exception("Error processing request in Orchestrator.chat")
+                raise AgentError(f"Error processing request: {str(e)}") from e
+            logger.info("Orchestrated %d sub-tasks in %.2fs (%d tokens)",
+                        len(result.nodes) - 1, result.seconds, result.usage["total_tokens"])
+            return recording.done(result.answer)
@@ -0,0 +1,255 @@
+# agents/recording.py
+"""
+Record mode: capture agent traffic for replay.
+
+When AGENT_RECORD_PATH is set, every BaseAgent.chat call appends one JSON
+line describing the request, its model and tool calls, and their timings.
+Text is anonymized before it is written (see ANONYMIZE_MODES).
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from logging_config import session_id_var
+from utils.fastjson import dumps
+
+logger = logging.getLogger(__name__)
+
+# redact: replace all text with a same-length placeholder (repeats stay repeats)
+# scrub:  pseudonymize emails, URLs, IPs and long numbers; names and other
+#         free text are kept verbatim, so records can still contain PII
+# shape:  like scrub, and also replace every word with a same-length pseudo-word
+# off:    store text as is (local debugging only)
+ANONYMIZE_MODES = ("redact", "scrub", "shape", "off")
+# Unkeyed hashes of short values are easy to reverse, so these need a salt
+SALTED_MODES = ("scrub", "shape")
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_URL = re.compile(r"https?://([^/\s]+)(/\S*)?")
+_IPV4 = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")
+_NUMBER = re.compile(r"\b\d[\d -]{5,}\d\b")
+_WORD = re.compile(r"[A-Za-z]+")
+
+class Anonymizer:
+    def __init__(self, mode: str = "redact", salt: str = ""):
+        """
+        Deterministic text anonymizer
+
+        The same input always maps to the same output for a given salt, so
+        repeated prompts stay repeated (and cache behaviour is preserved).
+
+        Args:
+            mode: One of ANONYMIZE_MODES
+            salt: Secret mixed into pseudonyms; required for SALTED_MODES.
+                Without one, redact uses a random salt, so its output is
+                only stable within one process.
+
+        Raises:
+            ValueError: Unknown mode, or a SALTED_MODES mode without a salt
+        """
+        if mode not in ANONYMIZE_MODES:
+            raise ValueError(f"Unknown anonymize mode: {mode}")
+        if mode in SALTED_MODES and not salt:
+            raise ValueError(f"Anonymize mode {mode!r} needs a salt (AGENT_RECORD_SALT)")
+        self.mode = mode
+        self.salt = salt.encode("utf-8") if salt else os.urandom(32)
+        self._word = lru_cache(maxsize=65536)(self._pseudo_word)
+
+    def pseudonym(self, value: str, size: int = 4) -> str:
+        """Short salted hash standing in for an identifier"""
+        return hashlib.blake2b(value.encode("utf-8"), key=self.salt[:64], digest_size=size).hexdigest()
+
+    def _pseudo_word(self, word: str) -> str:
+        digest = hashlib.blake2b(word.lower().encode("utf-8"), key=self.salt[:64],
+                                 digest_size=max(1, len(word))).digest()
+        pseudo = "".join(chr(97 + b % 26) for b in digest[:len(word)])
+        return pseudo.capitalize() if word[0].isupper() else pseudo
+
+    def text(self, value: Optional[str]) -> Optional[str]:
+        if not value or self.mode == "off":
+            return value
+        if self.mode == "redact":
+            digest = self.pseudonym(value, 32)
+            return (digest * (len(value) // len(digest) + 1))[:len(value)]
+        value = _EMAIL.sub(lambda m: f"user-{self.pseudonym(m.group())}@example.com", value)
+        value = _URL.sub(lambda m: f"https://h-{self.pseudonym(m.group(1))}.example"
+                               + (f"/{self.pseudonym(m.group(2))}" if m.group(2) else ""), value)
+        value = _IPV4.sub(lambda m: "10.0.0.1", value)
+        value = _NUMBER.sub(lambda m: "0" * len(m.group()), value)
+        if self.mode == "shape":
+            value = _WORD.sub(lambda m: self._word(m.group()), value)
+        return value
+
+    def value(self, value: Any) -> Any:
+        """Anonymize strings nested in tool arguments"""
+        if isinstance(value, str):
+            return self.text(value)
+        if isinstance(value, dict):
+            return {k: self.value(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.value(v) for v in value]
+        return value
+
+class Recording:
+    """Events collected for one chat call"""
+
+    __slots__ = ("start", "events", "anonymizer")
+
+    def __init__(self, anonymizer: Anonymizer):
+        self.start = time.time()
+        self.anonymizer = anonymizer
+        self.events: List[Dict[str, Any]] = []
+
+class Recorder:
+    def __init__(self, path: str, anonymize: str = "redact", salt: str = ""):
+        """
+        Append-only JSONL writer for recorded chat calls
+
+        Each line is written with a single O_APPEND write, so several worker
+        processes can record into the same file.
+
+        Args:
+            path: Output file
+            anonymize: One of ANONYMIZE_MODES
+            salt: Secret for pseudonyms (required for scrub and shape; set it
+                to keep them stable across runs)
+        """
+        self.path = path
+        self.anonymizer = Anonymizer(anonymize, salt)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def write(self, record: Dict[str, Any]):
+        try:
+            os.write(self._fd, dumps(record) + b"\n")
+        except OSError as e:
+            logger.warning("Could not write traffic record: %s", e)
+
+    def close(self):
+        os.close(self._fd)
+
+_current: contextvars.ContextVar = contextvars.ContextVar("agent_recording", default=None)
+_recorder: Optional[Recorder] = None
+_configured = False
+_lock = threading.Lock()
+
+def get_recorder() -> Optional[Recorder]:
+    """Process-wide recorder configured from AgentConfig, or None when recording is off"""
+    global _recorder, _configured
+    if not _configured:
+        with _lock:
+            if not _configured:
+                from config.settings import AgentConfig
+                config = AgentConfig.from_env()
+                if config.record_path:
+                    _recorder = Recorder(config.record_path, config.record_anonymize, config.record_salt)
+                    logger.info("Recording agent traffic to %s", config.record_path)
+                _configured = True
+    return _recorder
+
+def set_recorder(recorder: Optional[Recorder]):
+    """Install a recorder (or None to stop recording) for this process"""
+    global _recorder, _configured
+    with _lock:
+        _recorder = recorder
+        _configured = True
+
+class _Chat:
+    """Handle yielded by record_chat(); done() passes the answer through"""
+
+    __slots__ = ("answer",)
+
+    def __init__(self):
+        self.answer = None
+
+    def done(self, answer: str) -> str:
+        self.answer = answer
+        return answer
+
+@contextmanager
+def record_chat(message: str, agent: str = "") -> Iterator[_Chat]:
+    """
+    Record a chat call if recording is enabled
+
+    Usage:
+        with record_chat(message) as chat:
+            ...
+            return chat.done(answer)
+    """
+    chat = _Chat()
+    recorder = get_recorder()
+    if recorder is None or _current.get() is not None:
+        yield chat
+        return
+
+    recording = Recording(recorder.anonymizer)
+    token = _current.set(recording)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield chat
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        anonymizer = recorder.anonymizer
+        session = session_id_var.get()
+        recorder.write({
+            "t": recording.start,
+            "agent": agent,
+            "session": anonymizer.pseudonym(session) if session else None,
+            "message": anonymizer.text(message),
+            "answer_chars": len(chat.answer or ""),
+            "seconds": round(time.perf_counter() - started, 6),
+            "error": error,
+            "events": recording.events,
+        })
+
+def record_model_call(model: str, seconds: float, response: Any):
+    """Add a model call to the active recording (no-op when not recording)"""
+    recording = _current.get()
+    if recording is None:
+        return
+    message = response["message"]
+    anonymizer = recording.anonymizer
+    tool_calls = [
+        {"name": c["function"]["name"], "arguments": anonymizer.value(c["function"]["arguments"] or {})}
+        for c in message.get("tool_calls") or []
+    ]
+    recording.events.append({
+        "kind": "model",
+        "model": model,
+        "seconds": round(seconds, 6),
+        "prompt_tokens": response.get("prompt_eval_count") or 0,
+        "completion_tokens": response.get("eval_count") or 0,
+        "chars": len(message.get("content") or ""),
+        "tool_calls": tool_calls,
+    })
+
+def record_tool_call(name: str, seconds: float, result: Any, error: bool = False):
+    """Add a tool call to the active recording (no-op when not recording)"""
+    recording = _current.get()
+    if recording is None:
+        return
+    recording.events.append({
+        "kind": "tool",
+        "name": name,
+        "seconds": round(seconds, 6),
+        "chars": len(str(result)) if result is not None else 0,
+        "error": error,
+    })
+
+def _reset_after_fork():
+    global _lock
+    # The inherited fd still appends correctly; only the lock needs replacing
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
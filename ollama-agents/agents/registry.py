@@ -0,0 +1,66 @@
+# agents/registry.py
+import os
+import threading
+from typing import Callable, Dict
+
+from agents.base_agent import BaseAgent
+
+def _advanced_agent() -> BaseAgent:
+    # Imported here so the tool modules are only loaded when an agent is built
+    from examples.advanced_agent import AdvancedAgent
+    return AdvancedAgent()
+
+def _orchestrator() -> BaseAgent:
+    from agents.orchestrator import Orchestrator
+    return Orchestrator()
+
+_factories: Dict[str, Callable[[], BaseAgent]] = {
+    "base": BaseAgent,
+    "advanced": _advanced_agent,
+    "orchestrator": _orchestrator,
+}
+_agents: Dict[str, BaseAgent] = {}
+_lock = threading.Lock()
+
+def register_factory(name: str, factory: Callable[[], BaseAgent]):
+    """
+    Register a named agent factory
+
+    Args:
+        name: Name used with get_agent()
+        factory: Zero-argument callable that builds the agent
+    """
+    _factories[name] = factory
+    _agents.pop(name, None)
+
+def get_agent(name: str = "advanced") -> BaseAgent:
+    """
+    Get the process-wide agent for a name, building it on first use
+
+    Agents are never created at import time, so a pre-forking server can
+    import the apps in the master and every worker builds its own agent
+    (and its own HTTP sessions) after the fork.
+
+    Args:
+        name: Registered factory name
+
+    Returns:
+        Shared agent instance for this process
+    """
+    agent = _agents.get(name)
+    if agent is None:
+        with _lock:
+            agent = _agents.get(name)
+            if agent is None:
+                agent = _factories[name]()
+                _agents[name] = agent
+    return agent
+
+def reset_agents():
+    """Drop all cached agents (called in forked children)"""
+    global _lock
+    _agents.clear()
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_agents)
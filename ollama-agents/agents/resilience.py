@@ -0,0 +1,277 @@
+# agents/resilience.py
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Type
+
+from agents.errors import AgentError, CircuitOpenError, DeadlineExceededError, ModelError
+
+logger = logging.getLogger(__name__)
+
+# Exception class names treated as transient (matched by name so httpx/requests
+# do not have to be imported here)
+_TRANSIENT_NAMES = {
+    "ConnectError", "ConnectTimeout", "ReadTimeout", "WriteTimeout", "PoolTimeout",
+    "RemoteProtocolError", "ReadError", "TimeoutException", "ConnectionError",
+    "Timeout", "ChunkedEncodingError",
+}
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Decide whether an error is worth retrying
+
+    Args:
+        error: Exception raised by a model or tool call
+
+    Returns:
+        True for connection problems, timeouts, 429 and 5xx responses
+    """
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and not isinstance(error, AgentError):
+        return status == 429 or status >= 500
+    return any(cls.__name__ in _TRANSIENT_NAMES for cls in type(error).__mro__)
+
+class Deadline:
+    def __init__(self, seconds: Optional[float]):
+        """
+        Absolute deadline for a request
+
+        Args:
+            seconds: Time budget from now, or None for no deadline
+        """
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when unbounded"""
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        """True once the deadline has passed"""
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def check(self, what: str = "request"):
+        """Raise DeadlineExceededError if the deadline has passed"""
+        if self.expired():
+            raise DeadlineExceededError(f"Deadline exceeded for {what}")
+
+    def cap(self, timeout: Optional[float]) -> Optional[float]:
+        """Limit a per-call timeout to the time that is left"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+# Deadline of the dependency call in progress, for clients that cannot take one
+# as an argument (see ResiliencePolicy.call)
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("agent_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the ResiliencePolicy.call running in this context, if any"""
+    return _current_deadline.get()
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Stop calling a failing dependency until it has had time to recover
+
+        Args:
+            name: Breaker key (model or tool host)
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds before a single trial call is let through
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may proceed"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == self.OPEN and waited >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(f"Circuit open for {self.name}",
+                                   retry_after=max(0.0, self.reset_timeout - waited))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a call that says nothing about the dependency's health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit for %s opened after %d failures", self.name, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures}
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+# Runs tool calls so they can be abandoned when they overrun. An abandoned
+# call keeps its thread until it returns, so slots are counted and a call
+# is refused rather than queued once every thread is taken
+TOOL_WORKERS = 16
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+_tool_slots = threading.BoundedSemaphore(TOOL_WORKERS)
+
+def get_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Process-wide circuit breaker for a model or tool host"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name, failure_threshold, reset_timeout))
+    return breaker
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Current state of every circuit breaker"""
+    return {name: breaker.as_dict() for name, breaker in list(_breakers.items())}
+
+@dataclass
+class ResiliencePolicy:
+    request_deadline: Optional[float] = 300.0
+    model_timeout: float = 120.0
+    tool_timeout: float = 30.0
+    max_retries: int = 2
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
+
+    @classmethod
+    def from_config(cls, config) -> 'ResiliencePolicy':
+        """Build a policy from an AgentConfig"""
+        return cls(
+            request_deadline=config.request_deadline,
+            model_timeout=config.model_timeout,
+            tool_timeout=config.tool_timeout,
+            max_retries=config.max_retries,
+            backoff_base=config.retry_backoff_base,
+            breaker_failure_threshold=config.breaker_failure_threshold,
+            breaker_reset_timeout=config.breaker_reset_timeout,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for a retry attempt (1-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        return get_breaker(name, self.breaker_failure_threshold, self.breaker_reset_timeout)
+
+    def call(self, func: Callable[[], Any], key: str, deadline: Deadline,
+             error_cls: Type[AgentError] = ModelError) -> Any:
+        """
+        Call a dependency with a circuit breaker, retries and a deadline
+
+        Args:
+            func: Zero-argument callable performing the call
+            key: Circuit breaker key
+            deadline: Request deadline
+            error_cls: AgentError subclass raised for non-transient failures
+
+        Returns:
+            Whatever func returns
+
+        Deadline errors and open circuits raised inside func do not count
+        against this breaker: they say nothing about the dependency.
+        """
+        breaker = self.breaker(key)
+        attempt = 0
+        while True:
+            deadline.check(key)
+            breaker.before_call()
+            token = _current_deadline.set(deadline)
+            try:
+                result = func()
+            except Exception as e:
+                if isinstance(e, (DeadlineExceededError, CircuitOpenError)):
+                    breaker.release()
+                    raise
+                if isinstance(e, AgentError):
+                    breaker.record_failure()
+                    raise
+                if not is_transient(e):
+                    # The dependency answered; the request itself was bad
+                    breaker.record_success()
+                    raise error_cls(f"{key} failed: {e}") from e
+                if deadline.expired():
+                    # Timeouts are cut short at the deadline (see agents.clients)
+                    breaker.release()
+                    raise DeadlineExceededError(f"Deadline exceeded for {key}") from e
+                breaker.record_failure()
+                attempt += 1
+                delay = self.backoff(attempt)
+                remaining = deadline.remaining()
+                if attempt > self.max_retries:
+                    raise error_cls(f"{key} failed: {e}") from e
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceededError(f"Deadline exceeded retrying {key}") from e
+                logger.warning("Transient failure on %s (attempt %d): %s; retrying in %.2fs",
+                               key, attempt, e, delay)
+                time.sleep(delay)
+                continue
+            finally:
+                _current_deadline.reset(token)
+            breaker.record_success()
+            return result
+
+    def run_with_timeout(self, func: Callable[[], Any], timeout: Optional[float], what: str) -> Any:
+        """
+        Run a blocking call in the tool pool and stop waiting after timeout
+
+        The worker thread is abandoned, not killed, if it overruns, and stays
+        taken until the call returns. When all TOOL_WORKERS threads are taken
+        the call is refused with CircuitOpenError instead of queueing behind
+        stuck calls.
+        """
+        if not _tool_slots.acquire(blocking=False):
+            raise CircuitOpenError(f"Tool pool is full ({TOOL_WORKERS} calls running); {what} not started",
+                                   retry_after=timeout or 1.0)
+
+        def run():
+            try:
+                return func()
+            finally:
+                _tool_slots.release()
+
+        # Copy the context so the call sees current_deadline() and the request's usage
+        future = _tool_executor.submit(contextvars.copy_context().run, run)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                # Never started, so run() will not release its slot
+                _tool_slots.release()
+            raise DeadlineExceededError(f"{what} timed out after {timeout:.1f}s")
@@ -0,0 +1,220 @@
+# agents/router_agent.py
+import re
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from agents.base_agent import BaseAgent
+from agents.errors import AgentError, ModelError, CircuitOpenError, StructuredOutputError
+from agents.recording import record_chat
+from agents.resilience import Deadline
+from agents.usage import nested_usage
+from config.settings import AgentConfig
+
+logger = logging.getLogger(__name__)
+
+SMALL_ROUTE = "small"
+LARGE_ROUTE = "large"
+
+# Phrases that suggest the small model could not handle the request
+_UNCERTAIN_REPLIES = (
+    "i'm not sure",
+    "i am not sure",
+    "i don't know",
+    "i do not know",
+    "i cannot answer",
+)
+
+@dataclass
+class RouteDecision:
+    route: str
+    confidence: float
+    reason: str = ""
+
+@dataclass
+class RouteMetrics:
+    requests: int = 0
+    escalations: int = 0
+    errors: int = 0
+    total_latency: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+
+    def as_dict(self) -> Dict:
+        """Return metrics with derived averages"""
+        return {
+            "requests": self.requests,
+            "escalations": self.escalations,
+            "errors": self.errors,
+            "avg_latency": self.total_latency / self.requests if self.requests else 0.0,
+            "total_latency": self.total_latency,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": self.cost,
+        }
+
+class HeuristicClassifier:
+    def __init__(self, config: AgentConfig):
+        """
+        Initialize a cheap rule-based complexity classifier
+
+        Args:
+            config: Agent configuration holding the routing rules
+        """
+        self.config = config
+        self._small_patterns = [re.compile(p, re.IGNORECASE) for p in config.routing_small_patterns]
+        # Whole words only, so "plan" does not match "planet"
+        self._large_keywords = [(k, re.compile(rf"\b{re.escape(k)}\b", re.IGNORECASE))
+                                for k in config.routing_large_keywords]
+
+    def __call__(self, message: str) -> RouteDecision:
+        """
+        Classify a message as small or large
+
+        Args:
+            message: User input message
+
+        Returns:
+            Route decision with a confidence in [0, 1]
+        """
+        text = message.strip()
+        words = len(text.split())
+        max_words = self.config.routing_max_small_words
+
+        if "```" in text or words > max_words:
+            return RouteDecision(LARGE_ROUTE, 0.9, "long or code")
+
+        hits = [k for k, pattern in self._large_keywords if pattern.search(text)]
+        if hits:
+            return RouteDecision(LARGE_ROUTE, min(0.95, 0.6 + 0.1 * len(hits)), f"keywords: {', '.join(hits)}")
+
+        if any(p.search(text) for p in self._small_patterns):
+            return RouteDecision(SMALL_ROUTE, 0.9, "small pattern")
+
+        if text.count("?") > 1:
+            return RouteDecision(LARGE_ROUTE, 0.7, "multiple questions")
+
+        # Unmatched prompts get less certain the longer they are
+        return RouteDecision(SMALL_ROUTE, max(0.0, 1.0 - words / max_words), "length")
+
+class RouterAgent(BaseAgent):
+    def __init__(self, config: Optional[AgentConfig] = None,
+                 classifier: Optional[Callable[[str], RouteDecision]] = None,
+                 client: Any = None):
+        """
+        Initialize an agent that routes each request to a small or large model
+
+        Args:
+            config: Agent configuration with model names and routing rules
+            classifier: Callable returning a RouteDecision for a message
+            client: Object with an ollama-compatible chat() method
+        """
+        self.config = config or AgentConfig.from_env()
+        super().__init__(self.config.large_model, client)
+        self.classifier = classifier or HeuristicClassifier(self.config)
+        self.models = {
+            SMALL_ROUTE: self.config.small_model,
+            LARGE_ROUTE: self.config.large_model,
+        }
+        self._metrics = {route: RouteMetrics() for route in self.models}
+        self._lock = threading.Lock()
+
+    def route(self, message: str) -> RouteDecision:
+        """
+        Decide which route handles a message, escalating on low confidence
+
+        Args:
+            message: User input message
+
+        Returns:
+            Final route decision
+        """
+        decision = self.classifier(message)
+        if decision.route == SMALL_ROUTE and decision.confidence < self.config.routing_confidence_threshold:
+            return RouteDecision(LARGE_ROUTE, decision.confidence, f"low confidence ({decision.reason})")
+        return decision
+
+    def chat(self, message: str) -> str:
+        """
+        Send a message to the model chosen by the router
+
+        Args:
+            message: User input message
+
+        Returns:
+            Agent's response
+
+        Raises:
+            AgentError: When the request fails on every route tried
+        """
+        decision = self.route(message)
+        logger.debug("Routing to %s (%.2f): %s", decision.route, decision.confidence, decision.reason)
+        deadline = Deadline(self.policy.request_deadline)
+
+        with record_chat(message, type(self).__name__) as recording:
+            try:
+                try:
+                    content = self._chat_on_route(decision.route, message, deadline)
+                except (ModelError, CircuitOpenError, StructuredOutputError):
+                    # A failing small model is escalated rather than surfaced
+                    if decision.route != SMALL_ROUTE:
+                        raise
+                    content = ""
+                if decision.route == SMALL_ROUTE and self._needs_escalation(content):
+                    with self._lock:
+                        self._metrics[SMALL_ROUTE].escalations += 1
+                    content = self._chat_on_route(LARGE_ROUTE, message, deadline)
+                return recording.done(content)
+            except AgentError as e:
+                logger.warning("Error processing request in RouterAgent.chat: %s", e)
+                raise
+            except Exception as e:
+                logger.exception("Error processing request in RouterAgent.chat")
+                raise AgentError(f"Error processing request: {str(e)}") from e
+
+    def _chat_on_route(self, route: str, message: str, deadline: Deadline) -> str:
+        """
+        Answer on a route's model and record its latency and cost
+
+        The request takes the normal BaseAgent path on that model, so
+        registered tools and structured output checks apply; the metrics
+        cover every model call it made.
+        """
+        start = time.perf_counter()
+        try:
+            with nested_usage() as usage:
+                content = self._respond(message, deadline, self.models[route])
+        except Exception:
+            with self._lock:
+                self._metrics[route].errors += 1
+            raise
+        latency = time.perf_counter() - start
+        rate = self.config.route_cost_per_1k_tokens.get(route, 0.0)
+
+        with self._lock:
+            metrics = self._metrics[route]
+            metrics.requests += 1
+            metrics.total_latency += latency
+            metrics.prompt_tokens += usage.prompt_tokens
+            metrics.completion_tokens += usage.completion_tokens
+            metrics.cost += usage.total_tokens / 1000 * rate
+
+        return content
+
+    def _needs_escalation(self, content: str) -> bool:
+        """Check whether a small-model answer should be retried on the large model"""
+        lowered = (content or "").strip().lower()
+        return not lowered or any(phrase in lowered for phrase in _UNCERTAIN_REPLIES)
+
+    def get_route_metrics(self) -> Dict[str, Dict]:
+        """
+        Get per-route latency, token and cost metrics
+
+        Returns:
+            Mapping of route name to metrics
+        """
+        with self._lock:
+            return {route: m.as_dict() for route, m in self._metrics.items()}
@@ -0,0 +1,185 @@
+# agents/schema.py
+"""
+Precompiled JSON Schema validators for tool arguments and structured answers.
+
+compile_schema() turns a schema into a tree of small closures once, at tool
+registration, so validating a model reply does not walk the schema again.
+It covers the subset used by function-calling schemas and Ollama's `format`
+parameter: type, enum, const, properties, required, additionalProperties,
+items, anyOf, oneOf and the usual length and range bounds, and the
+boolean schemas true (anything) and false (nothing). Other keywords are
+ignored.
+
+"integer" accepts only JSON integers: 3.0 is a number, not an integer, so
+it fails and goes to repair rather than reaching a tool as a float. oneOf
+requires exactly one branch to match, as in JSON Schema.
+"""
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# Returns a list of problems ("$.path: message"); empty when the value is valid
+Validator = Callable[[Any, str], List[str]]
+
+_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+def _compile(schema: Union[Dict[str, Any], bool]) -> Validator:
+    if schema is True:
+        return lambda value, path: []
+    if schema is False:
+        return lambda value, path: [f"{path}: no value is allowed here"]
+
+    checks: List[Validator] = []
+    check_type: Optional[Validator] = None
+
+    types = schema.get("type")
+    if types:
+        names = [types] if isinstance(types, str) else list(types)
+        tests = [_TYPES[n] for n in names if n in _TYPES]
+        expected = " or ".join(names)
+        if tests:
+            def check_type(value, path):
+                if any(test(value) for test in tests):
+                    return []
+                return [f"{path}: expected {expected}, got {type(value).__name__}"]
+            checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        checks.append(lambda value, path: [] if value in allowed else
+                      [f"{path}: must be one of {json.dumps(allowed)}"])
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda value, path: [] if value == const else [f"{path}: must be {json.dumps(const)}"])
+
+    properties = {name: _compile(sub) for name, sub in (schema.get("properties") or {}).items()}
+    required = list(schema.get("required") or [])
+    extra = schema.get("additionalProperties", True)
+    extra_check = _compile(extra) if isinstance(extra, dict) else None
+    if properties or required or extra is not True:
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return []
+            problems = [f"{path}: missing required property '{name}'" for name in required if name not in value]
+            for name, item in value.items():
+                if name in properties:
+                    problems += properties[name](item, f"{path}.{name}")
+                elif extra is False:
+                    problems.append(f"{path}: unexpected property '{name}'")
+                elif extra_check is not None:
+                    problems += extra_check(item, f"{path}.{name}")
+            return problems
+        checks.append(check_object)
+
+    items = _compile(schema["items"]) if isinstance(schema.get("items"), (dict, bool)) else None
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if items or min_items is not None or max_items is not None:
+        def check_array(value, path):
+            if not isinstance(value, list):
+                return []
+            problems = []
+            if min_items is not None and len(value) < min_items:
+                problems.append(f"{path}: expected at least {min_items} items")
+            if max_items is not None and len(value) > max_items:
+                problems.append(f"{path}: expected at most {max_items} items")
+            if items:
+                for i, item in enumerate(value):
+                    problems += items(item, f"{path}[{i}]")
+            return problems
+        checks.append(check_array)
+
+    min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+    if min_length is not None or max_length is not None:
+        def check_length(value, path):
+            if not isinstance(value, str):
+                return []
+            if min_length is not None and len(value) < min_length:
+                return [f"{path}: shorter than {min_length} characters"]
+            if max_length is not None and len(value) > max_length:
+                return [f"{path}: longer than {max_length} characters"]
+            return []
+        checks.append(check_length)
+
+    minimum, maximum = schema.get("minimum"), schema.get("maximum")
+    if minimum is not None or maximum is not None:
+        def check_range(value, path):
+            if not _TYPES["number"](value):
+                return []
+            if minimum is not None and value < minimum:
+                return [f"{path}: less than {minimum}"]
+            if maximum is not None and value > maximum:
+                return [f"{path}: greater than {maximum}"]
+            return []
+        checks.append(check_range)
+
+    any_of = [_compile(sub) for sub in schema.get("anyOf") or []]
+    if any_of:
+        def check_any(value, path):
+            results = [alternative(value, path) for alternative in any_of]
+            if any(not problems for problems in results):
+                return []
+            return [f"{path}: matches no allowed form ({min(results, key=len)[0]})"]
+        checks.append(check_any)
+
+    one_of = [_compile(sub) for sub in schema.get("oneOf") or []]
+    if one_of:
+        def check_one(value, path):
+            results = [alternative(value, path) for alternative in one_of]
+            matches = sum(1 for problems in results if not problems)
+            if matches == 1:
+                return []
+            if matches == 0:
+                return [f"{path}: matches no allowed form ({min(results, key=len)[0]})"]
+            return [f"{path}: matches {matches} forms, expected exactly one"]
+        checks.append(check_one)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, path):
+        problems = []
+        for check in checks:
+            problems += check(value, path)
+            # Type mismatches make the remaining checks noise
+            if problems and check is check_type:
+                break
+        return problems
+    return validate
+
+def compile_schema(schema: Union[Dict[str, Any], bool, None]) -> Callable[[Any], List[str]]:
+    """
+    Build a validator for a JSON schema
+
+    Args:
+        schema: JSON schema (None, {} or True accepts anything, False nothing)
+
+    Returns:
+        Function taking a value and returning a list of problems, empty when valid
+    """
+    validate = _compile({} if schema is None else schema)
+    return lambda value: validate(value, "$")
+
+def parse_json(text: Any, validator: Callable[[Any], List[str]]) -> Tuple[Any, List[str]]:
+    """
+    Decode (if needed) and validate a model-produced value
+
+    Args:
+        text: JSON text, or an already decoded value
+        validator: From compile_schema()
+
+    Returns:
+        (value, problems); value is None if the text is not JSON
+    """
+    if isinstance(text, str):
+        try:
+            text = json.loads(text)
+        except ValueError as e:
+            return None, [f"$: not valid JSON ({e})"]
+    return text, validator(text)
@@ -0,0 +1,213 @@
+# agents/tool_cache.py
+import time
+import json
+import weakref
+import threading
+import posixpath
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from utils.diagnostics import register_source
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float = 0.0  # seconds a result stays valid; 0 disables caching
+    # Tools whose entries a call to this tool invalidates: tool name -> argument
+    # that must match this call's argument of the same name (None = drop all)
+    invalidates: Dict[str, Optional[str]] = field(default_factory=dict)
+
+# Defaults by tool name; tools not listed are never cached
+DEFAULT_POLICIES: Dict[str, CachePolicy] = {
+    "read_file": CachePolicy(ttl=30.0),
+    "list_files": CachePolicy(ttl=10.0),
+    "write_file": CachePolicy(invalidates={"read_file": "filename", "list_files": None,
+                                           "search_workspace": None}),
+    "extract_text": CachePolicy(ttl=300.0),
+    "extract_links": CachePolicy(ttl=300.0),
+    "search_workspace": CachePolicy(ttl=30.0),
+}
+
+_PATH_ARGS = {"filename", "directory", "path"}
+
+def _canonical_url(url: str) -> str:
+    """Lower-case scheme and host, drop default ports and the fragment"""
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and not (parts.scheme == "http" and parts.port == 80 or
+                           parts.scheme == "https" and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    return urlunsplit((parts.scheme.lower(), host, parts.path or "/", parts.query, ""))
+
+def canonical_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalize tool arguments so equivalent calls share a cache entry
+
+    Paths are normalized ("./a/../b.txt" -> "b.txt"), URLs lower-cased with
+    default ports and fragments removed, and other strings stripped.
+    """
+    result = {}
+    for name, value in args.items():
+        if isinstance(value, str):
+            value = value.strip()
+            if name in _PATH_ARGS:
+                value = posixpath.normpath(value.replace("\\", "/")) if value else ""
+                value = "" if value == "." else value
+            elif name == "url":
+                value = _canonical_url(value)
+        result[name] = value
+    return result
+
+class ToolStats:
+    __slots__ = ("hits", "misses", "invalidations")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_caches: "weakref.WeakSet[ToolCache]" = weakref.WeakSet()
+
+class ToolCache:
+    def __init__(self, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        """
+        Memoize tool results per agent
+
+        Args:
+            max_entries: Entries kept before the least recently used is evicted
+            clock: Time source for TTLs
+        """
+        self.max_entries = max_entries
+        self.clock = clock
+        # (tool, key) -> (expires, canonical args, result)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict, Any]]" = OrderedDict()
+        self._stats: Dict[str, ToolStats] = {}
+        # Tool name -> number of invalidations, so a read that raced a write is not stored
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def wrap(self, name: str, function: Callable, policy: CachePolicy) -> Callable:
+        """
+        Wrap a tool function with its cache policy
+
+        Returns:
+            The function itself when the policy neither caches nor invalidates
+        """
+        if not policy.ttl and not policy.invalidates:
+            return function
+
+        def cached_tool(**kwargs):
+            args = canonical_args(kwargs)
+            if policy.invalidates:
+                result = function(**kwargs)
+                self.invalidate(policy.invalidates, args)
+                return result
+            key = json.dumps(args, sort_keys=True, default=str)
+            hit, result = self.get(name, key)
+            if hit:
+                return result
+            generation = self.generation(name)
+            result = function(**kwargs)
+            # Failures are reported as "Error..." strings; do not keep them
+            if not (isinstance(result, str) and result.startswith("Error")):
+                self.put(name, key, args, result, policy.ttl, generation)
+            return result
+
+        cached_tool.__name__ = getattr(function, "__name__", name)
+        cached_tool.__wrapped__ = function
+        return cached_tool
+
+    def _tool_stats(self, name: str) -> ToolStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ToolStats()
+        return stats
+
+    def get(self, name: str, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            stats = self._tool_stats(name)
+            entry = self._entries.get((name, key))
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end((name, key))
+                stats.hits += 1
+                return True, entry[2]
+            if entry is not None:
+                del self._entries[(name, key)]
+            stats.misses += 1
+            return False, None
+
+    def generation(self, name: str) -> int:
+        """Invalidation count of a tool; pass it to put() to detect a racing write"""
+        with self._lock:
+            return self._generations.get(name, 0)
+
+    def put(self, name: str, key: str, args: Dict, result: Any, ttl: float,
+            generation: Optional[int] = None):
+        """
+        Store a result
+
+        Args:
+            generation: generation(name) from before the tool ran; the result
+                is dropped if an invalidation happened since, as it may be stale
+        """
+        with self._lock:
+            if generation is not None and self._generations.get(name, 0) != generation:
+                return
+            self._entries[(name, key)] = (self.clock() + ttl, args, result)
+            self._entries.move_to_end((name, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, targets: Dict[str, Optional[str]], args: Dict[str, Any]):
+        """
+        Drop entries made stale by a write
+
+        Args:
+            targets: Tool name -> argument to match (None = every entry of that tool)
+            args: Canonical arguments of the write
+        """
+        with self._lock:
+            # Reads still running may have seen the old state
+            for tool in targets:
+                self._generations[tool] = self._generations.get(tool, 0) + 1
+            for (tool, key), (_, cached_args, _) in list(self._entries.items()):
+                if tool not in targets:
+                    continue
+                match = targets[tool]
+                if match is None or cached_args.get(match) == args.get(match):
+                    del self._entries[(tool, key)]
+                    self._tool_stats(tool).invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses, invalidations and hit rate per tool"""
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+def tool_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-tool cache statistics summed over every agent in this process"""
+    totals: Dict[str, ToolStats] = {}
+    for cache in list(_caches):
+        with cache._lock:
+            for name, stats in cache._stats.items():
+                total = totals.setdefault(name, ToolStats())
+                total.hits += stats.hits
+                total.misses += stats.misses
+                total.invalidations += stats.invalidations
+    return {name: stats.as_dict() for name, stats in sorted(totals.items())}
+
+register_source("tool_cache", tool_cache_stats)
@@ -12,7 +12,7 @@ class FileManager:
         Args:
             base_path: Base directory for file operations
         """
-        self.base_path = Path(base_path)
+        self.base_path = Path(base_path).resolve()
         self.base_path.mkdir(exist_ok=True)
         
     def read_file(self, filename: str) -> str:
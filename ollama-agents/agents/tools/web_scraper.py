@@ -1,8 +1,11 @@
 # agents/tools/web_scraper.py
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import json
+from utils.lazy import lazy_import
+
+# Heavy dependencies are imported on first scrape
+requests = lazy_import("requests")
+bs4 = lazy_import("bs4")
 
 class WebScraper:
     def __init__(self, timeout: int = 10):
@@ -13,10 +16,17 @@ class WebScraper:
             timeout: Request timeout in seconds
         """
         self.timeout = timeout
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (compatible; OllamaAgent/1.0)'
-        })
+        self._session = None
+        
+    @property
+    def session(self):
+        """HTTP session, created on first request"""
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (compatible; OllamaAgent/1.0)'
+            })
+        return self._session
         
     def fetch_page(self, url: str) -> str:
         """
@@ -51,7 +61,7 @@ class WebScraper:
             if html.startswith("Error"):
                 return html
                 
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = bs4.BeautifulSoup(html, 'html.parser')
             
             if selector:
                 elements = soup.select(selector)
@@ -77,7 +87,7 @@ class WebScraper:
             if html.startswith("Error"):
                 return html
                 
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = bs4.BeautifulSoup(html, 'html.parser')
             links = []
             
             for link in soup.find_all('a', href=True):
@@ -0,0 +1,393 @@
+# agents/tools/workspace_index.py
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from utils.lazy import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = ".index"
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".rst", ".py", ".js", ".ts", ".css", ".html", ".json",
+    ".yaml", ".yml", ".toml", ".ini", ".cfg", ".csv", ".sql", ".sh",
+}
+
+def chunk_text(text: str, chunk_chars: int = 1200, overlap: int = 200) -> List[Dict]:
+    """
+    Split text into overlapping, line-aligned chunks
+
+    Args:
+        text: File contents
+        chunk_chars: Target chunk size in characters
+        overlap: Characters of trailing context repeated in the next chunk
+
+    Returns:
+        Chunks with text and 1-based start/end line numbers
+    """
+    lines = text.splitlines()
+    chunks = []
+    start = 0
+    while start < len(lines):
+        size = 0
+        end = start
+        while end < len(lines) and (size == 0 or size + len(lines[end]) + 1 <= chunk_chars):
+            size += len(lines[end]) + 1
+            end += 1
+        body = "\n".join(lines[start:end]).strip()
+        if body:
+            chunks.append({"text": body, "start_line": start + 1, "end_line": end})
+        if end >= len(lines):
+            break
+        # Step back over whole lines to create the overlap
+        back = end
+        carried = 0
+        while back > start + 1 and carried + len(lines[back - 1]) + 1 <= overlap:
+            back -= 1
+            carried += len(lines[back]) + 1
+        start = back
+    return chunks
+
+class OllamaEmbedder:
+    def __init__(self, model: str = "nomic-embed-text", client=None, batch_size: int = 32,
+                 timeout: float = 30.0):
+        """
+        Embed text with a local Ollama embedding model
+
+        Args:
+            model: Embedding model name
+            client: ollama-compatible client with embed() (defaults to
+                    agents.clients.ollama_client, which also stops at the
+                    deadline of the request in progress)
+            batch_size: Texts per embed request
+            timeout: HTTP timeout of each embed request (default client only)
+        """
+        self.model = model
+        self.client = client
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def __call__(self, texts: Sequence[str]):
+        if self.client is None:
+            # Imported here: it loads httpx and ollama
+            from agents.clients import ollama_client
+            self.client = ollama_client(timeout=self.timeout)
+        client = self.client
+        rows = []
+        for i in range(0, len(texts), self.batch_size):
+            response = client.embed(model=self.model, input=list(texts[i:i + self.batch_size]))
+            rows.extend(response["embeddings"])
+        return _normalize(np.asarray(rows, dtype=np.float32))
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512):
+        """
+        Deterministic bag-of-words embedder for offline tests and benchmarks
+
+        Args:
+            dim: Vector size
+        """
+        self.model = f"hashing-{dim}"
+        self.dim = dim
+
+    def __call__(self, texts: Sequence[str]):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+                matrix[row, int.from_bytes(digest, "little") % self.dim] += 1.0
+        return _normalize(matrix)
+
+def _normalize(matrix):
+    if matrix.size == 0:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# An "Error" result, so the tool cache does not keep it
+INDEX_BUILDING = "Error: the workspace index is still being built; try the search again in a few seconds."
+
+class WorkspaceIndex:
+    def __init__(self, base_path: str = "./workspace", embedder=None, chunk_chars: int = 1200,
+                 overlap: int = 200, refresh_interval: float = 5.0):
+        """
+        On-disk vector index over the files in a workspace
+
+        Vectors are stored as a float32 .npy matrix that is memory-mapped for
+        search; chunk metadata is kept in a JSON file next to it.
+
+        Args:
+            base_path: Workspace directory (FileManager.base_path)
+            embedder: Callable mapping a list of texts to normalized vectors
+            chunk_chars: Target chunk size in characters
+            overlap: Overlap between consecutive chunks in characters
+            refresh_interval: Minimum seconds between change scans at search time;
+                              scans run in a background thread
+        """
+        self.base_path = Path(base_path).resolve()
+        self.index_path = self.base_path / INDEX_DIR
+        self.embedder = embedder or OllamaEmbedder()
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.refresh_interval = refresh_interval
+        self._vectors = None
+        self._meta = None
+        self._last_scan = 0.0
+        # _lock guards the current arrays; _update_lock serializes rebuilds,
+        # which embed without holding _lock so searches are never blocked
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.index_path / "vectors.npy"
+
+    @property
+    def _meta_file(self) -> Path:
+        return self.index_path / "meta.json"
+
+    def _load(self):
+        if self._meta is not None:
+            return
+        if self._meta_file.exists() and self._vectors_file.exists():
+            self._meta = json.loads(self._meta_file.read_text(encoding="utf-8"))
+            if self._meta.get("model") != self.embedder.model:
+                logger.info("Embedding model changed; rebuilding workspace index")
+                self._meta = {"model": self.embedder.model, "files": {}, "chunks": []}
+                self._vectors = None
+            else:
+                self._vectors = np.load(self._vectors_file, mmap_mode="r")
+        else:
+            self._meta = {"model": self.embedder.model, "files": {}, "chunks": []}
+            self._vectors = None
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        """Text files in the workspace keyed by relative path"""
+        found = {}
+        for root, dirs, files in os.walk(self.base_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                path = Path(root) / name
+                if path.suffix.lower() in TEXT_EXTENSIONS:
+                    found[path.relative_to(self.base_path).as_posix()] = path.stat()
+        return found
+
+    def update(self, wait: bool = True) -> Optional[Dict[str, float]]:
+        """
+        Bring the index up to date, re-embedding only new or changed files
+
+        Args:
+            wait: Wait for an update already running in another thread;
+                  when False, return None instead
+
+        Returns:
+            Counts of added, updated, removed and unchanged files, and seconds taken
+        """
+        if not self._update_lock.acquire(blocking=wait):
+            return None
+        try:
+            return self._update()
+        finally:
+            self._update_lock.release()
+
+    def refresh(self) -> bool:
+        """
+        Start an update in a background thread unless one is running
+
+        Returns:
+            True if a new update was started
+        """
+        # Taken here rather than in the thread, so `building` is true as soon as this returns
+        if not self._update_lock.acquire(blocking=False):
+            return False
+        try:
+            threading.Thread(target=self._refresh, name="workspace-index", daemon=True).start()
+        except Exception:
+            self._update_lock.release()
+            raise
+        return True
+
+    def _refresh(self):
+        try:
+            self._update()
+        except Exception:
+            logger.exception("Updating the workspace index failed")
+        finally:
+            self._update_lock.release()
+
+    @property
+    def building(self) -> bool:
+        """True while the first index is being built, before any search can answer"""
+        return self._update_lock.locked() and not self._vectors_file.exists()
+
+    def _update(self) -> Dict[str, float]:
+        start = time.perf_counter()
+        with self._lock:
+            self._load()
+            old_files = self._meta["files"]
+            old_chunks = self._meta["chunks"]
+            old_vectors = self._vectors
+        current = self._scan()
+
+        keep_rows: List[int] = []
+        new_files: Dict[str, Dict] = {}
+        new_chunks: List[Dict] = []
+        pending: List[Dict] = []
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        touched = False
+
+        for rel, stat in sorted(current.items()):
+            entry = old_files.get(rel)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                first = len(new_chunks)
+                keep_rows.extend(range(*entry["rows"]))
+                new_chunks.extend(old_chunks[entry["rows"][0]:entry["rows"][1]])
+                new_files[rel] = {**entry, "rows": [first, len(new_chunks)]}
+                stats["unchanged"] += 1
+                continue
+            try:
+                text = (self.base_path / rel).read_text(encoding="utf-8")
+            except (UnicodeDecodeError, OSError):
+                continue
+            digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+            if entry and entry["sha1"] == digest:
+                # Touched but not modified: keep the vectors, refresh the stat
+                first = len(new_chunks)
+                keep_rows.extend(range(*entry["rows"]))
+                new_chunks.extend(old_chunks[entry["rows"][0]:entry["rows"][1]])
+                new_files[rel] = {**entry, "mtime": stat.st_mtime, "size": stat.st_size,
+                                  "rows": [first, len(new_chunks)]}
+                stats["unchanged"] += 1
+                touched = True
+                continue
+            stats["updated" if entry else "added"] += 1
+            chunks = [{"file": rel, **c} for c in chunk_text(text, self.chunk_chars, self.overlap)]
+            pending.append({"rel": rel, "stat": stat, "sha1": digest, "chunks": chunks})
+
+        stats["removed"] = len(set(old_files) - set(current))
+
+        kept = np.asarray(old_vectors[keep_rows]) if keep_rows else None
+        parts = [kept] if kept is not None else []
+        texts = [c["text"] for p in pending for c in p["chunks"]]
+        if texts:
+            parts.append(self.embedder(texts))
+        for p in pending:
+            first = len(new_chunks)
+            new_chunks.extend(p["chunks"])
+            new_files[p["rel"]] = {"mtime": p["stat"].st_mtime, "size": p["stat"].st_size,
+                                   "sha1": p["sha1"], "rows": [first, len(new_chunks)]}
+
+        changed = (bool(pending) or touched or stats["removed"] > 0
+                   or not self._vectors_file.exists())
+        if changed:
+            vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+            self._write(vectors.astype(np.float32, copy=False),
+                        {"model": self.embedder.model, "files": new_files, "chunks": new_chunks})
+        self._last_scan = time.monotonic()
+
+        stats["seconds"] = time.perf_counter() - start
+        return stats
+
+    def _write(self, vectors, meta: Dict):
+        """Atomically replace the index files and re-map the vectors"""
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        # Per-process temp names: workers sharing a workspace may rebuild at the same time
+        tmp_vectors = self.index_path / f"vectors.{os.getpid()}.tmp.npy"
+        tmp_meta = self.index_path / f"meta.{os.getpid()}.tmp.json"
+        np.save(tmp_vectors, vectors)
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        with self._lock:
+            # Drop the old mapping before replacing the file underneath it
+            self._vectors = None
+            os.replace(tmp_vectors, self._vectors_file)
+            os.replace(tmp_meta, self._meta_file)
+            self._meta = meta
+            self._vectors = np.load(self._vectors_file, mmap_mode="r")
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        """
+        Find the chunks most similar to a query
+
+        Args:
+            query: Natural-language query
+            k: Number of chunks to return
+
+        Returns:
+            Chunks with file, line range, score and text, best first
+        """
+        if time.monotonic() - self._last_scan >= self.refresh_interval:
+            # Searches use the current index while a background thread updates it
+            self._last_scan = time.monotonic()
+            self.refresh()
+        with self._lock:
+            self._load()
+            vectors = self._vectors
+            chunks = self._meta["chunks"]
+        if vectors is None or len(chunks) == 0:
+            return []
+        query_vector = self.embedder([query])[0]
+        scores = vectors @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**chunks[i], "score": float(scores[i])} for i in top]
+
+    def search_workspace(self, query: str, k: int = 5) -> str:
+        """
+        Tool entry point: top-k workspace chunks as JSON
+
+        Args:
+            query: What to look for
+            k: Number of chunks to return
+
+        Returns:
+            JSON string of matching chunks, INDEX_BUILDING while the first
+            build runs, or an error message
+        """
+        try:
+            results = self.search(query, int(k))
+            if not results and self.building:
+                return INDEX_BUILDING
+            return json.dumps(results, indent=2)
+        except Exception as e:
+            return f"Error searching workspace: {str(e)}"
+
+def get_search_tool_schemas():
+    """
+    Get tool schemas for workspace search
+
+    Returns:
+        List of tool schemas compatible with Ollama
+    """
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "search_workspace",
+                "description": "Search the workspace files and return the most relevant passages",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "What to search for"
+                        },
+                        "k": {
+                            "type": "integer",
+                            "description": "Number of passages to return (default 5)"
+                        }
+                    },
+                    "required": ["query"]
+                }
+            }
+        }
+    ]
@@ -0,0 +1,129 @@
+# agents/usage.py
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+class Usage:
+    """Token counts and stage timings for every model and tool call in one request"""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.model_calls = 0
+        self.tool_calls = 0
+        self.model_seconds = 0.0
+        self.tool_seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, response: Any, seconds: float = 0.0):
+        """
+        Add the token counts of a chat response
+
+        Args:
+            response: Ollama chat response (dict or model)
+            seconds: Wall time of the call, including retries
+        """
+        prompt = response.get("prompt_eval_count") or 0
+        completion = response.get("eval_count") or 0
+        with self._lock:
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.model_calls += 1
+            self.model_seconds += seconds
+
+    def add_tool(self, seconds: float):
+        with self._lock:
+            self.tool_calls += 1
+            self.tool_seconds += seconds
+
+    def merge(self, other: 'Usage'):
+        """Add another collector's totals (e.g. from a worker thread)"""
+        with self._lock:
+            self.prompt_tokens += other.prompt_tokens
+            self.completion_tokens += other.completion_tokens
+            self.model_calls += other.model_calls
+            self.tool_calls += other.tool_calls
+            self.model_seconds += other.model_seconds
+            self.tool_seconds += other.tool_seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "model_calls": self.model_calls,
+            "tool_calls": self.tool_calls,
+            "model_seconds": self.model_seconds,
+            "tool_seconds": self.tool_seconds,
+        }
+
+    def server_timing(self, total_seconds: float) -> str:
+        """
+        Server-Timing header value for a request
+
+        Args:
+            total_seconds: Wall time of the whole agent call
+
+        Returns:
+            e.g. "agent;dur=812.4, model;dur=790.1;desc=2, tool;dur=0.0;desc=0"
+            (milliseconds; desc holds the call count)
+        """
+        return (f"agent;dur={total_seconds * 1000:.1f}, "
+                f"model;dur={self.model_seconds * 1000:.1f};desc={self.model_calls}, "
+                f"tool;dur={self.tool_seconds * 1000:.1f};desc={self.tool_calls}")
+
+# The Usage object is shared by reference, so calls made in worker threads
+# that copied this context still add to the request's totals
+_current_usage: contextvars.ContextVar = contextvars.ContextVar("agent_usage", default=None)
+
+def start_usage() -> contextvars.Token:
+    """Begin collecting usage for the current context; returns a reset token"""
+    return _current_usage.set(Usage())
+
+def end_usage(token: contextvars.Token):
+    """Stop collecting usage started with start_usage()"""
+    _current_usage.reset(token)
+
+def current_usage() -> Optional[Usage]:
+    """Usage collector for the current request, if one is active"""
+    return _current_usage.get()
+
+@contextmanager
+def track_usage() -> Iterator[Usage]:
+    """Collect token usage for every model call made inside the block"""
+    token = start_usage()
+    try:
+        yield _current_usage.get()
+    finally:
+        end_usage(token)
+
+@contextmanager
+def nested_usage() -> Iterator[Usage]:
+    """Like track_usage(), but also adds the block's totals to an enclosing collector
+
+    The totals are added even when the block raises: the tokens were spent.
+    """
+    outer = _current_usage.get()
+    with track_usage() as usage:
+        try:
+            yield usage
+        finally:
+            if outer is not None:
+                outer.merge(usage)
+
+def record_usage(response: Any, seconds: float = 0.0):
+    """Add a chat response to the active usage collector, if any"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add(response, seconds)
+
+def record_tool_usage(seconds: float):
+    """Add a tool call's wall time to the active usage collector, if any"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add_tool(seconds)
@@ -0,0 +1,77 @@
+# api/rate_limit.py
+import json
+import logging
+from typing import Iterable
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from agents.usage import track_usage
+from utils.rate_limit import RateLimiter, estimate_request_tokens
+
+logger = logging.getLogger(__name__)
+
+def take_rate_reservation(request: Request):
+    """
+    Hand a request's reservation to work that outlives it
+
+    Used by POST /jobs: the job settles the reservation against its real
+    usage when it finishes, so the middleware does not settle it.
+
+    Returns:
+        {"keys": [...], "estimate": n}, or None when the request was not limited
+    """
+    reservation = getattr(request.state, "rate_reservation", None)
+    request.state.rate_reservation = None
+    return reservation
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limiter: RateLimiter, paths: Iterable[str]):
+        """
+        Token-bucket limits for model-backed routes
+
+        Args:
+            app: ASGI application
+            limiter: Rate limiter shared by all requests
+            paths: Paths whose POST requests are limited
+        """
+        super().__init__(app)
+        self.limiter = limiter
+        self.paths = set(paths)
+
+    async def dispatch(self, request: Request, call_next):
+        if request.url.path not in self.paths or request.method != "POST":
+            return await call_next(request)
+
+        try:
+            data = json.loads(await request.body() or b"{}")
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+
+        auth = request.headers.get("authorization", "")
+        identities = {
+            # Requests without a session are limited by API key and IP only
+            "session": data.get("session_id"),
+            "api_key": request.headers.get("x-api-key") or (auth[7:] if auth.startswith("Bearer ") else None),
+            "ip": request.client.host if request.client else None,
+        }
+        estimate = estimate_request_tokens(data)
+        decision = self.limiter.check(identities, estimate)
+        if not decision.allowed:
+            logger.info("Rate limited by %s on %s", decision.scope, request.url.path)
+            return JSONResponse(
+                {"detail": "rate limit exceeded", "scope": decision.scope},
+                status_code=429,
+                headers={"Retry-After": decision.retry_after_header},
+            )
+
+        request.state.rate_reservation = {"keys": decision.charged, "estimate": estimate}
+        with track_usage() as usage:
+            try:
+                return await call_next(request)
+            finally:
+                # Not settled here if a background job took over the reservation
+                if request.state.rate_reservation is not None:
+                    self.limiter.settle(decision, estimate, usage.total_tokens)
@@ -1,13 +1,42 @@
 # api/server.py
-from fastapi import FastAPI, HTTPException
+import os
+import time
+import uuid
+import asyncio
+from typing import List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from examples.advanced_agent import AdvancedAgent
-import uvicorn
+from agents.errors import AgentError, CircuitOpenError
+from agents.jobs import get_job_queue
+from agents.registry import get_agent
+from agents.usage import nested_usage
+from api.rate_limit import RateLimitMiddleware, take_rate_reservation
+from config.settings import AgentConfig
+from logging_config import log_context
+from utils.diagnostics import get_monitor
+from utils.rate_limit import get_rate_limiter
 
 app = FastAPI(title="AI Agent API", version="1.0.0")
 
-# Global agent instance
-agent = AdvancedAgent()
+# Seconds a /chat request may run before a 504 is returned. The agent call is
+# not interrupted: its thread runs on until the agent's own REQUEST_DEADLINE
+# stops it, so keep REQUEST_DEADLINE no longer than this
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "300"))
+
+config = AgentConfig.from_env()
+if config.rate_limit_enabled:
+    app.add_middleware(RateLimitMiddleware, limiter=get_rate_limiter(config),
+                       paths=config.rate_limited_paths)
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag log records and the response with a request ID"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    with log_context(request_id=request_id):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
 
 class ChatRequest(BaseModel):
     message: str
@@ -17,8 +46,15 @@ class ChatResponse(BaseModel):
     response: str
     session_id: str
 
+def _timed_chat(message: str) -> Tuple[str, str]:
+    """Run the agent and return its answer with a Server-Timing header value"""
+    start = time.perf_counter()
+    with nested_usage() as usage:
+        answer = get_agent().chat(message)
+    return answer, usage.server_timing(time.perf_counter() - start)
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_response: Response):
     """
     Chat with the AI agent
     
@@ -29,14 +65,73 @@ async def chat_endpoint(request: ChatRequest):
         Agent response
     """
     try:
-        response = agent.chat(request.message)
+        # Run the blocking agent call off the event loop
+        with log_context(session_id=request.session_id):
+            response, timing = await asyncio.wait_for(
+                run_in_threadpool(_timed_chat, request.message),
+                timeout=REQUEST_TIMEOUT
+            )
+        http_response.headers["Server-Timing"] = timing
         return ChatResponse(
             response=response,
             session_id=request.session_id
         )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Agent request timed out")
+    except CircuitOpenError as e:
+        headers = {"Retry-After": str(max(1, int(e.retry_after or 1)))}
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+    except AgentError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class JobRequest(BaseModel):
+    message: Optional[str] = None
+    messages: List[str] = []
+    session_id: str = "default"
+    webhook_url: Optional[str] = None
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Start this worker's job pool (resuming jobs left from a restart) and diagnostics monitor"""
+    await run_in_threadpool(get_job_queue)
+    get_monitor()
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest, http_request: Request):
+    """
+    Queue a long-running agent job
+    
+    Args:
+        request: One message or a list of messages run as consecutive turns
+        
+    Returns:
+        The queued job; poll GET /jobs/{id} for progress
+    """
+    messages = request.messages or ([request.message] if request.message else [])
+    if not messages:
+        raise HTTPException(status_code=400, detail="message or messages is required")
+    queue = get_job_queue()
+    try:
+        await run_in_threadpool(queue.check_webhook, request.webhook_url)
+    except AgentError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    # The job settles the rate-limit reservation when it finishes
+    job = await run_in_threadpool(queue.submit, messages, request.session_id, request.webhook_url,
+                                  take_rate_reservation(http_request))
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get job status, progress, partial output and per-turn timings
+    """
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @app.get("/capabilities")
 async def get_capabilities():
     """
@@ -45,15 +140,29 @@ async def get_capabilities():
     Returns:
         List of available tools and their descriptions
     """
+    # Building the agent on first use is blocking work
+    agent = await run_in_threadpool(get_agent)
     return {
         "tools": [schema["function"]["name"] for schema in agent.tool_schemas],
         "capabilities": agent.get_capabilities()
     }
 
+@app.get("/diagnostics")
+async def diagnostics():
+    """
+    Backend reachability, model throughput, queue depth, cache hit rates
+    and memory (last background check; never calls a model)
+    """
+    return await run_in_threadpool(get_monitor().snapshot)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    agent = await run_in_threadpool(get_agent)
     return {"status": "healthy", "model": agent.model_name}
 
 if __name__ == "__main__":
+    import uvicorn
+
+    # Single-process development server; use serve.py for multiple workers
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,63 @@
+from flask import Flask, g, request
+import uuid
+import logging
+
+from config.settings import AgentConfig
+from logging_config import configure_logging, set_log_context, reset_log_context
+
+
+def create_app():
+    """Build the Flask application.
+
+    Nothing here creates an agent; routes fetch a per-process agent from
+    `agents.registry` on first use, so the app is safe to preload in a
+    pre-forking server.
+    """
+    # Configure logging early (writes to responses.log by default)
+    configure_logging(log_file="responses.log")
+
+    app = Flask(__name__)
+
+    # Register blueprint routes
+    from app.routes import bp as main_bp
+    app.register_blueprint(main_bp)
+    # Hashed, precompressed static bundles and the asset_url() template helper
+    from app.assets import init_assets
+    init_assets(app)
+    # Register centralized error handlers
+    from app.errors import register_error_handlers
+    register_error_handlers(app)
+
+    @app.before_request
+    def _start_background_workers():
+        # Per worker process, after any fork; resumes jobs left from a restart
+        from agents.jobs import get_job_queue
+        from utils.diagnostics import get_monitor
+        get_job_queue()
+        get_monitor()
+
+    config = AgentConfig.from_env()
+    if config.rate_limit_enabled:
+        from app.rate_limit import register_rate_limiter
+        from utils.rate_limit import get_rate_limiter
+        register_rate_limiter(app, get_rate_limiter(config), config.rate_limited_paths)
+
+    @app.before_request
+    def _bind_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+        g.log_tokens = set_log_context(request_id=g.request_id)
+
+    @app.after_request
+    def _echo_request_id(response):
+        if "request_id" in g:
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc):
+        tokens = g.pop("log_tokens", None)
+        if tokens:
+            reset_log_context(tokens)
+
+    logging.getLogger(__name__).info("Ollama app initialized")
+    return app
@@ -0,0 +1,323 @@
+# app/assets.py
+"""
+Static asset build and serving.
+
+`build()` concatenates the sources of each bundle, minifies them, writes a
+content-hashed file (e.g. main.3f2a9c1d04be.css) plus .gz and, when the
+brotli package is installed, .br variants, and records the names in
+build/manifest.json. Templates link bundles with asset_url("main.css");
+/assets/<name> serves the best precompressed variant with an immutable
+Cache-Control header, since a changed file always gets a new name.
+
+The build is a deploy step; the app only reads the manifest, so it can run
+from a read-only install:
+    python -m app.assets            # minified
+    python -m app.assets --no-minify
+"""
+import os
+import sys
+import gzip
+import json
+import hashlib
+import importlib
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import Blueprint, Flask, abort, current_app, request, send_file, url_for
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+BUILD_DIR = STATIC_DIR / "build"
+MANIFEST = "manifest.json"
+
+# Bundle name -> source files (relative to STATIC_DIR), in order
+BUNDLES: Dict[str, List[str]] = {
+    "main.css": ["style.css", "dropdown.css"],
+    "main.js": ["dropdown.js"],
+}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# After these characters (or keywords) a "/" starts a regular expression, not a division
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^}")
+_REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+                   "throw", "case", "do", "else", "yield", "await"}
+
+def _regex_allowed(text: str, i: int) -> bool:
+    """Whether the "/" at text[i] starts a JS regular expression literal"""
+    j = i - 1
+    while j >= 0 and text[j] in " \t\r\n":
+        j -= 1
+    if j < 0 or text[j] in _REGEX_AFTER:
+        return True
+    k = j
+    while k >= 0 and (text[k].isalnum() or text[k] in "_$"):
+        k -= 1
+    return text[k + 1:j + 1] in _REGEX_KEYWORDS
+
+def _literal_end(text: str, i: int) -> int:
+    """
+    End (exclusive) of the string, template or regex literal starting at text[i]
+
+    Quoted strings and regexes cannot span lines, so an unterminated one
+    returns i + 1 and its opening character is treated as plain code.
+    Template literals are copied up to the next unescaped backtick.
+    """
+    quote = text[i]
+    in_class = False
+    j = i + 1
+    while j < len(text):
+        c = text[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "\n" and quote != "`":
+            return i + 1
+        if quote == "/":
+            if c == "[":
+                in_class = True
+            elif c == "]":
+                in_class = False
+            elif c == "/" and not in_class:
+                return j + 1
+        elif c == quote:
+            return j + 1
+        j += 1
+    return i + 1
+
+def _minify(text: str, js: bool) -> str:
+    """
+    Conservative minifier: drops comments, indentation and blank lines
+
+    Literals are copied verbatim and whitespace inside a line is left
+    alone, so selector combinators, string contents and JS line breaks
+    (automatic semicolon insertion) keep their meaning.
+
+    Args:
+        text: CSS or JS source
+        js: Source is JavaScript (// comments, regex and template literals)
+    """
+    out: List[str] = []
+    i = 0
+    n = len(text)
+    line_start = True
+
+    def newline():
+        while out and out[-1] in (" ", "\t", "\r"):
+            out.pop()
+        if out and out[-1] != "\n":
+            out.append("\n")
+
+    while i < n:
+        c = text[i]
+        if line_start and c in " \t\r\n":
+            i += 1
+            continue
+        line_start = False
+        if c == "\n":
+            newline()
+            line_start = True
+            i += 1
+        elif c in "\"'" or (js and c == "`") or (js and c == "/" and not text.startswith(("//", "/*"), i)
+                                                and _regex_allowed(text, i)):
+            end = _literal_end(text, i)
+            out.append(text[i:end])
+            i = end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            end = n if end < 0 else end + 2
+            if "\n" in text[i:end]:
+                newline()
+                line_start = True
+            elif js:
+                # Keeps the tokens on either side apart; CSS comments separate nothing
+                out.append(" ")
+            i = end
+        elif js and text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+        else:
+            out.append(c)
+            i += 1
+    newline()
+    return "".join(out).rstrip("\n")
+
+def _optional(module: str):
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        return None
+
+def minify_css(text: str) -> str:
+    """Minify CSS with rcssmin when installed, otherwise conservatively"""
+    rcssmin = _optional("rcssmin")
+    return rcssmin.cssmin(text) if rcssmin is not None else _minify(text, js=False)
+
+def minify_js(text: str) -> str:
+    """Minify JS with rjsmin when installed, otherwise conservatively"""
+    rjsmin = _optional("rjsmin")
+    return rjsmin.jsmin(text) if rjsmin is not None else _minify(text, js=True)
+
+def _write(path: Path, data: bytes):
+    # Replaced atomically: a running app may be reading the previous build
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def build(static_dir: Path = STATIC_DIR, build_dir: Optional[Path] = None,
+          minify: bool = True) -> Dict[str, str]:
+    """
+    Build hashed, precompressed bundles and their manifest
+
+    Args:
+        static_dir: Directory holding the source files
+        build_dir: Output directory (default static_dir/build)
+        minify: Minify CSS and JS
+
+    Returns:
+        Manifest mapping bundle names to hashed file names
+    """
+    build_dir = Path(build_dir or static_dir / "build")
+    build_dir.mkdir(parents=True, exist_ok=True)
+    brotli = _optional("brotli")
+    manifest = {}
+
+    for name, sources in BUNDLES.items():
+        parts = []
+        for source in sources:
+            path = static_dir / source
+            if path.exists():
+                parts.append(path.read_text(encoding="utf-8"))
+            else:
+                logger.warning("Asset source missing, skipping: %s", path)
+        text = "\n".join(parts)
+        if minify:
+            text = minify_css(text) if name.endswith(".css") else minify_js(text)
+        data = text.encode("utf-8")
+
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        _write(build_dir / hashed, data)
+        # mtime=0 keeps the .gz byte-identical across builds
+        _write(build_dir / (hashed + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(build_dir / (hashed + ".br"), brotli.compress(data, quality=11))
+        manifest[name] = hashed
+
+    _write(build_dir / MANIFEST, json.dumps(manifest, indent=2).encode("utf-8"))
+
+    # Drop outputs of earlier builds
+    current = set(manifest.values())
+    for path in build_dir.iterdir():
+        base = path.name
+        for suffix in (".gz", ".br"):
+            base = base[:-len(suffix)] if base.endswith(suffix) else base
+        if path.name != MANIFEST and base not in current and not base.endswith(".tmp"):
+            path.unlink(missing_ok=True)
+    return manifest
+
+def _stale(static_dir: Path, build_dir: Path) -> bool:
+    manifest = build_dir / MANIFEST
+    if not manifest.exists():
+        return True
+    built = manifest.stat().st_mtime
+    return any((static_dir / s).exists() and (static_dir / s).stat().st_mtime > built
+               for sources in BUNDLES.values() for s in sources)
+
+def build_if_stale(static_dir: Path = STATIC_DIR, build_dir: Optional[Path] = None) -> Dict[str, str]:
+    """Build the assets if the manifest is missing or older than the sources (development servers)"""
+    build_dir = Path(build_dir or static_dir / "build")
+    if _stale(static_dir, build_dir):
+        logger.info("Building static assets")
+        return build(static_dir, build_dir)
+    return load_manifest(static_dir, build_dir)
+
+def load_manifest(static_dir: Path = STATIC_DIR, build_dir: Optional[Path] = None) -> Dict[str, str]:
+    """
+    Read the manifest written by build()
+
+    Raises:
+        RuntimeError: The assets have not been built
+    """
+    build_dir = Path(build_dir or static_dir / "build")
+    try:
+        manifest = json.loads((build_dir / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        raise RuntimeError(f"Static assets are not built in {build_dir}; run `python -m app.assets`") from None
+    if _stale(static_dir, build_dir):
+        logger.warning("Static assets are older than their sources; run `python -m app.assets`")
+    return manifest
+
+bp = Blueprint("assets", __name__)
+
+def _accepted_encodings(header: str) -> set:
+    """Encodings in an Accept-Encoding header that are not refused with q=0"""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def asset_url(name: str) -> str:
+    """URL of the current hashed build of a bundle, e.g. asset_url("main.css")"""
+    hashed = current_app.extensions["assets"].get(name)
+    if hashed is None:
+        raise KeyError(f"Unknown asset bundle: {name}")
+    return url_for("assets.asset", filename=hashed)
+
+@bp.route("/assets/<path:filename>")
+def asset(filename):
+    """Serve a hashed bundle, precompressed when the client accepts it"""
+    build_dir = current_app.config["ASSETS_BUILD_DIR"]
+    if filename not in current_app.extensions["assets"].values():
+        abort(404)
+    accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+    path, encoding = build_dir / filename, None
+    for name, suffix in ENCODINGS:
+        variant = build_dir / (filename + suffix)
+        if name in accepted and variant.exists():
+            path, encoding = variant, name
+            break
+    mimetype = "text/css" if filename.endswith(".css") else "application/javascript"
+    response = send_file(path, mimetype=mimetype, conditional=True,
+                         etag=f"{filename}-{encoding or 'identity'}")
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+def init_assets(app: Flask, build_dir: Optional[Path] = None):
+    """Register /assets and the asset_url() template helper on the app (does not build)"""
+    build_dir = Path(build_dir or BUILD_DIR)
+    app.config["ASSETS_BUILD_DIR"] = build_dir
+    app.extensions["assets"] = load_manifest(STATIC_DIR, build_dir)
+    app.register_blueprint(bp)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build hashed, precompressed static bundles")
+    parser.add_argument("--no-minify", action="store_true", help="Concatenate only")
+    args = parser.parse_args(argv)
+
+    manifest = build(minify=not args.no_minify)
+    for name, hashed in manifest.items():
+        variants = [s for _, s in ENCODINGS if (BUILD_DIR / (hashed + s)).exists()]
+        print(f"{name:<10} -> {hashed} ({(BUILD_DIR / hashed).stat().st_size} bytes; {' '.join(variants)})")
+    if _optional("brotli") is None:
+        print("brotli not installed: .br variants skipped (pip install brotli)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
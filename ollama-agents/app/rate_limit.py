@@ -0,0 +1,72 @@
+from flask import Response, g, request
+import logging
+
+from agents.usage import start_usage, end_usage, current_usage
+from utils.fastjson import dumps
+from utils.rate_limit import RateLimiter, estimate_request_tokens
+
+
+def request_identities(session_id):
+    """Identities a request is limited by: session, API key and client IP.
+
+    Scopes without an identity (no session_id, no API key) are not charged,
+    so anonymous callers do not share one session bucket.
+    """
+    auth = request.headers.get("Authorization", "")
+    api_key = request.headers.get("X-API-Key") or (auth[7:] if auth.startswith("Bearer ") else None)
+    return {"session": session_id, "api_key": api_key, "ip": request.remote_addr}
+
+
+def take_rate_reservation():
+    """Hand the current request's reservation to work that outlives it.
+
+    Used by POST /jobs: the job settles the reservation against its real
+    usage when it finishes, so the request itself does not settle it.
+    Returns None when the request was not rate limited.
+    """
+    decision = g.pop("rate_decision", None)
+    if decision is None:
+        return None
+    return {"keys": decision.charged, "estimate": g.pop("rate_estimate", 0)}
+
+
+def register_rate_limiter(app, limiter: RateLimiter, paths):
+    """Apply token-bucket limits to model-backed routes of the Flask `app`.
+
+    Requests reserve an estimate of their prompt tokens up front; once the
+    response is produced the reservation is replaced with the prompt and
+    completion tokens Ollama reported.
+    """
+    logger = logging.getLogger(__name__)
+    paths = set(paths)
+
+    @app.before_request
+    def _check_rate_limit():
+        if request.path not in paths or request.method != "POST":
+            return None
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            data = {}
+        estimate = estimate_request_tokens(data)
+        decision = limiter.check(request_identities(data.get("session_id")), estimate)
+        if not decision.allowed:
+            logger.info("Rate limited by %s on %s", decision.scope, request.path)
+            body = {"error": "rate limit exceeded", "scope": decision.scope,
+                    "retry_after": decision.retry_after_header}
+            return Response(dumps(body), status=429, mimetype="application/json",
+                            headers={"Retry-After": decision.retry_after_header})
+        g.rate_decision = decision
+        g.rate_estimate = estimate
+        g.usage_token = start_usage()
+        return None
+
+    @app.teardown_request
+    def _settle_rate_limit(exc):
+        decision = g.pop("rate_decision", None)
+        token = g.pop("usage_token", None)
+        if token is None:
+            return
+        if decision is not None:
+            usage = current_usage()
+            limiter.settle(decision, g.pop("rate_estimate", 0), usage.total_tokens if usage else 0)
+        end_usage(token)
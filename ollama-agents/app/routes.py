@@ -1,9 +1,15 @@
 # All route functions moved from flask_server.py (now as a Blueprint)
-from flask import Blueprint, request, jsonify, render_template
-import json
-import dataclasses
+from flask import Blueprint, Response, request, jsonify, render_template
+import time
 import logging
-from agents.base_agent import BaseAgent
+from agents.errors import AgentError, CircuitOpenError
+from agents.jobs import get_job_queue
+from agents.registry import get_agent
+from agents.usage import nested_usage
+from app.rate_limit import take_rate_reservation
+from logging_config import log_context
+from utils.diagnostics import get_monitor
+from utils.fastjson import dumps, dumps_str
 
 logger = logging.getLogger(__name__)
 
@@ -35,33 +41,75 @@ def chat_endpoint():
 		return jsonify({"error": str(e)}), 400
 
 	try:
-		logger.info("/chat received", extra={"session_id": session_id})
-		agent = BaseAgent()
-		response = agent.chat(message)
+		with log_context(session_id=session_id):
+			logger.info("/chat received")
+			agent = get_agent("base")
+			start = time.perf_counter()
+			with nested_usage() as usage:
+				response = agent.chat(message)
+			timing = usage.server_timing(time.perf_counter() - start)
 		# Normalize response to a JSON-serializable string in the `response` field
 		try:
-			if dataclasses.is_dataclass(response):
-				response_text = json.dumps(dataclasses.asdict(response))
-			elif isinstance(response, dict):
-				response_text = json.dumps(response)
+			if isinstance(response, str):
+				response_text = response
 			else:
-				response_text = str(response)
+				response_text = dumps_str(response)
 		except Exception:
 			response_text = str(response)
 
 		resp = {"response": response_text, "session_id": session_id}
-		return jsonify(resp), 200
+		return Response(dumps(resp), status=200, mimetype="application/json",
+						headers={"Server-Timing": timing})
+	except AgentError as e:
+		logger.warning("Agent error in /chat handler: %s", e)
+		headers = {}
+		if isinstance(e, CircuitOpenError):
+			headers["Retry-After"] = str(max(1, int(e.retry_after or 1)))
+		return jsonify({"error": str(e)}), e.status_code, headers
 	except Exception as e:
 		logger.exception("Error in /chat handler")
 		return jsonify({"error": str(e)}), 500
 
+@bp.route("/jobs", methods=["POST"])
+def create_job():
+	"""
+	Queue a long-running agent job
+	Expects JSON: {"message": "..."} or {"messages": [...]}, plus optional
+	"session_id" and "webhook_url". Returns 202 with the job.
+	"""
+	data = request.get_json(silent=True)
+	if not isinstance(data, dict):
+		data = {}
+	messages = data.get("messages") or ([data["message"]] if data.get("message") else [])
+	if not isinstance(messages, list) or not messages or not all(isinstance(m, str) for m in messages):
+		return jsonify({"error": "message or messages is required"}), 400
+	queue = get_job_queue()
+	try:
+		queue.check_webhook(data.get("webhook_url"))
+	except AgentError as e:
+		return jsonify({"error": str(e)}), e.status_code
+	# The job settles the rate-limit reservation when it finishes
+	job = queue.submit(messages, data.get("session_id", "default"), data.get("webhook_url"),
+	                   rate_charge=take_rate_reservation())
+	return Response(dumps(job), status=202, mimetype="application/json")
+
+@bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+	"""
+	Get job status, progress, partial output and per-turn timings
+	"""
+	job = get_job_queue().get(job_id)
+	if job is None:
+		return jsonify({"error": "Job not found"}), 404
+	return Response(dumps(job), status=200, mimetype="application/json")
+
 @bp.route("/capabilities", methods=["GET"])
 def get_capabilities():
 	"""
 	Get agent capabilities
 	"""
 	try:
-		agent = BaseAgent()
+		agent = get_agent("base")
 		return jsonify({
 			"tools": [schema["function"]["name"] for schema in agent.tool_schemas],
 			"capabilities": []  # No get_capabilities method in BaseAgent
@@ -70,12 +118,20 @@ def get_capabilities():
 		logger.exception("Error getting capabilities")
 		return jsonify({"error": str(e)}), 500
 
+@bp.route("/diagnostics", methods=["GET"])
+def diagnostics():
+	"""
+	Backend reachability, model throughput, queue depth, cache hit rates
+	and memory (last background check; never calls a model)
+	"""
+	return Response(dumps(get_monitor().snapshot()), status=200, mimetype="application/json")
+
 @bp.route("/health", methods=["GET"])
 def health_check():
 	"""Health check endpoint
 	Returns JSON for API requests, HTML for browsers.
 	"""
-	agent = BaseAgent()
+	agent = get_agent("base")
 	model = agent.model_name
 	status = "healthy"
 	# Content negotiation: JSON for API, HTML for browser
@@ -1,7 +1,7 @@
 # config/settings.py
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List, Tuple
 
 @dataclass
 class AgentConfig:
@@ -15,12 +15,95 @@ class AgentConfig:
     # Tool settings
     tool_timeout: int = 30
     max_tool_calls: int = 10
+    structured_output: bool = False     # validate tool args / answers and repair failures
+    structured_repair_attempts: int = 1
+    
+    # Resilience settings
+    request_deadline: Optional[float] = 300.0
+    model_timeout: float = 120.0
+    max_retries: int = 2
+    retry_backoff_base: float = 0.5
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30.0
     
     # Performance settings
     enable_caching: bool = True
     cache_size: int = 1000
     parallel_tools: bool = False
     
+    # Routing settings
+    small_model: str = "llama3.2:3b"
+    large_model: str = "qwen3:30b"
+    routing_confidence_threshold: float = 0.6
+    routing_max_small_words: int = 40
+    routing_small_patterns: List[str] = field(default_factory=lambda: [
+        r"^(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening))\b",
+        r"^(what|who|when|where) (is|are|was|were) [\w\s'-]{1,40}\??$",
+        r"^(define|translate|spell) \w+",
+    ])
+    routing_large_keywords: List[str] = field(default_factory=lambda: [
+        "explain", "analyze", "analyse", "compare", "design", "prove",
+        "debug", "refactor", "step by step", "why", "write a", "plan",
+        "summarize", "scrape", "report",
+    ])
+    route_cost_per_1k_tokens: Dict[str, float] = field(default_factory=lambda: {
+        "small": 0.1,
+        "large": 1.0,
+    })
+    
+    # Hedged request settings
+    hedge_enabled: bool = False
+    hedge_hosts: List[str] = field(default_factory=list)
+    hedge_models: List[str] = field(default_factory=list)
+    hedge_delay: Optional[float] = None  # None = adaptive p95 of first-chunk latency
+    
+    # Rate limiting settings (bucket sizes are in model tokens)
+    rate_limit_enabled: bool = False  # opt in with RATE_LIMIT_ENABLED=true
+    rate_limit_store: str = "memory"  # memory, sqlite or redis
+    rate_limit_sqlite_path: str = "ratelimit.db"
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limits: Dict[str, Tuple[float, float]] = field(default_factory=lambda: {
+        # scope: (capacity, refill per second)
+        "session": (20000, 50),
+        "api_key": (100000, 200),
+        "ip": (50000, 100),
+    })
+    rate_limited_paths: List[str] = field(default_factory=lambda: ["/chat", "/jobs"])
+    
+    # Background job settings
+    job_workers: int = 2
+    job_db_path: str = "jobs.db"
+    job_lease_seconds: float = 600.0
+    job_webhook_allow_private: bool = False  # allow webhooks to loopback/private hosts
+    
+    # Orchestrator settings
+    orchestrator_max_concurrency: int = 4
+    orchestrator_max_tokens: int = 50000      # shared by plan, sub-tasks and merge; 0 = unlimited
+    orchestrator_time_budget: float = 600.0   # seconds for a whole run
+    orchestrator_max_tasks: int = 6
+    orchestrator_result_chars: int = 4000     # sub-task output passed on to later steps
+    
+    # Workspace search (RAG) settings
+    rag_embedding_model: str = "nomic-embed-text"
+    rag_chunk_chars: int = 1200
+    rag_chunk_overlap: int = 200
+    rag_refresh_interval: float = 5.0  # seconds between change scans at search time
+    
+    # Diagnostics monitor
+    diagnostics_interval: float = 30.0
+    diagnostics_probe_model: Optional[str] = None  # None = small_model
+    diagnostics_probe_unloaded: bool = False       # probing an unloaded model forces a load
+    # One worker checks, the others read this file; None = every worker checks
+    diagnostics_shared_path: Optional[str] = os.path.join("data", "diagnostics.json")
+    
+    # Traffic recording (for utils.replay)
+    record_path: Optional[str] = None  # JSONL file; None disables recording
+    record_anonymize: str = "redact"   # redact, scrub, shape or off
+    record_salt: str = ""              # required for scrub and shape
+    
+    # Directory for runtime state shared between workers
+    data_dir: str = "data"
+    
     # Logging settings
     log_level: str = "INFO"
     log_file: str = "agent.log"
@@ -28,18 +111,59 @@ class AgentConfig:
     @classmethod
     def from_env(cls) -> 'AgentConfig':
         """Load configuration from environment variables"""
+        data_dir = os.getenv('AGENT_DATA_DIR', 'data')
         return cls(
             model_name=os.getenv('AGENT_MODEL', 'llama3.1'),
             temperature=float(os.getenv('AGENT_TEMPERATURE', '0.7')),
             tool_timeout=int(os.getenv('TOOL_TIMEOUT', '30')),
             max_tool_calls=int(os.getenv('MAX_TOOL_CALLS', '10')),
+            structured_output=os.getenv('AGENT_STRUCTURED_OUTPUT', 'false').lower() == 'true',
+            structured_repair_attempts=int(os.getenv('AGENT_STRUCTURED_REPAIR_ATTEMPTS', '1')),
+            request_deadline=float(os.getenv('REQUEST_DEADLINE', '300')),
+            model_timeout=float(os.getenv('MODEL_TIMEOUT', '120')),
+            max_retries=int(os.getenv('MAX_RETRIES', '2')),
+            breaker_failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')),
+            breaker_reset_timeout=float(os.getenv('BREAKER_RESET_TIMEOUT', '30')),
+            small_model=os.getenv('AGENT_SMALL_MODEL', 'llama3.2:3b'),
+            large_model=os.getenv('AGENT_LARGE_MODEL', 'qwen3:30b'),
+            routing_confidence_threshold=float(os.getenv('ROUTING_CONFIDENCE_THRESHOLD', '0.6')),
+            routing_max_small_words=int(os.getenv('ROUTING_MAX_SMALL_WORDS', '40')),
             enable_caching=os.getenv('ENABLE_CACHING', 'true').lower() == 'true',
+            hedge_enabled=os.getenv('HEDGE_ENABLED', 'false').lower() == 'true',
+            hedge_hosts=[h for h in os.getenv('HEDGE_HOSTS', '').split(',') if h],
+            hedge_models=[m for m in os.getenv('HEDGE_MODELS', '').split(',') if m],
+            hedge_delay=float(os.environ['HEDGE_DELAY']) if os.getenv('HEDGE_DELAY') else None,
+            rate_limit_enabled=os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true',
+            rate_limit_store=os.getenv('RATE_LIMIT_STORE', 'memory'),
+            rate_limit_sqlite_path=os.getenv('RATE_LIMIT_SQLITE_PATH', 'ratelimit.db'),
+            rate_limit_redis_url=os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'),
+            job_workers=int(os.getenv('JOB_WORKERS', '2')),
+            job_db_path=os.getenv('JOB_DB_PATH', 'jobs.db'),
+            job_lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '600')),
+            job_webhook_allow_private=os.getenv('JOB_WEBHOOK_ALLOW_PRIVATE', 'false').lower() == 'true',
+            orchestrator_max_concurrency=int(os.getenv('ORCHESTRATOR_MAX_CONCURRENCY', '4')),
+            orchestrator_max_tokens=int(os.getenv('ORCHESTRATOR_MAX_TOKENS', '50000')),
+            orchestrator_time_budget=float(os.getenv('ORCHESTRATOR_TIME_BUDGET', '600')),
+            rag_embedding_model=os.getenv('RAG_EMBEDDING_MODEL', 'nomic-embed-text'),
+            rag_chunk_chars=int(os.getenv('RAG_CHUNK_CHARS', '1200')),
+            rag_chunk_overlap=int(os.getenv('RAG_CHUNK_OVERLAP', '200')),
+            rag_refresh_interval=float(os.getenv('RAG_REFRESH_INTERVAL', '5')),
+            diagnostics_interval=float(os.getenv('DIAGNOSTICS_INTERVAL', '30')),
+            diagnostics_probe_model=os.getenv('DIAGNOSTICS_PROBE_MODEL') or None,
+            diagnostics_probe_unloaded=os.getenv('DIAGNOSTICS_PROBE_UNLOADED', 'false').lower() == 'true',
+            diagnostics_shared_path=os.getenv('DIAGNOSTICS_SHARED_PATH',
+                                              os.path.join(data_dir, 'diagnostics.json')) or None,
+            record_path=os.getenv('AGENT_RECORD_PATH') or None,
+            record_anonymize=os.getenv('AGENT_RECORD_ANONYMIZE', 'redact'),
+            record_salt=os.getenv('AGENT_RECORD_SALT', ''),
+            data_dir=data_dir,
             log_level=os.getenv('LOG_LEVEL', 'INFO')
         )
 
 # Optimized agent with caching
 from functools import lru_cache
 import hashlib
+from agents.error_handler import RobustAgent
 
 class OptimizedAgent(RobustAgent):
     def __init__(self, config: AgentConfig):
@@ -1,7 +1,11 @@
 # examples/advanced_agent.py
+import threading
+from typing import Callable
 from agents.base_agent import BaseAgent
+from agents.errors import AgentError
 from agents.tools.file_manager import FileManager, get_file_tool_schemas
 from agents.tools.web_scraper import WebScraper, get_web_tool_schemas
+from agents.tools.workspace_index import OllamaEmbedder, WorkspaceIndex, get_search_tool_schemas
 
 class AdvancedAgent(BaseAgent):
     def __init__(self, model_name: str = "llama3.1"):
@@ -13,26 +17,77 @@ class AdvancedAgent(BaseAgent):
         """
         super().__init__(model_name)
         
-        # Initialize tool instances
-        self.file_manager = FileManager()
-        self.web_scraper = WebScraper()
+        # Tool instances are created on first call
+        self._file_manager = None
+        self._web_scraper = None
+        self._workspace_index = None
+        self._tool_lock = threading.Lock()
         
         # Register all tools
         self._register_all_tools()
         
+    @property
+    def file_manager(self) -> FileManager:
+        """File manager, created (and workspace made) on first use"""
+        if self._file_manager is None:
+            with self._tool_lock:
+                if self._file_manager is None:
+                    self._file_manager = FileManager()
+        return self._file_manager
+        
+    @property
+    def web_scraper(self) -> WebScraper:
+        """Web scraper, created on first use"""
+        if self._web_scraper is None:
+            with self._tool_lock:
+                if self._web_scraper is None:
+                    self._web_scraper = WebScraper()
+        return self._web_scraper
+        
+    @property
+    def workspace_index(self) -> WorkspaceIndex:
+        """Vector index over the file manager's workspace, created (and built in the background) on first use"""
+        if self._workspace_index is None:
+            file_manager = self.file_manager
+            with self._tool_lock:
+                if self._workspace_index is None:
+                    from config.settings import AgentConfig
+                    config = AgentConfig.from_env()
+                    index = WorkspaceIndex(
+                        file_manager.base_path,
+                        embedder=OllamaEmbedder(config.rag_embedding_model, timeout=config.tool_timeout),
+                        chunk_chars=config.rag_chunk_chars,
+                        overlap=config.rag_chunk_overlap,
+                        refresh_interval=config.rag_refresh_interval,
+                    )
+                    index.refresh()
+                    self._workspace_index = index
+        return self._workspace_index
+        
+    def _deferred(self, instance_attr: str, method: str) -> Callable:
+        """Return a tool function that resolves its instance when called"""
+        def call_tool(**kwargs):
+            return getattr(getattr(self, instance_attr), method)(**kwargs)
+        call_tool.__name__ = method
+        return call_tool
+        
     def _register_all_tools(self):
         """Register all available tools with the agent"""
         
         # File management tools
         file_schemas = get_file_tool_schemas()
-        self.register_tool(file_schemas[0], self.file_manager.read_file)
-        self.register_tool(file_schemas[1], self.file_manager.write_file)
-        self.register_tool(file_schemas[2], self.file_manager.list_files)
+        self.register_tool(file_schemas[0], self._deferred("file_manager", "read_file"))
+        self.register_tool(file_schemas[1], self._deferred("file_manager", "write_file"))
+        self.register_tool(file_schemas[2], self._deferred("file_manager", "list_files"))
         
         # Web scraping tools
         web_schemas = get_web_tool_schemas()
-        self.register_tool(web_schemas[0], self.web_scraper.extract_text)
-        self.register_tool(web_schemas[1], self.web_scraper.extract_links)
+        self.register_tool(web_schemas[0], self._deferred("web_scraper", "extract_text"))
+        self.register_tool(web_schemas[1], self._deferred("web_scraper", "extract_links"))
+        
+        # Workspace search
+        search_schemas = get_search_tool_schemas()
+        self.register_tool(search_schemas[0], self._deferred("workspace_index", "search_workspace"))
         
     def get_capabilities(self) -> str:
         """
@@ -46,6 +101,7 @@ class AdvancedAgent(BaseAgent):
             "  - Read files from workspace",
             "  - Write content to files",
             "  - List all workspace files",
+            "  - Search workspace files by meaning",
             "",
             "Web Scraping:",
             "  - Extract text from webpages",
@@ -75,7 +131,10 @@ def main():
         if user_input.lower() == 'quit':
             break
             
-        response = agent.chat(user_input)
+        try:
+            response = agent.chat(user_input)
+        except AgentError as e:
+            response = f"Error: {e}"
         print(f"Agent: {response}\n")
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 # examples/simple_agent.py
 from agents.base_agent import BaseAgent
+from agents.errors import AgentError
 from agents.tools.file_manager import FileManager, get_file_tool_schemas
 
 def create_file_agent():
@@ -41,7 +42,10 @@ def main():
         if user_input.lower() == 'quit':
             break
             
-        response = agent.chat(user_input)
+        try:
+            response = agent.chat(user_input)
+        except AgentError as e:
+            response = f"Error: {e}"
         print(f"Agent: {response}\n")
 
 if __name__ == "__main__":
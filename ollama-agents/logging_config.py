@@ -1,19 +1,256 @@
+import os
+import queue
+import atexit
+import random
 import logging
-from logging import StreamHandler, FileHandler, Formatter
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging import StreamHandler, Formatter
+from logging.handlers import QueueHandler, RotatingFileHandler
 from pathlib import Path
 
+from utils.fastjson import dumps_str
 
-def configure_logging(log_file: str | None = None, level: int = logging.INFO):
+# Per-request identifiers attached to every record emitted in that context
+session_id_var = contextvars.ContextVar("session_id", default=None)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+# Base path of the file log when each process writes its own file
+_per_process_file = None
+
+
+def set_log_context(session_id: str | None = None, request_id: str | None = None):
+    """Bind session/request IDs to the current context.
+
+    Returns tokens for `reset_log_context`. Only the IDs passed are changed.
+    """
+    tokens = []
+    if session_id is not None:
+        tokens.append((session_id_var, session_id_var.set(session_id)))
+    if request_id is not None:
+        tokens.append((request_id_var, request_id_var.set(request_id)))
+    return tokens
+
+
+def reset_log_context(tokens):
+    """Undo a `set_log_context` call."""
+    for var, token in reversed(tokens):
+        var.reset(token)
+
+
+@contextmanager
+def log_context(session_id: str | None = None, request_id: str | None = None):
+    """Attach session/request IDs to log records emitted inside the block."""
+    tokens = set_log_context(session_id, request_id)
+    try:
+        yield
+    finally:
+        reset_log_context(tokens)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the context IDs onto the record in the emitting thread."""
+
+    def filter(self, record):
+        if getattr(record, "session_id", None) is None:
+            record.session_id = session_id_var.get()
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG (and lower) records."""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(Formatter):
+    """One JSON object per line, carrying session and request IDs."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "session_id": getattr(record, "session_id", None),
+            "request_id": getattr(record, "request_id", None),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return dumps_str(entry)
+
+
+class FastQueueHandler(QueueHandler):
+    """QueueHandler that skips the per-record copy and full format.
+
+    It is the only root handler, so the record can be finalised in place;
+    only the message and exception text are rendered on the request path.
+    """
+
+    exc_formatter = Formatter()
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = self.exc_formatter.formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that flushes once per batch instead of per record."""
+
+    def flush(self):
+        # Per-record flushes are skipped; close() still flushes the stream
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchingQueueListener:
+    """Background thread that writes queued records in batches and flushes once per batch.
+
+    It owns its worker thread rather than extending QueueListener, whose
+    thread and loop are private, so it can be restarted after fork.
+    """
+
+    _sentinel = None
+
+    def __init__(self, q, *handlers, batch_size: int = 100):
+        self.queue = q
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        """Start a new worker thread (also used in a forked child, where the old one is gone)."""
+        self._thread = threading.Thread(target=self._run, name="log-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far, then stop the worker thread."""
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self):
+        q = self.queue
+        stopping = False
+        while not stopping:
+            record = q.get()
+            batch = []
+            while True:
+                if record is self._sentinel:
+                    stopping = True
+                else:
+                    batch.append(record)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = q.get_nowait()
+                except queue.Empty:
+                    break
+            for item in batch:
+                self.handle(item)
+            for handler in self.handlers:
+                getattr(handler, "flush_batch", handler.flush)()
+
+
+def process_log_file(path: str | Path) -> Path:
+    """Per-process variant of a log file name: `responses.log` -> `responses.<pid>.log`."""
+    p = Path(path)
+    return p.with_name(f"{p.stem}.{os.getpid()}{p.suffix}")
+
+
+def _restart_listener():
+    """Listener threads do not survive fork; start a fresh one in the child.
+
+    With per-process files the child also switches to a file of its own, so
+    workers never rotate a file another process is writing.
+    """
+    if _listener is None:
+        return
+    if _per_process_file is not None:
+        # Records queued before the fork are the parent's to write
+        fresh = queue.SimpleQueue()
+        _listener.queue = fresh
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, FastQueueHandler):
+                handler.queue = fresh
+        for handler in _listener.handlers:
+            if isinstance(handler, RotatingFileHandler):
+                if handler.stream is not None:
+                    # Discard the inherited buffer rather than flush it into the parent's file
+                    devnull = os.open(os.devnull, os.O_WRONLY)
+                    os.dup2(devnull, handler.stream.fileno())
+                    os.close(devnull)
+                    handler.stream.close()
+                    handler.stream = None
+                handler.baseFilename = os.path.abspath(process_log_file(_per_process_file))
+    _listener.start()
+
+
+def configure_logging(
+    log_file: str | None = None,
+    level: int = logging.INFO,
+    structured: bool | None = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    debug_sample_rate: float | None = None,
+    batch_size: int = 100,
+    per_process: bool | None = None,
+):
     """Configure root logging for the application.
 
-    - Adds a console handler and optional file handler.
-    - Keeps formatting concise.
+    - Request threads only enqueue records; a background listener writes
+      them in batches to the console and optional rotating file handler.
+      A call costs about as much as a lone synchronous FileHandler (building
+      the record dominates) and less than console plus file did; console and
+      disk stalls no longer block the request thread.
+    - File records are JSON lines with session and request IDs unless
+      `structured` is False (defaults from LOG_JSON, on).
+    - DEBUG records are sampled at `debug_sample_rate` (LOG_DEBUG_SAMPLE_RATE).
+    - With `per_process` (LOG_PER_PROCESS, set by serve.py for multiple
+      workers) every process writes `<name>.<pid><suffix>` instead of sharing
+      one file, since rotation is not safe across processes.
     """
+    global _listener, _per_process_file
+
     root = logging.getLogger()
     if root.handlers:
         # Already configured
         return
 
+    if structured is None:
+        structured = os.getenv("LOG_JSON", "true").lower() == "true"
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    if per_process is None:
+        per_process = os.getenv("LOG_PER_PROCESS", "false").lower() == "true"
+
     root.setLevel(level)
 
     fmt = Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S")
@@ -21,12 +258,48 @@ def configure_logging(log_file: str | None = None, level: int = logging.INFO):
     ch = StreamHandler()
     ch.setLevel(level)
     ch.setFormatter(fmt)
-    root.addHandler(ch)
+    handlers = [ch]
 
     if log_file:
         p = Path(log_file)
         p.parent.mkdir(parents=True, exist_ok=True)
-        fh = FileHandler(p, encoding="utf-8")
+        if per_process:
+            _per_process_file = p
+            p = process_log_file(p)
+        fh = BatchedRotatingFileHandler(p, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
         fh.setLevel(level)
-        fh.setFormatter(fmt)
-        root.addHandler(fh)
+        fh.setFormatter(JsonFormatter() if structured else fmt)
+        handlers.append(fh)
+
+    log_queue = queue.SimpleQueue()
+    qh = FastQueueHandler(log_queue)
+    qh.addFilter(SamplingFilter(debug_sample_rate))
+    qh.addFilter(ContextFilter())
+    root.addHandler(qh)
+
+    _listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size)
+    _listener.start()
+
+
+def stop_logging():
+    """Write queued records, stop the background listener and remove the queue handler.
+
+    Logging can be configured again afterwards.
+    """
+    global _listener, _per_process_file
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, FastQueueHandler):
+            root.removeHandler(handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+    _per_process_file = None
+
+
+# Registered once per process; both do nothing until logging is configured
+atexit.register(stop_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener)
@@ -1,28 +1,18 @@
 # ollama_app.py
-from flask import Flask
-from examples.advanced_agent import AdvancedAgent
-from logging_config import configure_logging
+from app import create_app
+from app.assets import build_if_stale
 
 import os
 import logging
 
-# Configure logging early (writes to responses.log by default)
-configure_logging(log_file="responses.log")
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__, template_folder="app/templates")
-agent = AdvancedAgent()
-
-# Register blueprint routes
-from app.routes import bp as main_bp
-app.register_blueprint(main_bp)
-# Register centralized error handlers
-from app.errors import register_error_handlers
-register_error_handlers(app)
-
-logger.info("Ollama app initialized")
+# Development server only: production deploys run `python -m app.assets` as a build step
+build_if_stale()
+app = create_app()
 
 if __name__ == "__main__":
     debug_mode = os.environ.get("FLASK_DEBUG", "0") == "1"
     logger.info(f"Starting Flask development server on 0.0.0.0:8000 (debug={debug_mode})")
+    logger.info("For production use: python serve.py flask --workers 4")
     app.run(host="0.0.0.0", port=8000, debug=debug_mode)
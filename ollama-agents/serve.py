@@ -0,0 +1,100 @@
+# serve.py
+"""
+Production launcher for the Flask UI and the FastAPI server.
+
+Usage:
+    python serve.py flask --workers 4
+    python serve.py fastapi --workers 4 --port 8000
+
+The Flask app runs under gunicorn (threaded workers); the FastAPI app runs
+under uvicorn's multi-process supervisor. Both drain in-flight requests on
+SIGTERM for up to --graceful-timeout seconds before workers are stopped.
+"""
+import os
+import argparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Run the agent web apps with multiple workers")
+    parser.add_argument("app", choices=["flask", "fastapi"], help="Application to serve")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=_default_workers(),
+                        help="Number of worker processes")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WORKER_THREADS", "8")),
+                        help="Threads per worker (flask only)")
+    parser.add_argument("--keep-alive", type=int, default=int(os.getenv("KEEP_ALIVE", "5")),
+                        help="Seconds to hold idle keep-alive connections")
+    parser.add_argument("--timeout", type=int, default=int(os.getenv("REQUEST_TIMEOUT", "300")),
+                        help="fastapi: seconds before /chat answers 504; flask: gunicorn's worker "
+                             "heartbeat timeout, which does not stop a slow request. Agents stop "
+                             "themselves at REQUEST_DEADLINE")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT", "120")),
+                        help="Seconds to let in-flight requests finish on SIGTERM")
+    parser.add_argument("--no-preload", dest="preload", action="store_false",
+                        help="Import the app in each worker instead of the master (flask only)")
+    return parser
+
+def serve_flask(args: argparse.Namespace):
+    """Run the Flask app under gunicorn"""
+    from gunicorn.app.base import BaseApplication
+
+    class FlaskApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import create_app
+            return create_app()
+
+    FlaskApplication({
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        "keepalive": args.keep_alive,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        # Safe to preload: agents are created lazily in each worker
+        "preload_app": args.preload,
+    }).run()
+
+def serve_fastapi(args: argparse.Namespace):
+    """Run the FastAPI app under uvicorn with multiple worker processes"""
+    import uvicorn
+
+    # The request timeout is enforced inside the /chat handler
+    os.environ["REQUEST_TIMEOUT"] = str(args.timeout)
+    uvicorn.run(
+        "api.server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers > 1:
+        # Workers inherit this and each write their own log file
+        os.environ.setdefault("LOG_PER_PROCESS", "true")
+    logger.info("Serving %s with %d workers on %s:%d", args.app, args.workers, args.host, args.port)
+    if args.app == "flask":
+        serve_flask(args)
+    else:
+        serve_fastapi(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,851 @@
+# tests/test_agent.py
+import os
+import sys
+import time
+import pytest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.benchmarks import STARTUP_MODULES, IMPORT_TIME_BUDGET, measure_import
+
+@pytest.mark.parametrize("module", STARTUP_MODULES)
+def test_import_time_within_budget(module):
+    result = measure_import(module, runs=3)
+    assert result["loaded"] == [], f"{module} eagerly imports {result['loaded']}"
+    assert result["seconds"] < IMPORT_TIME_BUDGET
+
+def test_advanced_agent_defers_tool_instances(tmp_path, monkeypatch):
+    from examples.advanced_agent import AdvancedAgent
+
+    monkeypatch.chdir(tmp_path)
+    agent = AdvancedAgent()
+    assert agent._file_manager is None and agent._web_scraper is None
+    assert not (tmp_path / "workspace").exists()
+
+    assert agent.tools["write_file"](filename="a.txt", content="hi") == "Successfully wrote to a.txt"
+    assert agent._file_manager is not None and agent._web_scraper is None
+    assert agent.tools["read_file"](filename="a.txt") == "hi"
+
+def test_workspace_index_updates_incrementally(tmp_path):
+    pytest.importorskip("numpy")
+    from agents.tools.workspace_index import HashingEmbedder, WorkspaceIndex
+
+    (tmp_path / "cats.txt").write_text("cats purr and chase mice", encoding="utf-8")
+    (tmp_path / "ships.txt").write_text("ships sail across the ocean", encoding="utf-8")
+    index = WorkspaceIndex(tmp_path, embedder=HashingEmbedder(), refresh_interval=float("inf"))
+
+    assert index.update()["added"] == 2
+    assert index.search("which animals chase mice", k=1)[0]["file"] == "cats.txt"
+
+    (tmp_path / "ships.txt").write_text("rockets fly to the moon", encoding="utf-8")
+    stats = index.update()
+    assert (stats["updated"], stats["unchanged"]) == (1, 1)
+    assert index.search("rockets moon", k=1)[0]["file"] == "ships.txt"
+
+    # A rebuild embeds without holding the index lock, so searches keep answering
+    import threading
+    entered, release = threading.Event(), threading.Event()
+
+    class SlowEmbedder(HashingEmbedder):
+        def __call__(self, texts):
+            if threading.current_thread().name == "rebuild":
+                entered.set()
+                release.wait(5)
+            return super().__call__(texts)
+
+    index.embedder = SlowEmbedder()
+    (tmp_path / "cats.txt").write_text("cats sleep all day", encoding="utf-8")
+    rebuild = threading.Thread(target=index.update, name="rebuild")
+    rebuild.start()
+    assert entered.wait(5)
+    start = time.perf_counter()
+    assert index.search("rockets moon", k=1)[0]["file"] == "ships.txt"
+    assert time.perf_counter() - start < 1
+    release.set()
+    rebuild.join(5)
+    assert index.search("cats sleep", k=1)[0]["file"] == "cats.txt"
+    assert not list((tmp_path / ".index").glob("*.tmp*"))
+
+    # The first build runs in the background; searches say so instead of returning nothing
+    from agents.tools.workspace_index import INDEX_BUILDING
+
+    class BackgroundOnlySlow(HashingEmbedder):
+        def __call__(self, texts):
+            if threading.current_thread().name == "workspace-index":
+                release.wait(5)
+            return super().__call__(texts)
+
+    release.clear()
+    fresh = tmp_path / "fresh"
+    fresh.mkdir()
+    (fresh / "cats.txt").write_text("cats purr", encoding="utf-8")
+    building = WorkspaceIndex(fresh, embedder=BackgroundOnlySlow(), refresh_interval=0)
+    start = time.perf_counter()
+    assert building.search_workspace("cats") == INDEX_BUILDING
+    assert time.perf_counter() - start < 1
+    release.set()
+    for _ in range(100):
+        if not building.building:
+            break
+        time.sleep(0.01)
+    assert '"cats.txt"' in building.search_workspace("cats")
+
+def test_recorded_traffic_replays_against_stub(tmp_path):
+    import threading
+    from agents.base_agent import BaseAgent
+    from agents.recording import Anonymizer, Recorder, set_recorder
+    from utils.replay import StubTarget, load_records, replay
+    from utils.stub_backend import StubClient
+
+    path = tmp_path / "traffic.jsonl"
+    set_recorder(Recorder(str(path)))
+    try:
+        BaseAgent(client=StubClient(latency=0.01)).chat("mail alice@example.org")
+    finally:
+        set_recorder(None)
+
+    records = load_records(str(path))
+    assert len(records) == 1 and "alice" not in records[0]["message"]
+    assert len(records[0]["message"]) == len("mail alice@example.org")
+    assert records[0]["events"][0]["kind"] == "model"
+
+    result = replay(records, StubTarget(records), speed=0)
+    assert result["completed"] == 1 and result["latency"]["p50"] >= 0.01
+
+    # Pseudonyms need a secret salt; scrub keeps free text
+    with pytest.raises(ValueError):
+        Recorder(str(path), anonymize="scrub")
+    assert Anonymizer("scrub", "s").text("ask bob at bob@x.org").startswith("ask bob at user-")
+
+    # Concurrent replays of a cached-by-default tool each spend their own recorded time
+    def record(model_seconds, tool_seconds):
+        call = {"name": "read_file", "arguments": {"filename": "a.txt"}}
+        return {"t": 0.0, "message": "read a.txt", "seconds": 0.0, "events": [
+            {"kind": "model", "seconds": model_seconds, "chars": 0, "tool_calls": [call]},
+            {"kind": "tool", "name": "read_file", "seconds": tool_seconds, "chars": 3, "error": False},
+            {"kind": "model", "seconds": 0.0, "chars": 2, "tool_calls": []},
+        ]}
+    slow, fast = record(0.2, 0.3), record(0.0, 0.0)
+    target = StubTarget([slow, fast])
+    target(fast)
+    seconds = {}
+    def timed(name, rec):
+        started = time.perf_counter()
+        target(rec)
+        seconds[name] = time.perf_counter() - started
+    threads = [threading.Thread(target=timed, args=("slow", slow))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=timed, args=("fast", fast)))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    assert seconds["slow"] >= 0.5 and seconds["fast"] < 0.2
+
+def test_asset_build_writes_hashed_precompressed_bundles(tmp_path):
+    pytest.importorskip("flask")
+    import gzip
+    from app.assets import STATIC_DIR, build, load_manifest, minify_css, minify_js
+
+    manifest = build(STATIC_DIR, tmp_path)
+    assert set(manifest) == {"main.css", "main.js"}
+    for hashed in manifest.values():
+        data = (tmp_path / hashed).read_bytes()
+        assert gzip.decompress((tmp_path / (hashed + ".gz")).read_bytes()) == data
+    assert build(STATIC_DIR, tmp_path) == manifest
+
+    # The app only reads a build; it never builds one
+    with pytest.raises(RuntimeError):
+        load_manifest(STATIC_DIR, tmp_path / "missing")
+    assert not (tmp_path / "missing").exists()
+
+    # Combinators, string contents and regex literals survive minification
+    css = minify_css('/* c */\n  .nav :first-child {\n  content: "a  b";\n}\n')
+    assert css == '.nav :first-child {\ncontent: "a  b";\n}'
+    js = minify_js("var q = /'/; // quote\n  var s = 'a // b'; /* x */\n")
+    assert js == "var q = /'/;\nvar s = 'a // b';"
+
+def test_tool_cache_ttl_and_write_invalidation():
+    from agents.tool_cache import DEFAULT_POLICIES, ToolCache
+
+    now = [0.0]
+    cache = ToolCache(clock=lambda: now[0])
+    files = {"a.txt": "1"}
+    calls = []
+
+    def read_file(filename):
+        calls.append(filename)
+        return files[filename]
+
+    def write_file(filename, content):
+        files[filename] = content
+        return f"Successfully wrote to {filename}"
+
+    read = cache.wrap("read_file", read_file, DEFAULT_POLICIES["read_file"])
+    write = cache.wrap("write_file", write_file, DEFAULT_POLICIES["write_file"])
+
+    assert read(filename="a.txt") == read(filename="./a.txt") == "1"
+    assert len(calls) == 1
+    write(filename="a.txt", content="2")
+    assert read(filename="a.txt") == "2"
+    now[0] += DEFAULT_POLICIES["read_file"].ttl + 1
+    read(filename="a.txt")
+    assert len(calls) == 3
+    assert cache.stats()["read_file"] == {"hits": 1, "misses": 3, "invalidations": 1, "hit_rate": 0.25}
+
+    # A read that raced a write is returned but not cached
+    def racing_read(filename):
+        value = files[filename]
+        write(filename=filename, content="3")
+        return value
+
+    files["b.txt"] = "1"
+    raced = cache.wrap("read_file", racing_read, DEFAULT_POLICIES["read_file"])
+    assert raced(filename="b.txt") == "1"
+    assert read(filename="b.txt") == "3"
+
+def test_conversation_stores_less_than_the_dicts_it_sends():
+    import json
+    from agents.messages import Conversation
+    from utils.benchmarks import bench_memory
+
+    conversation = Conversation()
+    conversation.add("user", "hi")
+    conversation.add("tool", "42", tool_name="lookup")
+    assert conversation.as_dicts() == [{"role": "user", "content": "hi"},
+                                       {"role": "tool", "content": "42", "tool_name": "lookup"}]
+    assert json.loads(conversation.to_json()) == conversation.as_dicts()
+
+    results = bench_memory(sessions=100, turns=10)
+    assert results["compact_bytes_per_turn"] < results["legacy_bytes_per_turn"]
+
+def test_orchestrator_runs_dag_concurrently_within_budget():
+    from agents.errors import AgentError
+    from agents.orchestrator import SKIPPED, SUCCEEDED, Orchestrator, Task
+    from agents.usage import track_usage
+    from utils.stub_backend import StubClient
+
+    tasks = [Task("a", "A"), Task("b", "B"), Task("c", "C", depends_on=["a", "b"])]
+    result = Orchestrator(client=StubClient(latency=0.05), max_concurrency=2).run("task", tasks)
+    trace = {node.id: node for node in result.nodes}
+    assert [trace[i].status for i in ("a", "b", "c", "merge")] == [SUCCEEDED] * 4
+    assert trace["b"].started < trace["a"].finished <= trace["c"].started
+    assert result.usage["model_calls"] == 4
+
+    limited = Orchestrator(client=StubClient(latency=0.0), max_concurrency=1, max_tokens=1).run("task", tasks)
+    assert [node.status for node in limited.nodes] == [SUCCEEDED, SKIPPED, SKIPPED, SKIPPED]
+    assert limited.budget_exhausted == "tokens"
+
+    # Tokens spent by a run that fails still reach the caller's usage
+    class PlanOnly(StubClient):
+        def chat(self, messages=(), **kwargs):
+            if "Split the task" not in messages[-1]["content"]:
+                raise ValueError("model rejected the request")
+            return super().chat(messages=messages, **kwargs)
+
+    with track_usage() as usage:
+        with pytest.raises(AgentError):
+            Orchestrator(client=PlanOnly(latency=0.0)).run("task")
+    assert usage.model_calls == 1 and usage.total_tokens > 0
+
+def test_loadgen_finds_capacity_of_stub_backend():
+    from agents.base_agent import BaseAgent
+    from agents.usage import Usage, nested_usage, record_usage, track_usage
+    from utils.loadgen import AgentTarget, Workload, capacity_report, parse_mix, parse_server_timing, sweep
+    from utils.stub_backend import StubClient
+
+    usage = Usage()
+    usage.add({"eval_count": 3}, seconds=0.25)
+    assert parse_server_timing(usage.server_timing(0.3)) == {"agent": 300.0, "model": 250.0, "tool": 0.0}
+    # A failing block's tokens still count towards the enclosing request
+    with track_usage() as outer:
+        with pytest.raises(RuntimeError):
+            with nested_usage():
+                record_usage({"prompt_eval_count": 4, "eval_count": 2})
+                raise RuntimeError("agent failed")
+    assert outer.total_tokens == 6 and outer.model_calls == 1
+
+    # Scripted step results: the report logic does not depend on timing
+    def step(rate, p50, p95, achieved, errors=0.0):
+        return {"offered_rps": rate, "arrival_rps": rate, "requests": 100, "achieved_rps": achieved,
+                "error_rate": errors, "latency": {"p50": p50, "p95": p95}}
+
+    steps = [step(5, 0.1, 0.15, 5), step(10, 0.1, 0.18, 10), step(20, 0.12, 0.3, 19.5),
+             step(40, 0.5, 0.9, 30)]
+    report = capacity_report(steps, slo=0.2)
+    assert [s["meets_slo"] for s in steps] == [True, True, False, False]
+    assert report["max_sustainable_rps"] == 10 and report["saturation_rps"] == 40
+    assert report["peak_throughput_rps"] == 30
+    assert capacity_report([step(5, 0.1, 0.1, 5, errors=0.05)], slo=0.2)["max_sustainable_rps"] == 0.0
+
+    # Live sweep: one 20 ms generation slot serves about 50 req/s. Only
+    # orderings and wide ratios are checked, so slow machines still pass.
+    target = AgentTarget(BaseAgent(client=StubClient(latency=0.02, parallel=1)))
+    workload = Workload(parse_mix("short=3,long=1"), sessions=3, seed=7)
+    low, high = sweep(target, workload, [10, 200], duration=0.5, slo=5.0, warmup=0)["steps"]
+    assert low["completed"] == low["requests"] > 0 and high["completed"] == high["requests"]
+    assert not high["meets_slo"] and high["achieved_rps"] < 0.5 * high["arrival_rps"]
+    assert high["latency"]["p50"] > low["latency"]["p50"]
+    assert low["stages_ms"]["model"] > 0 and set(low["latency_by_profile"]) <= {"short", "long"}
+
+def test_structured_output_repairs_with_minimal_context():
+    from agents.base_agent import BaseAgent
+    from agents.errors import StructuredOutputError
+    from agents.schema import compile_schema
+    from utils.stub_backend import StubClient
+
+    params = {"type": "object", "properties": {"filename": {"type": "string"}},
+              "required": ["filename"], "additionalProperties": False}
+    assert compile_schema(params)({"file": 1}) == ["$: missing required property 'filename'",
+                                                   "$: unexpected property 'file'"]
+    assert compile_schema({"type": "integer"})(3.0) == ["$: expected integer, got float"]
+    one_of = compile_schema({"oneOf": [{"type": "integer"}, {"type": "number", "minimum": 0}]})
+    assert one_of(-2) == [] and one_of(0.5) == []
+    assert one_of(2) == ["$: matches 2 forms, expected exactly one"]
+    assert compile_schema({"anyOf": [{"type": "integer"}, {"type": "number", "minimum": 0}]})(2) == []
+    boolean = compile_schema({"type": "object", "properties": {"x": False, "y": True}, "items": False})
+    assert boolean({"y": 1}) == [] and boolean({"x": 1}) == ["$.x: no value is allowed here"]
+
+    client = StubClient(latency=0.0)
+    sent = []
+    chat = client.chat
+    client.chat = lambda **kwargs: sent.append((len(kwargs["messages"]), kwargs.get("format"))) or chat(**kwargs)
+    answer = {"type": "object", "properties": {"city": {"type": "string"}}, "required": ["city"]}
+    agent = BaseAgent(client=client, structured_output=True, answer_schema=answer, repair_attempts=1)
+    opened = []
+    agent.register_tool({"type": "function", "function": {"name": "read_file", "parameters": params}},
+                        lambda filename: opened.append(filename) or "Paris")
+
+    client.play([{"tool_calls": [{"name": "read_file", "arguments": '{"file": 1'}]},
+                 {"content": '{"filename": "city.txt"}'},
+                 {"content": "The city is Paris"},
+                 {"content": '{"city": "Paris"}'}])
+    assert agent.chat("Which city?") == '{"city": "Paris"}'
+    assert opened == ["city.txt"]
+    # Repairs send only the repair prompt, constrained by the schema being repaired
+    assert [fmt for _, fmt in sent] == [None, params, answer, answer]
+    assert sent[1][0] == sent[3][0] == 2
+
+    client.play([{"content": "no"}, {"content": "still no"}])
+    with pytest.raises(StructuredOutputError):
+        BaseAgent(client=client, structured_output=True, answer_schema=answer, repair_attempts=1).chat("?")
+
+    # Arguments that are valid JSON but not an object go back to the model in both modes
+    for structured in (False, True):
+        client = StubClient(latency=0.0)
+        chat = client.chat
+        tool_results = []
+        client.chat = lambda **kwargs: tool_results.extend(
+            m["content"] for m in kwargs["messages"] if m["role"] == "tool") or chat(**kwargs)
+        agent = BaseAgent(client=client, structured_output=structured, repair_attempts=0)
+        agent.register_tool({"type": "function", "function": {"name": "fetch", "parameters": {}}},
+                            lambda url: opened.append(url) or "page")
+        client.play([{"tool_calls": [{"name": "fetch", "arguments": '["http://x"]'}]}, {"content": "sorry"}])
+        assert agent.chat("fetch it") == "sorry"
+        assert tool_results == ["Error: invalid arguments for fetch: arguments must be a JSON object"]
+    assert opened == ["city.txt"]
+
+def test_router_classifies_whole_keywords_and_escalates():
+    from agents.router_agent import LARGE_ROUTE, SMALL_ROUTE, RouterAgent
+    from config.settings import AgentConfig
+    from utils.stub_backend import StubClient
+
+    config = AgentConfig(small_model="small", large_model="large")
+    client = StubClient(latency=0.0)
+    router = RouterAgent(config, client=client)
+    assert router.route("What is the largest planet?").route == SMALL_ROUTE
+    assert router.route("Who is the reporter on duty?").route == SMALL_ROUTE
+    assert router.route("Plan a trip to Rome").route == LARGE_ROUTE
+    assert router.route("Explain this step by step").reason == "keywords: explain, step by step"
+
+    client.play([{"content": "I'm not sure."}, {"content": "Jupiter."}])
+    assert router.chat("What is the largest planet?") == "Jupiter."
+    metrics = router.get_route_metrics()
+    assert metrics[SMALL_ROUTE]["escalations"] == 1 and metrics[LARGE_ROUTE]["requests"] == 1
+
+    # A failing small model is escalated instead of surfaced
+    class SmallDown(StubClient):
+        def chat(self, model="", **kwargs):
+            if model == "small":
+                raise ValueError("small model unavailable")
+            return super().chat(model=model, **kwargs)
+
+    assert RouterAgent(config, client=SmallDown(latency=0.0)).chat("hi") == "This is a stub response."
+
+    # Routed requests still run registered tools, on the route's model
+    calls = []
+
+    class Recording(StubClient):
+        def chat(self, model="", **kwargs):
+            calls.append(model)
+            return super().chat(model=model, **kwargs)
+
+    client = Recording(latency=0.0)
+    router = RouterAgent(config, client=client)
+    router.register_tool({"type": "function", "function": {"name": "lookup", "parameters": {
+        "type": "object", "properties": {"q": {"type": "string"}}, "required": ["q"]}}},
+        lambda q: f"found {q}")
+    client.play([{"tool_calls": [{"name": "lookup", "arguments": {"q": "jupiter"}}]},
+                 {"content": "Jupiter is the largest."}])
+    assert router.chat("What is the largest planet?") == "Jupiter is the largest."
+    assert calls == ["small", "small"]
+    assert router.get_route_metrics()[SMALL_ROUTE]["requests"] == 1
+
+def test_hedged_client_races_stub_targets(monkeypatch):
+    from agents.base_agent import BaseAgent
+    from agents.errors import DeadlineExceededError
+    from agents.hedging import HedgedClient
+    from agents.resilience import ResiliencePolicy
+    from utils.diagnostics import DiagnosticsMonitor
+    from utils.stub_backend import StubClient
+
+    class ToolStub(StubClient):
+        # Scripts are per thread and hedged attempts run in their own threads
+        def _next_event(self):
+            return {"content": "done", "tool_calls": [{"name": "lookup", "arguments": {"q": "x"}}]}
+
+    targets = {"slow": StubClient(latency=0.5), "fast": ToolStub(latency=0.0)}
+    built = []
+    hedged = HedgedClient(hosts=["slow", "fast"], hedge_delay=0.05,
+                          client_factory=lambda host, timeout: built.append(host) or targets[host])
+    agent = BaseAgent(client=hedged, policy=ResiliencePolicy(max_retries=0))
+    looked_up = []
+    agent.register_tool({"type": "function", "function": {"name": "lookup", "parameters": {"type": "object"}}},
+                        lambda q: looked_up.append(q) or f"found {q}")
+    assert agent.chat("look it up") == "done"
+    assert looked_up == ["x"]
+    assert hedged.get_metrics()["hedge_wins"] == 2
+    assert built == ["slow", "fast"]
+    assert DiagnosticsMonitor([None], "m").snapshot()["hedging"]["hedge_wins"] >= 2
+
+    # The hedge streams first, then fails mid-stream; the primary finishes the request
+    class Broken(StubClient):
+        def chat(self, **kwargs):
+            def chunks():
+                yield {"message": {"content": "partial"}, "done": False}
+                raise ConnectionError("connection reset")
+            return chunks()
+
+    fallback = HedgedClient(hosts=["ok", "broken"], hedge_delay=0,
+                            client_factory=lambda host, timeout: Broken() if host == "broken"
+                            else StubClient(latency=0.1, reply="complete"))
+    assert fallback.chat("m", [{"role": "user", "content": "hi"}])["message"]["content"] == "complete"
+    assert fallback.get_metrics()["primary_wins"] == 1
+
+    # Both targets slower than the request deadline
+    stuck = HedgedClient(hosts=["a", "b"], hedge_delay=0.05,
+                         client_factory=lambda host, timeout: StubClient(latency=2.0))
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceededError):
+        BaseAgent(client=stuck, policy=ResiliencePolicy(request_deadline=0.3)).chat("hi")
+    assert time.perf_counter() - start < 1.5
+
+    monkeypatch.setenv("HEDGE_ENABLED", "true")
+    monkeypatch.setenv("HEDGE_HOSTS", "http://a:11434,http://b:11434")
+    assert isinstance(BaseAgent()._model_client(), HedgedClient)
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_serve_workers_build_their_own_agents_lazily():
+    import serve
+    from agents import registry
+
+    args = serve.build_parser().parse_args(["flask", "--workers", "3", "--port", "9000"])
+    assert (args.app, args.workers, args.port, args.preload) == ("flask", 3, 9000, True)
+
+    built = []
+    registry.register_factory("counted", lambda: built.append(object()) or built[-1])
+    try:
+        assert built == []
+        agent = registry.get_agent("counted")
+        assert registry.get_agent("counted") is agent and len(built) == 1
+
+        # A forked worker (as with preload_app) must not share the master's agent
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, b"1" if registry.get_agent("counted") is not agent else b"0")
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read, 1) == b"1"
+    finally:
+        registry._factories.pop("counted", None)
+        registry._agents.pop("counted", None)
+
+def test_batched_json_logging_writes_one_file_per_process(tmp_path):
+    import json
+    import subprocess
+
+    script = """
+import os, sys, logging
+from logging_config import configure_logging, log_context, stop_logging
+configure_logging(log_file=sys.argv[1], structured=True, per_process=True, batch_size=10)
+log = logging.getLogger("worker")
+with log_context(session_id="s1", request_id="r1"):
+    for i in range(25):
+        log.info("record %d", i)
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        log.exception("failed")
+pid = os.fork()
+if pid == 0:
+    log.info("from child")
+    stop_logging()
+    os._exit(0)
+os.waitpid(pid, 0)
+stop_logging()
+assert not logging.getLogger().handlers
+print(os.getpid(), pid)
+"""
+    result = subprocess.run([sys.executable, "-c", script, str(tmp_path / "app.log")],
+                            cwd=Path(__file__).resolve().parent.parent,
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    parent, child = result.stdout.split()
+    assert not (tmp_path / "app.log").exists()
+
+    entries = [json.loads(line) for line in (tmp_path / f"app.{parent}.log").read_text().splitlines()]
+    assert [e["message"] for e in entries[:25]] == [f"record {i}" for i in range(25)]
+    assert all(e["session_id"] == "s1" and e["request_id"] == "r1" for e in entries)
+    assert "ZeroDivisionError" in entries[25]["exc"]
+    child_entries = [json.loads(line) for line in (tmp_path / f"app.{child}.log").read_text().splitlines()]
+    assert [e["message"] for e in child_entries] == ["from child"]
+
+def test_agent_calls_registered_tools():
+    from agents.base_agent import BaseAgent
+    from utils.stub_backend import StubClient
+
+    client = StubClient(latency=0.0)
+    sent = []
+    chat = client.chat
+    client.chat = lambda **kwargs: sent.append(kwargs) or chat(**kwargs)
+
+    # Without tools nothing is offered to the model
+    assert BaseAgent(client=client).chat("hi") == "This is a stub response."
+    assert sent[-1]["tools"] is None
+
+    agent = BaseAgent(client=client)
+    schema = {"type": "function", "function": {"name": "add", "parameters": {"type": "object"}}}
+    agent.register_tool(schema, lambda a, b: a + b)
+    sent.clear()
+    client.play([{"tool_calls": [{"name": "add", "arguments": {"a": 2, "b": 3}}]},
+                 {"content": "2 + 3 = 5"}])
+    assert agent.chat("What is 2 + 3?") == "2 + 3 = 5"
+    assert sent[0]["tools"] == [schema]
+    # The follow-up call carries the assistant's tool call and the tool result
+    assert [m["role"] for m in sent[1]["messages"]] == ["system", "user", "assistant", "tool"]
+    assert sent[1]["messages"][-1]["content"] == "5"
+
+def test_rate_limiter_settles_refunds_and_sets_retry_after():
+    from flask import Flask, jsonify
+    from agents.usage import record_usage
+    from app.rate_limit import register_rate_limiter
+    from utils.rate_limit import BucketRule, RateLimiter
+
+    now = [0.0]
+    limiter = RateLimiter({"session": BucketRule(100, 10), "ip": BucketRule(1000, 10)}, clock=lambda: now[0])
+    buckets = limiter.store._buckets
+
+    decision = limiter.check({"session": "s", "ip": "1"}, 80)
+    assert decision.allowed and decision.charged == ["rl:session:s", "rl:ip:1"]
+    limiter.settle(decision, 80, 150)
+    assert buckets["rl:session:s"][0] == -50 and buckets["rl:ip:1"][0] == 850
+
+    # The IP reservation is refunded when the session bucket refuses
+    denied = limiter.check({"ip": "1", "session": "s"}, 80)
+    assert not denied.allowed and denied.scope == "session"
+    assert denied.retry_after == pytest.approx(5.1) and denied.retry_after_header == "6"
+    assert buckets["rl:ip:1"][0] == 850
+    now[0] = 6.0
+    assert limiter.check({"session": "s"}, 1).allowed
+
+    # Requests without a session are not pooled into a shared session bucket
+    assert limiter.check({"session": None, "ip": "2"}, 5).charged == ["rl:ip:2"]
+
+    app = Flask(__name__)
+    limiter = RateLimiter({"session": BucketRule(100, 10)}, clock=lambda: now[0])
+    register_rate_limiter(app, limiter, ["/chat"])
+
+    @app.route("/chat", methods=["POST"])
+    def chat():
+        record_usage({"prompt_eval_count": 120, "eval_count": 30})
+        return jsonify(ok=True)
+
+    client = app.test_client()
+    assert client.post("/chat", json=["not", "an", "object"]).status_code == 200
+    assert client.post("/chat", json={"session_id": "a", "message": "hi"}).status_code == 200
+    assert limiter.store._buckets["rl:session:a"][0] == -50
+    limited = client.post("/chat", json={"session_id": "a", "message": "hi"})
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "6"
+
+    # The FastAPI middleware charges, settles and refuses the same way
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from api.rate_limit import RateLimitMiddleware
+
+    api = FastAPI()
+    limiter = RateLimiter({"session": BucketRule(100, 10)}, clock=lambda: now[0])
+    api.add_middleware(RateLimitMiddleware, limiter=limiter, paths=["/chat"])
+
+    @api.post("/chat")
+    def api_chat():
+        record_usage({"prompt_eval_count": 120, "eval_count": 30})
+        return {"ok": True}
+
+    client = TestClient(api)
+    assert client.post("/chat", json={"session_id": "a", "message": "hi"}).status_code == 200
+    assert limiter.store._buckets["rl:session:a"][0] == -50
+    limited = client.post("/chat", json={"session_id": "a", "message": "hi"})
+    assert limited.status_code == 429 and limited.headers["Retry-After"] == "6"
+
+    with pytest.raises(ValueError):
+        BucketRule(100, 0)
+
+def test_resilience_retries_breaks_on_exceptions_and_stops_at_deadline():
+    import threading
+    from agents.base_agent import BaseAgent
+    from agents.clients import ollama_client
+    from agents.errors import DeadlineExceededError
+    from agents.resilience import ResiliencePolicy, get_breaker
+    from utils.stub_backend import StubClient, serve
+
+    class Flaky(StubClient):
+        failures = 2
+
+        def chat(self, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("connection reset")
+            return super().chat(**kwargs)
+
+    retrying = ResiliencePolicy(max_retries=2, backoff_base=0.0)
+    assert BaseAgent("flaky", client=Flaky(latency=0.0), policy=retrying).chat("hi") == "This is a stub response."
+    assert get_breaker("model:flaky").state == "closed"
+
+    client = StubClient(latency=0.0)
+    sent = []
+    chat = client.chat
+    client.chat = lambda **kwargs: sent.append(kwargs["messages"]) or chat(**kwargs)
+    agent = BaseAgent(client=client, policy=ResiliencePolicy(max_retries=2, breaker_failure_threshold=2))
+    looked_up = []
+
+    def lookup(q):
+        looked_up.append(q)
+        if q == "missing":
+            return "Error: no entry for missing"
+        raise RuntimeError("index offline")
+
+    agent.register_tool({"type": "function", "function": {"name": "resilience_lookup",
+                                                          "parameters": {"type": "object"}}}, lookup)
+
+    def ask(q):
+        client.play([{"tool_calls": [{"name": "resilience_lookup", "arguments": {"q": q}}]}, {"content": "ok"}])
+        assert agent.chat(q) == "ok"
+        return sent[-1][-1]["content"]
+
+    # Error strings go straight back to the model and leave the breaker closed
+    for _ in range(3):
+        assert ask("missing") == "Error: no entry for missing"
+    assert get_breaker("tool:resilience_lookup").state == "closed"
+    # Exceptions count: two open the breaker and the third call never reaches the tool
+    assert ask("x") == ask("x") == "Error executing tool resilience_lookup"
+    assert "temporarily unavailable" in ask("x")
+    assert looked_up == ["missing"] * 3 + ["x", "x"]
+
+    # A model slower than the deadline is cut off at the deadline, not at MODEL_TIMEOUT
+    server = serve(StubClient(latency=2.0))
+    try:
+        slow = BaseAgent("slow", client=ollama_client(f"http://127.0.0.1:{server.server_port}", timeout=60),
+                         policy=ResiliencePolicy(request_deadline=0.3))
+        start = time.perf_counter()
+        with pytest.raises(DeadlineExceededError):
+            slow.chat("hi")
+        assert time.perf_counter() - start < 1.5
+        # ... also without retries, and the breaker does not blame the model for it
+        no_retry = BaseAgent("slow-no-retry", client=slow.client,
+                             policy=ResiliencePolicy(request_deadline=0.3, max_retries=0))
+        with pytest.raises(DeadlineExceededError):
+            no_retry.chat("hi")
+        assert get_breaker("model:slow-no-retry").failures == 0
+    finally:
+        server.shutdown()
+
+    # Calls abandoned after their timeout keep their threads; once all are
+    # taken, new calls are refused instead of queueing behind them
+    from agents import resilience
+    from agents.errors import CircuitOpenError
+    release = threading.Event()
+    policy = ResiliencePolicy()
+    try:
+        for _ in range(resilience.TOOL_WORKERS):
+            with pytest.raises(DeadlineExceededError):
+                policy.run_with_timeout(lambda: release.wait(5), 0.01, "stuck")
+        with pytest.raises(CircuitOpenError):
+            policy.run_with_timeout(lambda: "ran", 1, "next")
+    finally:
+        release.set()
+    for _ in range(100):
+        try:
+            assert policy.run_with_timeout(lambda: "ran", 1, "next") == "ran"
+            break
+        except CircuitOpenError:
+            time.sleep(0.01)
+    else:
+        pytest.fail("tool pool slots were not released")
+
+def test_job_queue_leases_resumes_settles_and_calls_webhook(tmp_path):
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from agents.errors import InvalidWebhookError
+    from agents.jobs import FAILED, SUCCEEDED, JobQueue, JobStore
+    from agents.usage import record_usage
+    from utils.rate_limit import BucketRule, RateLimiter
+
+    for url in ["ftp://example.com/hook", "http://127.0.0.1:9/hook", "http://localhost/hook",
+                "http://[::1]/hook", "http://169.254.169.254/latest"]:
+        with pytest.raises(InvalidWebhookError):
+            JobQueue(JobStore(str(tmp_path / "check.db")), object).submit(["hi"], webhook_url=url)
+
+    received = []
+
+    class Hook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Hook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    class Agent:
+        def chat(self, message):
+            record_usage({"prompt_eval_count": 10, "eval_count": 5})
+            return message.upper()
+
+    built = []
+
+    def agent_factory():
+        # Jobs run oldest first on the single worker; the second one gets no agent
+        built.append(1)
+        if len(built) == 2:
+            raise RuntimeError("no agent")
+        return Agent()
+
+    store = JobStore(str(tmp_path / "jobs.db"))
+    limiter = RateLimiter({"session": BucketRule(1000, 0.001)})
+    queue = JobQueue(store, agent_factory, workers=1, poll_interval=0.05,
+                     allow_private_webhooks=True, limiter=limiter)
+
+    # A job whose worker died after one turn: its lease has expired
+    orphan = store.create(["a", "b"], "s", None)
+    store.record_turn(store.claim_next(lease_seconds=-1)["id"], ["A"],
+                      [{"turn": 0, "total_tokens": 15}], lease_seconds=-1)
+    crashed = queue.submit(["x"])
+    decision = limiter.check({"session": "s"}, 40)
+    hooked = queue.submit(["c", "d"], "s", f"http://127.0.0.1:{server.server_port}/done",
+                          rate_charge={"keys": decision.charged, "estimate": 40})
+    assert "rate_charge" not in hooked
+
+    queue.start()
+    try:
+        for _ in range(200):
+            if len(received) == 1 and queue.get(hooked["id"])["status"] == SUCCEEDED:
+                break
+            time.sleep(0.02)
+    finally:
+        queue.stop(timeout=5)
+        server.shutdown()
+
+    # The crashing agent factory failed its job without killing the worker thread
+    assert queue.get(crashed["id"])["status"] == FAILED
+    assert queue.get(orphan)["outputs"] == ["A", "B"]
+    assert queue.get(hooked["id"])["outputs"] == ["C", "D"]
+    assert received[0]["id"] == hooked["id"] and "rate_charge" not in received[0]
+    # The 40-token estimate was replaced by the two turns' 30 tokens
+    assert limiter.store._buckets["rl:session:s"][0] == pytest.approx(1000 - 30, abs=0.1)
+
+    # A turn longer than the lease keeps its job: the heartbeat renews the lease
+    class SlowAgent:
+        def chat(self, message):
+            time.sleep(0.6)
+            return message
+
+    slow_store = JobStore(str(tmp_path / "slow.db"))
+    slow = JobQueue(slow_store, SlowAgent, workers=1, lease_seconds=0.2, poll_interval=0.02)
+    job = slow.submit(["a"])
+    slow.start()
+    try:
+        for _ in range(100):
+            if slow.get(job["id"])["status"] != "queued":
+                break
+            time.sleep(0.01)
+        for _ in range(20):
+            # Another worker polling the same table
+            assert slow_store.claim_next(lease_seconds=0.2) is None
+            time.sleep(0.02)
+        for _ in range(100):
+            if slow.get(job["id"])["status"] == SUCCEEDED:
+                break
+            time.sleep(0.02)
+    finally:
+        slow.stop(timeout=5)
+    assert slow.get(job["id"])["outputs"] == ["a"]
+
+    # Once a job is claimed again, the old lease can no longer store results
+    slow_store.create(["b"], "s", None)
+    stale = slow_store.claim_next(lease_seconds=-1)
+    current = slow_store.claim_next(lease_seconds=60)
+    assert current["id"] == stale["id"]
+    assert not slow_store.record_turn(stale["id"], ["B"], [], 60, stale["lease"])
+    assert not slow_store.finish(stale["id"], SUCCEEDED, lease=stale["lease"])
+    assert slow_store.finish(current["id"], SUCCEEDED, lease=current["lease"])
+
+def test_diagnostics_snapshot_is_checked_by_one_process(tmp_path):
+    pytest.importorskip("fcntl")
+    from utils.diagnostics import DiagnosticsMonitor, register_source, unregister_source
+    from utils.stub_backend import StubClient
+
+    class Backend(StubClient):
+        def ps(self):
+            return {"models": [{"model": "probe:latest"}]}
+
+    backend = Backend(latency=0.0)
+    connected = []
+    factory = lambda host, timeout: connected.append(host) or backend
+    shared = str(tmp_path / "diagnostics.json")
+    first, second = (DiagnosticsMonitor(["http://a:11434"], "probe", client_factory=factory, shared_path=shared)
+                     for _ in range(2))
+
+    register_source("test_queue", lambda: {"queued": 3})
+    try:
+        assert second.snapshot()["status"] == "unknown"
+        first.refresh()
+        second.refresh()
+        # Only the lock holder contacted the backend; the other read its results
+        assert connected == ["http://a:11434"]
+        report = second.snapshot()
+        assert report["status"] == "ok" and report["checked_by"] == os.getpid()
+        backend_report = report["backends"]["http://a:11434"]
+        assert backend_report["reachable"] and backend_report["probe"]["ok"]
+        assert report["test_queue"] == {"queued": 3}
+        assert {"breakers", "memory"} <= set(report)
+        # When the owner stops, another process takes over the checks
+        first.stop()
+        second.refresh()
+        assert connected == ["http://a:11434"] * 2
+        # The client is reused; a backend that lists models but not loaded ones is degraded
+        backend.ps = lambda: (_ for _ in ()).throw(ConnectionError("ps failed"))
+        second.refresh()
+        assert connected == ["http://a:11434"] * 2
+        report = second.snapshot()
+        assert report["backends"]["http://a:11434"]["status"] == "degraded"
+        assert report["status"] == "degraded"
+    finally:
+        unregister_source("test_queue")
+        first.stop()
+        second.stop()
@@ -0,0 +1,376 @@
+# utils/benchmarks.py
+"""
+Benchmarks for the agent stack.
+
+Usage:
+    python -m utils.benchmarks startup
+    python -m utils.benchmarks logging
+    python -m utils.benchmarks memory
+    python -m utils.benchmarks scaling --app flask --workers 1 2 4
+    python -m utils.benchmarks rag --files 200
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import subprocess
+import threading
+import statistics
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Modules imported on a cold start and the wall-clock budget for importing each
+STARTUP_MODULES = [
+    "agents.base_agent",
+    "agents.registry",
+    "agents.router_agent",
+    "examples.advanced_agent",
+    "utils.diagnostics",
+]
+IMPORT_TIME_BUDGET = 0.25  # seconds
+# Dependencies that must not be loaded until first use
+HEAVY_MODULES = ["ollama", "requests", "bs4", "psutil", "httpx", "numpy"]
+
+_IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure_import(module: str, runs: int = 5) -> Dict:
+    """
+    Measure the cold import time of a module in fresh interpreters
+
+    Args:
+        module: Module to import
+        runs: Number of fresh processes to sample
+
+    Returns:
+        Dict with the median import time and heavy modules it loaded
+    """
+    import json
+
+    samples = []
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(out)
+        samples.append(result["seconds"])
+        loaded = result["loaded"]
+    return {"module": module, "seconds": statistics.median(samples), "loaded": loaded}
+
+def bench_startup(runs: int = 5) -> List[Dict]:
+    """Measure import time for every startup module"""
+    return [measure_import(module, runs) for module in STARTUP_MODULES]
+
+def _wait_until_ready(url: str, timeout: float = 30.0):
+    """Poll a URL until it answers or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready")
+
+def hammer(url: str, concurrency: int, duration: float) -> Dict[str, float]:
+    """
+    Send requests to a URL from several threads for a fixed time
+
+    Args:
+        url: Endpoint to request
+        concurrency: Number of client threads
+        duration: Seconds to run
+
+    Returns:
+        Dict with request count, errors and requests per second
+    """
+    counts = {"ok": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    request = urllib.request.Request(url, headers={"Accept": "application/json"})
+
+    def worker():
+        ok = errors = 0
+        while time.monotonic() < stop_at:
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+                ok += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["ok"] += ok
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+    return {"requests": counts["ok"], "errors": counts["errors"], "rps": counts["ok"] / elapsed}
+
+def bench_scaling(app: str, worker_counts: List[int], path: str = "/health",
+                  duration: float = 10.0, clients_per_worker: int = 8, port: int = 8765) -> List[Dict]:
+    """
+    Measure throughput of a non-model endpoint as the worker count grows
+
+    Starts serve.py once per worker count, drives the endpoint, then sends
+    SIGTERM so the server drains before the next run.
+
+    Returns:
+        One result row per worker count
+    """
+    url = f"http://127.0.0.1:{port}{path}"
+    rows = []
+    for workers in worker_counts:
+        server = subprocess.Popen(
+            [sys.executable, "serve.py", app, "--workers", str(workers),
+             "--host", "127.0.0.1", "--port", str(port)],
+            cwd=PROJECT_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_ready(url)
+            result = hammer(url, workers * clients_per_worker, duration)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        result["workers"] = workers
+        rows.append(result)
+
+    base = rows[0]["rps"] / rows[0]["workers"] if rows and rows[0]["rps"] else 0
+    for row in rows:
+        row["efficiency"] = row["rps"] / (base * row["workers"]) if base else 0.0
+    return rows
+
+def bench_logging(records: int = 20000) -> Dict[str, float]:
+    """
+    Measure request-path cost of a log call with the queued pipeline
+
+    Compares the queued JSON pipeline against the synchronous setup it
+    replaced (console and file handlers on the calling thread), and
+    against a lone synchronous FileHandler. Console output goes to
+    os.devnull in every setup.
+
+    Returns:
+        Microseconds per call for each setup
+    """
+    import logging
+    import tempfile
+    import contextlib
+    import logging_config
+
+    def timed(logger) -> float:
+        start = time.perf_counter()
+        for i in range(records):
+            logger.info("Processing message %d: %.50s", i, "hello world")
+        return (time.perf_counter() - start) / records * 1e6
+
+    results = {}
+    root = logging.getLogger()
+    saved, saved_level = root.handlers[:], root.level
+    root.handlers.clear()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stderr(devnull):
+        try:
+            root.setLevel(logging.INFO)
+            fmt = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S")
+            console = logging.StreamHandler()
+            handler = logging.FileHandler(Path(tmp) / "sync.log")
+            for h in (console, handler):
+                h.setFormatter(fmt)
+                root.addHandler(h)
+            results["sync_console_file_us"] = timed(logging.getLogger("bench.sync"))
+            root.removeHandler(console)
+            results["sync_file_us"] = timed(logging.getLogger("bench.sync"))
+            root.removeHandler(handler)
+            handler.close()
+
+            logging_config.configure_logging(log_file=str(Path(tmp) / "queued.log"), structured=True)
+            with logging_config.log_context(session_id="bench", request_id="req"):
+                results["queued_json_us"] = timed(logging.getLogger("bench.queued"))
+            start = time.perf_counter()
+            logging_config.stop_logging()
+            results["drain_seconds"] = time.perf_counter() - start
+        finally:
+            logging_config.stop_logging()
+            root.handlers[:] = saved
+            root.setLevel(saved_level)
+    return results
+
+def bench_memory(sessions: int = 1000, turns: int = 10) -> Dict[str, float]:
+    """
+    Measure bytes per stored turn for conversation history
+
+    Compares the slotted Conversation against the previous representation,
+    a plain list of the message dicts sent to the model.
+
+    Returns:
+        Bytes per turn for each representation
+    """
+    import tracemalloc
+    from agents.messages import Conversation
+
+    # Distinct strings per turn, as real prompts would be
+    texts = [f"turn {i}: " + "lorem ipsum dolor sit amet " * 4 for i in range(sessions * turns)]
+
+    def measure(build) -> float:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        store = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del store
+        return used / (sessions * turns)
+
+    def legacy():
+        store = {}
+        for s in range(sessions):
+            history = []
+            for t in range(turns):
+                history.append({"role": "user" if t % 2 == 0 else "assistant", "content": texts[s * turns + t]})
+            store[s] = history
+        return store
+
+    def compact():
+        store = {}
+        for s in range(sessions):
+            conversation = Conversation()
+            for t in range(turns):
+                conversation.add("user" if t % 2 == 0 else "assistant", texts[s * turns + t])
+            store[s] = conversation
+        return store
+
+    return {"legacy_bytes_per_turn": measure(legacy), "compact_bytes_per_turn": measure(compact)}
+
+def bench_rag(files: int = 200, paragraphs: int = 20, queries: int = 200, k: int = 5,
+              model: str = None) -> Dict[str, float]:
+    """
+    Measure workspace index build time, incremental update, query latency and recall
+
+    A synthetic workspace is generated in a temporary directory. Queries are
+    sentences taken from known files; a hit means a chunk from that file is
+    in the top k. Without a model the deterministic hashing embedder is used,
+    so the benchmark runs without an Ollama server.
+
+    Returns:
+        Timings in seconds/milliseconds and recall@k
+    """
+    import random
+    import tempfile
+    from agents.tools.workspace_index import HashingEmbedder, OllamaEmbedder, WorkspaceIndex
+
+    rng = random.Random(0)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    embedder = OllamaEmbedder(model) if model else HashingEmbedder()
+
+    with tempfile.TemporaryDirectory() as workspace:
+        sentences = []
+        for f in range(files):
+            lines = []
+            for p in range(paragraphs):
+                sentence = " ".join(rng.choice(vocabulary) for _ in range(12))
+                lines.append(sentence)
+                sentences.append((f"doc{f}.txt", sentence))
+            Path(workspace, f"doc{f}.txt").write_text("\n".join(lines), encoding="utf-8")
+
+        index = WorkspaceIndex(workspace, embedder=embedder, refresh_interval=float("inf"))
+        build = index.update()
+
+        Path(workspace, "doc0.txt").write_text("changed " * 50, encoding="utf-8")
+        incremental = index.update()
+
+        samples = rng.sample([s for s in sentences if s[0] != "doc0.txt"], min(queries, len(sentences) - paragraphs))
+        latencies = []
+        hits = 0
+        for filename, sentence in samples:
+            start = time.perf_counter()
+            results = index.search(sentence, k)
+            latencies.append(time.perf_counter() - start)
+            hits += any(r["file"] == filename for r in results)
+
+    latencies.sort()
+    return {
+        "chunks": len(index._meta["chunks"]),
+        "build_seconds": build["seconds"],
+        "incremental_seconds": incremental["seconds"],
+        "query_p50_ms": latencies[len(latencies) // 2] * 1000,
+        "query_p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "recall_at_k": hits / len(samples),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent stack benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    startup = sub.add_parser("startup", help="Cold import time of the entry modules")
+    startup.add_argument("--runs", type=int, default=5)
+
+    log_bench = sub.add_parser("logging", help="Request-path cost of a log call")
+    log_bench.add_argument("--records", type=int, default=20000)
+
+    memory = sub.add_parser("memory", help="Bytes per stored conversation turn")
+    memory.add_argument("--sessions", type=int, default=1000)
+    memory.add_argument("--turns", type=int, default=10)
+
+    scaling = sub.add_parser("scaling", help="Throughput of a non-model endpoint vs worker count")
+    scaling.add_argument("--app", choices=["flask", "fastapi"], default="flask")
+    scaling.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    scaling.add_argument("--path", default="/health")
+    scaling.add_argument("--duration", type=float, default=10.0)
+
+    rag = sub.add_parser("rag", help="Workspace index build time, query latency and recall")
+    rag.add_argument("--files", type=int, default=200)
+    rag.add_argument("--queries", type=int, default=200)
+    rag.add_argument("-k", type=int, default=5)
+    rag.add_argument("--model", help="Ollama embedding model (default: offline hashing embedder)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "startup":
+        print(f"{'module':<28} {'ms':>8}  heavy modules loaded (budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)")
+        for row in bench_startup(args.runs):
+            print(f"{row['module']:<28} {row['seconds'] * 1000:>8.1f}  {', '.join(row['loaded']) or '-'}")
+
+    elif args.command == "logging":
+        results = bench_logging(args.records)
+        print(f"sync console + file:  {results['sync_console_file_us']:.2f} us/call")
+        print(f"sync FileHandler:     {results['sync_file_us']:.2f} us/call")
+        print(f"queued JSON pipeline: {results['queued_json_us']:.2f} us/call")
+        print(f"background drain:     {results['drain_seconds'] * 1000:.1f} ms")
+
+    elif args.command == "memory":
+        results = bench_memory(args.sessions, args.turns)
+        print(f"list of dicts:        {results['legacy_bytes_per_turn']:.0f} bytes/turn (excluding text)")
+        print(f"slotted Conversation: {results['compact_bytes_per_turn']:.0f} bytes/turn (excluding text)")
+
+    elif args.command == "scaling":
+        rows = bench_scaling(args.app, args.workers, args.path, args.duration)
+        print(f"{'workers':>8} {'rps':>10} {'errors':>8} {'efficiency':>11}")
+        for row in rows:
+            print(f"{row['workers']:>8} {row['rps']:>10.1f} {row['errors']:>8} {row['efficiency']:>10.0%}")
+
+    elif args.command == "rag":
+        results = bench_rag(args.files, queries=args.queries, k=args.k, model=args.model)
+        print(f"chunks indexed:        {results['chunks']}")
+        print(f"full build:            {results['build_seconds']:.2f} s")
+        print(f"one-file update:       {results['incremental_seconds'] * 1000:.1f} ms")
+        print(f"query latency p50/p95: {results['query_p50_ms']:.2f} / {results['query_p95_ms']:.2f} ms")
+        print(f"recall@{args.k}:              {results['recall_at_k']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,367 @@
 # utils/diagnostics.py
-import ollama
-import psutil
+"""
+Runtime diagnostics for the agent stack.
+
+A DiagnosticsMonitor thread periodically checks every Ollama backend
+(reachability, installed and loaded models) and runs a small streaming
+probe to measure time-to-first-token and tokens/s. /diagnostics serves the
+last result together with cheap in-process numbers (job queue depth,
+cache hit rates, circuit breakers, memory), so the endpoint never waits
+on a model. With several workers only the one holding the shared file's
+lock runs the checks; the others serve the results it writes.
+
+Usage:
+    python -m utils.diagnostics
+    python -m utils.diagnostics --json --model llama3.2:3b
+"""
 import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from typing import Any, Callable, Dict, List, Optional
 
-def check_system_requirements():
-    """Check if system meets minimum requirements"""
-    print("System Requirements Check:")
-    print(f"  RAM: {psutil.virtual_memory().total / (1024**3):.1f}GB")
-    print(f"  Available RAM: {psutil.virtual_memory().available / (1024**3):.1f}GB")
-    print(f"  CPU Cores: {psutil.cpu_count()}")
-    print(f"  Disk Space: {psutil.disk_usage('/').free / (1024**3):.1f}GB")
+from utils.lazy import lazy_import
 
-def check_ollama_installation():
-    """Verify Ollama installation and model availability"""
-    try:
-        # Check if Ollama is running
-        models = ollama.list()
-        print(f"\nOllama Status: Running")
-        print(f"Available Models:")
-        for model in models.get('models', []):
-            print(f"  - {model['name']}")
-            
-        return True
-    except Exception as e:
-        print(f"\nOllama Status: Error - {str(e)}")
-        return False
+try:
+    import fcntl
+except ImportError:  # Windows: every process runs its own checks
+    fcntl = None
+
+ollama = lazy_import("ollama")
+
+logger = logging.getLogger(__name__)
+
+# Extra sections for the report, e.g. cache hit rates: name -> zero-argument callable
+_sources: Dict[str, Callable[[], Any]] = {}
+
+def register_source(name: str, source: Callable[[], Any]):
+    """
+    Add a section to every diagnostics report
+
+    Args:
+        name: Report key
+        source: Cheap zero-argument callable returning JSON-serializable data
+    """
+    _sources[name] = source
+
+def unregister_source(name: str):
+    _sources.pop(name, None)
 
-def test_model_response(model_name: str = "llama3.1"):
-    """Test basic model functionality"""
+def process_memory() -> Dict[str, Any]:
+    """Resident memory of this process and free memory on the host"""
     try:
-        response = ollama.chat(
-            model=model_name,
-            messages=[{"role": "user", "content": "Hello"}]
-        )
-        print(f"\nModel Test ({model_name}): ✓ Working")
+        import psutil
+    except ImportError:
+        import resource
+        # ru_maxrss is KiB on Linux (peak, not current)
+        return {"peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    process = psutil.Process()
+    system = psutil.virtual_memory()
+    return {
+        "rss_mb": process.memory_info().rss / 2**20,
+        "system_available_mb": system.available / 2**20,
+        "system_percent": system.percent,
+    }
+
+def _names(response: Any) -> List[str]:
+    return [m.get("model") or m.get("name") for m in response.get("models", [])]
+
+def _tagged(model: str) -> str:
+    """Model name with the implicit :latest tag made explicit"""
+    return model if ":" in model else f"{model}:latest"
+
+class DiagnosticsMonitor:
+    def __init__(self, hosts: List[Optional[str]], probe_model: str, interval: float = 30.0,
+                 probe_unloaded: bool = False, timeout: float = 10.0,
+                 client_factory: Optional[Callable[[Optional[str], float], Any]] = None,
+                 shared_path: Optional[str] = None):
+        """
+        Background health and throughput monitor
+
+        Args:
+            hosts: Ollama hosts to check (None = the client default)
+            probe_model: Model used for the TTFT / tokens-per-second probe
+            interval: Seconds between checks
+            probe_unloaded: Also probe when the model is not loaded (forces a load)
+            timeout: Per-call timeout for checks and the probe
+            client_factory: Builds a client for a host (defaults to ollama.Client);
+                            called once per host
+            shared_path: File the results are shared through between processes;
+                         only the process holding `<shared_path>.lock` runs checks.
+                         Its directory is created if needed; if that fails, this
+                         process runs its own checks.
+        """
+        self.hosts = hosts or [None]
+        self.probe_model = probe_model
+        self.interval = interval
+        self.probe_unloaded = probe_unloaded
+        self.timeout = timeout
+        self.client_factory = client_factory or (lambda host, timeout: ollama.Client(host=host, timeout=timeout))
+        # One client (and connection pool) per host, reused by every check
+        self._clients: Dict[Optional[str], Any] = {}
+        self._backends: Dict[str, Dict[str, Any]] = {}
+        self._checked_at: Optional[float] = None
+        self._checked_by: Optional[int] = None
+        self.shared_path = shared_path if fcntl is not None else None
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, config) -> 'DiagnosticsMonitor':
+        hosts = [os.getenv("OLLAMA_HOST")] + [h for h in config.hedge_hosts if h != os.getenv("OLLAMA_HOST")]
+        return cls(hosts, config.diagnostics_probe_model or config.small_model,
+                   interval=config.diagnostics_interval, probe_unloaded=config.diagnostics_probe_unloaded,
+                   shared_path=config.diagnostics_shared_path)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="diagnostics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._lock_file is not None:
+            # Closing the file releases the lock; another process takes over the checks
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Diagnostics check failed")
+            self._stop.wait(self.interval)
+
+    def refresh(self):
+        """Run the checks if this process owns them, otherwise load the shared results"""
+        if self._owns_checks():
+            self.check()
+        else:
+            self._read_shared()
+
+    def _owns_checks(self) -> bool:
+        """Whether this process runs the checks (always, unless results are shared)"""
+        if self.shared_path is None or self._lock_file is not None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.shared_path)), exist_ok=True)
+            handle = open(f"{self.shared_path}.lock", "a")
+        except OSError as e:
+            logger.warning("Cannot share diagnostics through %s, checking in this process: %s",
+                           self.shared_path, e)
+            self.shared_path = None
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
         return True
-    except Exception as e:
-        print(f"\nModel Test ({model_name}): ✗ Failed - {str(e)}")
-        return False
 
-def full_diagnostic():
-    """Run complete system diagnostic"""
+    def check(self) -> Dict[str, Dict[str, Any]]:
+        """Check every backend now and store the results"""
+        results = {host or "default": self.check_backend(host) for host in self.hosts}
+        with self._lock:
+            self._backends = results
+            self._checked_at = time.time()
+            self._checked_by = os.getpid()
+            state = {"backends": results, "checked_at": self._checked_at, "checked_by": self._checked_by}
+        if self._lock_file is not None:
+            # Per-process temp name, replaced atomically so readers never see a partial file
+            tmp = f"{self.shared_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, default=str)
+            os.replace(tmp, self.shared_path)
+        return results
+
+    def _read_shared(self):
+        try:
+            with open(self.shared_path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            # Not written yet (or being replaced); keep the previous results
+            return
+        with self._lock:
+            self._backends = state["backends"]
+            self._checked_at = state["checked_at"]
+            self._checked_by = state["checked_by"]
+
+    def _client(self, host: Optional[str]) -> Any:
+        client = self._clients.get(host)
+        if client is None:
+            client = self._clients[host] = self.client_factory(host, self.timeout)
+        return client
+
+    def check_backend(self, host: Optional[str]) -> Dict[str, Any]:
+        """
+        Reachability, models and a throughput probe for one host
+
+        Returns:
+            Result whose status is "ok", "degraded" (reachable, but listing
+            loaded models failed) or "down" (unreachable)
+        """
+        result: Dict[str, Any] = {"status": "down", "reachable": False}
+        start = time.perf_counter()
+        try:
+            client = self._client(host)
+            installed = client.list()
+        except Exception as e:
+            result["error"] = str(e)
+            return result
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        result["reachable"] = True
+        result["models"] = _names(installed)
+        try:
+            result["loaded"] = _names(client.ps())
+        except Exception as e:
+            result["status"] = "degraded"
+            result["loaded"] = None
+            result["error"] = str(e)
+        else:
+            result["status"] = "ok"
+
+        # Probing a model that is not loaded would make Ollama load it
+        loaded = _tagged(self.probe_model) in {_tagged(name) for name in result["loaded"] or []}
+        if loaded or self.probe_unloaded:
+            result["probe"] = self.probe(client)
+        else:
+            result["probe"] = {"model": self.probe_model, "skipped": "model not loaded"}
+        return result
+
+    def probe(self, client: Any) -> Dict[str, Any]:
+        """Stream a short reply and time the first token and the generation rate"""
+        start = time.perf_counter()
+        first_token = None
+        final: Dict[str, Any] = {}
+        try:
+            for chunk in client.chat(model=self.probe_model, stream=True,
+                                     messages=[{"role": "user", "content": "Reply with the word OK."}],
+                                     options={"num_predict": 16}):
+                if first_token is None and chunk["message"].get("content"):
+                    first_token = time.perf_counter() - start
+                if chunk.get("done"):
+                    final = chunk
+        except Exception as e:
+            return {"model": self.probe_model, "ok": False, "error": str(e)}
+        total = time.perf_counter() - start
+        tokens = final.get("eval_count") or 0
+        # Ollama reports generation time in nanoseconds; fall back to wall time
+        eval_seconds = (final.get("eval_duration") or 0) / 1e9 or max(total - (first_token or 0), 1e-9)
+        return {
+            "model": self.probe_model,
+            "ok": True,
+            "ttft_ms": first_token * 1000 if first_token is not None else None,
+            "tokens_per_second": tokens / eval_seconds if tokens else None,
+            "total_ms": total * 1000,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Last backend results plus current in-process numbers (no model calls)"""
+        from agents.resilience import breaker_states
+
+        with self._lock:
+            report: Dict[str, Any] = {
+                "checked_at": self._checked_at,
+                "checked_by": self._checked_by,
+                "interval": self.interval,
+                "backends": dict(self._backends),
+            }
+        statuses = {b.get("status") for b in report["backends"].values()}
+        report["status"] = "ok" if "ok" in statuses else (
+            "unknown" if self._checked_at is None else "degraded")
+        report["breakers"] = breaker_states()
+        for name, source in list(_sources.items()):
+            try:
+                report[name] = source()
+            except Exception as e:
+                report[name] = {"error": str(e)}
+        report["memory"] = process_memory()
+        return report
+
+_monitor: Optional[DiagnosticsMonitor] = None
+_monitor_lock = threading.Lock()
+
+def get_monitor() -> DiagnosticsMonitor:
+    """Process-wide monitor configured from AgentConfig, started on first use"""
+    global _monitor
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                from config.settings import AgentConfig
+                monitor = DiagnosticsMonitor.from_config(AgentConfig.from_env())
+                monitor.start()
+                _monitor = monitor
+    return _monitor
+
+def _reset_after_fork():
+    global _monitor, _monitor_lock
+    if _monitor is not None and _monitor._lock_file is not None:
+        # The inherited descriptor would keep the parent's lock held after it exits
+        _monitor._lock_file.close()
+    _monitor = None
+    _monitor_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _print_report(report: Dict[str, Any], model: str):
     print("=== AI Agent Diagnostic ===")
-    
-    check_system_requirements()
-    ollama_ok = check_ollama_installation()
-    
-    if ollama_ok:
-        test_model_response()
-    else:
+    for host, backend in report["backends"].items():
+        label = {"ok": "reachable", "degraded": "DEGRADED"}.get(backend.get("status"), "UNREACHABLE")
+        print(f"\nOllama {host}: {label}")
+        if backend.get("error"):
+            print(f"  error: {backend['error']}")
+        if not backend["reachable"]:
+            continue
+        print(f"  list latency: {backend['latency_ms']:.1f} ms")
+        print(f"  installed: {', '.join(backend['models']) or '-'}")
+        if backend["loaded"] is not None:
+            print(f"  loaded:    {', '.join(backend['loaded']) or '-'}")
+        probe = backend["probe"]
+        if probe.get("ok"):
+            ttft = f"{probe['ttft_ms']:.0f} ms" if probe["ttft_ms"] is not None else "-"
+            rate = f"{probe['tokens_per_second']:.1f}" if probe["tokens_per_second"] else "-"
+            print(f"  probe {probe['model']}: ttft {ttft}, {rate} tokens/s")
+        else:
+            print(f"  probe {probe['model']}: {probe.get('skipped') or 'failed - ' + str(probe.get('error'))}")
+    memory = report["memory"]
+    print(f"\nMemory: {json.dumps(memory)}")
+    for name in _sources:
+        print(f"{name}: {json.dumps(report.get(name))}")
+    if report["status"] != "ok":
         print("\nRecommendations:")
         print("1. Install Ollama: curl -fsSL https://ollama.ai/install.sh | sh")
         print("2. Start Ollama service: ollama serve")
-        print("3. Pull a model: ollama pull llama3.1")
+        print(f"3. Pull a model: ollama pull {model}")
+
+def main(argv=None):
+    from config.settings import AgentConfig
+
+    config = AgentConfig.from_env()
+    parser = argparse.ArgumentParser(description="Check Ollama backends and measure model throughput")
+    parser.add_argument("--host", action="append", help="Ollama host (repeatable; default OLLAMA_HOST)")
+    parser.add_argument("--model", default=config.diagnostics_probe_model or config.small_model,
+                        help="Model to probe")
+    parser.add_argument("--no-load", action="store_true", help="Skip the probe if the model is not loaded")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    monitor = DiagnosticsMonitor(args.host or [os.getenv("OLLAMA_HOST")], args.model,
+                                 probe_unloaded=not args.no_load, timeout=60.0)
+    monitor.check()
+    report = monitor.snapshot()
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        _print_report(report, args.model)
+    return 0 if report["status"] == "ok" else 1
 
 if __name__ == "__main__":
-    full_diagnostic()
+    sys.exit(main())
@@ -0,0 +1,43 @@
+# utils/fastjson.py
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    """Fallback for objects json cannot encode (dataclasses, pydantic models, slotted types)"""
+    if hasattr(obj, "as_dict"):
+        return obj.as_dict()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(exclude_none=True)
+    if hasattr(obj, "__dataclass_fields__"):
+        import dataclasses
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize to compact UTF-8 JSON, using orjson when installed
+
+    Args:
+        obj: Object to serialize
+
+    Returns:
+        JSON document as bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_str(obj: Any) -> str:
+    """Serialize to a JSON string"""
+    return dumps(obj).decode("utf-8")
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,44 @@
+# utils/lazy.py
+import importlib
+import threading
+import types
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name: str):
+        """
+        Module proxy that imports the real module on first attribute access
+
+        Args:
+            name: Fully qualified module name
+        """
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Defer importing a heavy dependency until it is actually used
+
+    Args:
+        name: Fully qualified module name
+
+    Returns:
+        Proxy that behaves like the module once touched
+    """
+    return LazyModule(name)
@@ -0,0 +1,408 @@
+# utils/loadgen.py
+"""
+Open-loop load generator and capacity report.
+
+Requests arrive as a Poisson process at each offered rate in turn, whatever
+the target's response times (unlike a closed loop, a slow server does not
+slow the arrivals down), with prompts drawn from a weighted mix of length
+profiles and session ids reused from a pool. Each step reports latency
+percentiles, throughput and errors; the report names the highest rate that
+meets the latency SLO and the rate where the target saturates.
+
+Per-stage times (model, tools, agent vs. everything else) come from the
+agent's usage collector in process, or from the Server-Timing header that
+/chat returns in both apps.
+
+Usage:
+    python -m utils.loadgen                                  # in-process agent, stub backend
+    python -m utils.loadgen --serve flask --rates 2,4,8,16   # spawn serve.py against the stub
+    python -m utils.loadgen --url http://localhost:8000 --backend ollama --slo 5
+    python -m utils.loadgen --mix short=1,long=1 --sessions 20 --json > capacity.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.benchmarks import _wait_until_ready
+from utils.replay import summarize
+from utils.stub_backend import StubClient, serve
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Prompt length profiles: name -> (min words, max words)
+PROFILES: Dict[str, Tuple[int, int]] = {
+    "short": (5, 20),
+    "medium": (60, 150),
+    "long": (400, 800),
+}
+
+_WORDS = ("agent model request latency queue token cache session memory server "
+          "python answer summary file search report error budget window trace").split()
+
+# Stages reported per request, in milliseconds
+STAGES = ("agent", "model", "tool", "overhead")
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    """
+    Parse a profile mix such as "short=6,medium=3,long=1"
+
+    Raises:
+        ValueError: On unknown profiles or non-positive total weight
+    """
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in PROFILES:
+            raise ValueError(f"Unknown prompt profile: {name} (choose from {', '.join(PROFILES)})")
+        mix.append((name, float(weight or 1)))
+    if sum(w for _, w in mix) <= 0:
+        raise ValueError("Prompt mix needs a positive weight")
+    return mix
+
+class Workload:
+    def __init__(self, mix: List[Tuple[str, float]], sessions: int = 10, reuse: float = 0.8,
+                 seed: Optional[int] = None):
+        """
+        Draw prompts and session ids for generated requests
+
+        Args:
+            mix: (profile, weight) pairs from parse_mix()
+            sessions: Size of the pool of returning sessions
+            reuse: Probability a request belongs to a pooled session rather than a new one
+            seed: Random seed, for repeatable runs
+        """
+        self.mix = mix
+        self.sessions = [f"load-{i}" for i in range(max(1, sessions))]
+        self.reuse = reuse
+        self._random = random.Random(seed)
+        self._new_sessions = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> Tuple[str, str, str]:
+        """Return (profile, message, session id) for the next request"""
+        with self._lock:
+            profile = self._random.choices([n for n, _ in self.mix], [w for _, w in self.mix])[0]
+            low, high = PROFILES[profile]
+            message = " ".join(self._random.choice(_WORDS) for _ in range(self._random.randint(low, high)))
+            if self._random.random() < self.reuse:
+                session = self._random.choice(self.sessions)
+            else:
+                self._new_sessions += 1
+                session = f"load-new-{self._new_sessions}"
+        return profile, message, session
+
+    def gaps(self, rate: float, duration: float) -> List[float]:
+        """Poisson arrival offsets (seconds from the step start) for one rate"""
+        offsets, t = [], 0.0
+        with self._lock:
+            while True:
+                t += self._random.expovariate(rate)
+                if t >= duration:
+                    return offsets
+                offsets.append(t)
+
+class AgentTarget:
+    def __init__(self, agent):
+        """Call an agent in this process and read stage times from its usage"""
+        self.agent = agent
+
+    def __call__(self, message: str, session: str) -> Dict[str, float]:
+        from agents.usage import track_usage
+        from logging_config import log_context
+
+        start = time.perf_counter()
+        with log_context(session_id=session), track_usage() as usage:
+            self.agent.chat(message)
+        return {"agent": (time.perf_counter() - start) * 1000,
+                "model": usage.model_seconds * 1000, "tool": usage.tool_seconds * 1000}
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """{"agent": 812.4, "model": 790.1, ...} from a Server-Timing header"""
+    stages = {}
+    for metric in header.split(","):
+        name, *params = [p.strip() for p in metric.split(";")]
+        for param in params:
+            if param.startswith("dur="):
+                try:
+                    stages[name] = float(param[4:])
+                except ValueError:
+                    pass
+    return stages
+
+class HttpTarget:
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        """POST to /chat of a running Flask or FastAPI app"""
+        self.url = base_url.rstrip("/") + "/chat"
+        self.timeout = timeout
+
+    def __call__(self, message: str, session: str) -> Dict[str, float]:
+        body = json.dumps({"message": message, "session_id": session}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+                return parse_server_timing(response.headers.get("Server-Timing", ""))
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"HTTP {e.code}") from e
+
+def run_step(target: Callable[[str, str], Dict[str, float]], workload: Workload, rate: float,
+             duration: float, max_inflight: int = 256) -> Dict[str, Any]:
+    """
+    Offer one arrival rate for `duration` seconds and wait for the requests to finish
+
+    Latency is measured from each request's scheduled arrival, so time spent
+    waiting for a free client thread counts as queueing, as it would for a user.
+
+    Returns:
+        Step result with latency percentiles, throughput, errors and mean stage times
+    """
+    latencies: List[float] = []
+    finishes: List[float] = []
+    by_profile: Dict[str, List[float]] = defaultdict(list)
+    stages: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+
+    def send(profile: str, message: str, session: str, scheduled: float):
+        try:
+            timing = target(message, session)
+        except Exception as e:
+            with lock:
+                errors[str(e) if str(e).startswith("HTTP ") else type(e).__name__] += 1
+            return
+        finished = time.perf_counter()
+        latency = finished - scheduled
+        with lock:
+            finishes.append(finished)
+            latencies.append(latency)
+            by_profile[profile].append(latency)
+            for stage in ("agent", "model", "tool"):
+                if stage in timing:
+                    stages[stage].append(timing[stage])
+            if "agent" in timing:
+                stages["overhead"].append(max(0.0, latency * 1000 - timing["agent"]))
+
+    offsets = workload.gaps(rate, duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="loadgen") as pool:
+        futures = []
+        for offset in offsets:
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, *workload.next(), scheduled))
+        wait(futures)
+
+    # Throughput over the span of completions: it tracks the arrival rate
+    # until the target saturates, then levels off at its service rate
+    sent = len(offsets)
+    span = max(finishes) - min(finishes) if len(finishes) > 1 else 0.0
+    achieved = (len(finishes) - 1) / span if span else len(finishes) / duration
+    return {
+        "offered_rps": rate,
+        "arrival_rps": sent / duration,
+        "requests": sent,
+        "completed": len(latencies),
+        "achieved_rps": achieved,
+        "error_rate": sum(errors.values()) / sent if sent else 0.0,
+        "errors": dict(errors),
+        "latency": summarize(latencies),
+        "latency_by_profile": {name: summarize(values) for name, values in sorted(by_profile.items())},
+        "stages_ms": {name: sum(stages[name]) / len(stages[name]) for name in STAGES if stages[name]},
+    }
+
+def _meets_slo(step: Dict[str, Any], slo: float, quantile: str, max_error_rate: float) -> bool:
+    return (step["requests"] > 0 and step["latency"][quantile] <= slo
+            and step["error_rate"] <= max_error_rate
+            and step["achieved_rps"] >= 0.9 * step["arrival_rps"])
+
+def capacity_report(steps: List[Dict[str, Any]], slo: float, quantile: str = "p95",
+                    max_error_rate: float = 0.01) -> Dict[str, Any]:
+    """
+    Summarize a rate sweep
+
+    The sustainable rate is the highest offered rate that, like every lower
+    one, kept the latency quantile within the SLO, the error rate within
+    bounds and throughput within 10% of the arrival rate. The saturation
+    point is the first rate where throughput falls more than 10% behind the
+    arrival rate or the median latency doubles relative to the lowest rate.
+
+    Args:
+        steps: Results from run_step(), lowest rate first
+        slo: Latency objective in seconds
+        quantile: Latency percentile compared to the SLO ("p50" ... "p99")
+        max_error_rate: Highest acceptable error fraction
+    """
+    sustainable = None
+    for step in steps:
+        step["meets_slo"] = _meets_slo(step, slo, quantile, max_error_rate)
+    for step in steps:
+        if not step["meets_slo"]:
+            break
+        sustainable = step
+
+    saturation = None
+    baseline = steps[0]["latency"]["p50"] if steps else 0.0
+    for step in steps:
+        if (step["achieved_rps"] < 0.9 * step["arrival_rps"]
+                or (baseline and step["latency"]["p50"] > 2 * baseline)):
+            saturation = step
+            break
+
+    return {
+        "slo": {"seconds": slo, "quantile": quantile, "max_error_rate": max_error_rate},
+        "max_sustainable_rps": sustainable["offered_rps"] if sustainable else 0.0,
+        "sustainable_throughput_rps": sustainable["achieved_rps"] if sustainable else 0.0,
+        "saturation_rps": saturation["offered_rps"] if saturation else None,
+        "peak_throughput_rps": max((s["achieved_rps"] for s in steps), default=0.0),
+        "steps": steps,
+    }
+
+def sweep(target: Callable, workload: Workload, rates: List[float], duration: float, slo: float,
+          quantile: str = "p95", max_error_rate: float = 0.01, stop_after: int = 2,
+          max_inflight: int = 256, warmup: int = 3,
+          progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Run run_step() at increasing rates and build the capacity report
+
+    Args:
+        rates: Offered rates (requests/s), run in ascending order
+        stop_after: Stop after this many consecutive steps miss the SLO (0 = run all)
+        warmup: Requests sent before the sweep (model loads, connection setup)
+        progress: Called with each step result as it finishes
+    """
+    for _ in range(warmup):
+        try:
+            target(*workload.next()[1:])
+        except Exception:
+            pass
+    steps, misses = [], 0
+    for rate in sorted(rates):
+        step = run_step(target, workload, rate, duration, max_inflight)
+        steps.append(step)
+        misses = 0 if _meets_slo(step, slo, quantile, max_error_rate) else misses + 1
+        if progress:
+            progress(step)
+        if stop_after and misses >= stop_after:
+            break
+    return capacity_report(steps, slo, quantile, max_error_rate)
+
+def _print_step(step: Dict[str, Any]):
+    latency = step["latency"]
+    stages = " ".join(f"{k}={v:.0f}" for k, v in step["stages_ms"].items())
+    print(f"{step['offered_rps']:>8.1f}{step['achieved_rps']:>10.2f}{step['requests']:>7}"
+          f"{step['error_rate'] * 100:>7.1f}%" + "".join(f"{latency[q] * 1000:>9.0f}" for q in ("p50", "p95", "p99"))
+          + f"   {stages}", flush=True)
+
+def _print_report(report: Dict[str, Any]):
+    slo = report["slo"]
+    print(f"\nSLO: {slo['quantile']} <= {slo['seconds'] * 1000:.0f} ms, errors <= {slo['max_error_rate'] * 100:.1f}%")
+    print(f"max sustainable rate: {report['max_sustainable_rps']:.1f} req/s "
+          f"({report['sustainable_throughput_rps']:.2f} req/s achieved)")
+    saturation = report["saturation_rps"]
+    print(f"saturation point:     {f'{saturation:.1f} req/s' if saturation is not None else 'not reached'}")
+    print(f"peak throughput:      {report['peak_throughput_rps']:.2f} req/s")
+    errors = defaultdict(int)
+    for step in report["steps"]:
+        for name, count in step["errors"].items():
+            errors[name] += count
+    if errors:
+        print(f"errors: {dict(errors)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Open-loop load test with a capacity report")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running Flask or FastAPI app")
+    target.add_argument("--serve", choices=["flask", "fastapi"], help="Start the app with serve.py for the run")
+    parser.add_argument("--agent", default="base", help="Registry agent for in-process runs with --backend ollama")
+    parser.add_argument("--backend", choices=["stub", "ollama"], default="stub",
+                        help="Model backend for in-process and --serve runs")
+    parser.add_argument("--rates", default="1,2,4,8,16", help="Comma-separated offered rates (req/s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per rate step")
+    parser.add_argument("--mix", default="short=6,medium=3,long=1", help="Prompt profile weights")
+    parser.add_argument("--sessions", type=int, default=10, help="Pool of returning sessions")
+    parser.add_argument("--reuse", type=float, default=0.8, help="Fraction of requests from pooled sessions")
+    parser.add_argument("--slo", type=float, default=2.0, help="Latency objective in seconds")
+    parser.add_argument("--slo-quantile", default="p95", choices=["p50", "p90", "p95", "p99"])
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--stop-after", type=int, default=2,
+                        help="Stop after N consecutive steps miss the SLO (0 = run every rate)")
+    parser.add_argument("--max-inflight", type=int, default=256, help="Client threads")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --serve")
+    parser.add_argument("--port", type=int, default=8766, help="Port for --serve")
+    stub = parser.add_argument_group("stub backend")
+    stub.add_argument("--stub-latency", type=float, default=0.2, help="Seconds per model call")
+    stub.add_argument("--stub-jitter", type=float, default=0.05)
+    stub.add_argument("--stub-parallel", type=int, default=4, help="Concurrent generations")
+    stub.add_argument("--stub-prompt-tps", type=float, default=2000.0, help="Prompt tokens processed per second")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        workload = Workload(parse_mix(args.mix), args.sessions, args.reuse, args.seed)
+        rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+
+    client = StubClient(args.stub_latency, args.stub_jitter, seed=args.seed, parallel=args.stub_parallel,
+                        prompt_tokens_per_second=args.stub_prompt_tps)
+    server = backend = None
+    try:
+        if args.url:
+            run_target = HttpTarget(args.url)
+        elif args.serve:
+            env = dict(os.environ)
+            if args.backend == "stub":
+                backend = serve(client)
+                env["OLLAMA_HOST"] = f"http://127.0.0.1:{backend.server_port}"
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", args.serve, "--workers", str(args.workers),
+                 "--host", "127.0.0.1", "--port", str(args.port)],
+                cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            _wait_until_ready(f"http://127.0.0.1:{args.port}/health", timeout=60.0)
+            run_target = HttpTarget(f"http://127.0.0.1:{args.port}")
+        elif args.backend == "stub":
+            from agents.base_agent import BaseAgent
+            run_target = AgentTarget(BaseAgent(client=client))
+        else:
+            from agents.registry import get_agent
+            run_target = AgentTarget(get_agent(args.agent))
+
+        if not args.json:
+            print(f"{'offered':>8}{'achieved':>10}{'sent':>7}{'errors':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+                  "   mean stage ms")
+        report = sweep(run_target, workload, rates, args.duration, args.slo, args.slo_quantile,
+                       args.max_error_rate, args.stop_after, args.max_inflight,
+                       progress=None if args.json else _print_step)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+        if backend is not None:
+            backend.shutdown()
+
+    report["target"] = args.url or (f"{args.serve} (serve.py)" if args.serve else f"agent:{args.agent}")
+    report["backend"] = "external" if args.url else args.backend
+    report["mix"] = dict(workload.mix)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+    return 0 if report["max_sustainable_rps"] > 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
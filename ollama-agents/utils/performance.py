@@ -1,8 +1,11 @@
 # utils/performance.py
 import time
-import psutil
 from functools import wraps
 from typing import Dict, Any
+from agents.base_agent import BaseAgent
+from utils.lazy import lazy_import
+
+psutil = lazy_import("psutil")
 
 class PerformanceMonitor:
     def __init__(self):
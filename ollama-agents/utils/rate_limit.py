@@ -0,0 +1,251 @@
+# utils/rate_limit.py
+import os
+import math
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import AgentConfig
+
+@dataclass
+class BucketRule:
+    capacity: float          # maximum burst, in model tokens
+    refill_per_second: float # sustained model tokens per second
+
+    def __post_init__(self):
+        # A bucket that never refills would lock a client out for good
+        if self.capacity <= 0 or self.refill_per_second <= 0:
+            raise ValueError(f"Rate limit capacity and refill rate must be positive, got "
+                             f"({self.capacity}, {self.refill_per_second})")
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    retry_after: float = 0.0
+    scope: Optional[str] = None
+    charged: List[str] = field(default_factory=list)
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+def _refill(tokens: float, updated: float, rule: BucketRule, now: float) -> float:
+    return min(rule.capacity, tokens + (now - updated) * rule.refill_per_second)
+
+def _take(state: Optional[Tuple[float, float]], rule: BucketRule, cost: float,
+          now: float, force: bool) -> Tuple[Tuple[float, float], bool, float]:
+    """
+    Apply a charge to one bucket
+
+    A request is admitted while the bucket is positive, even if its cost
+    takes it negative; the debt is paid back before the next admission.
+    Forced charges (settling actual usage) always apply.
+
+    Returns:
+        New (tokens, updated) state, whether it was admitted, and the
+        seconds until the bucket is positive again
+    """
+    tokens, updated = state if state else (rule.capacity, now)
+    tokens = _refill(tokens, updated, rule, now)
+    if not force and tokens <= 0:
+        return (tokens, now), False, (-tokens + 1) / rule.refill_per_second
+    return (tokens - cost, now), True, 0.0
+
+class MemoryBucketStore:
+    """In-process bucket store (per worker)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: BucketRule, cost: float, now: float, force: bool = False) -> Tuple[bool, float]:
+        with self._lock:
+            state, allowed, wait = _take(self._buckets.get(key), rule, cost, now, force)
+            self._buckets[key] = state
+        return allowed, wait
+
+class SQLiteBucketStore:
+    """Bucket store shared by every worker on a host through one SQLite file
+
+    Connections are opened on first use, one per thread and process: a
+    connection inherited across fork (e.g. from a preloading master) must
+    not be used.
+    """
+
+    def __init__(self, path: str = "ratelimit.db"):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key: str, rule: BucketRule, cost: float, now: float, force: bool = False) -> Tuple[bool, float]:
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front so read-modify-write is atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            state, allowed, wait = _take(row, rule, cost, now, force)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, state[0], state[1]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, wait
+
+# Same algorithm as _take, run atomically inside Redis
+_REDIS_TAKE = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local force = ARGV[5] == '1'
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 1
+local wait = 0
+if not force and tokens <= 0 then
+    allowed = 0
+    wait = (-tokens + 1) / rate
+else
+    tokens = tokens - cost
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return {allowed, tostring(wait)}
+"""
+
+class RedisBucketStore:
+    """Bucket store shared across hosts through any Redis-compatible server"""
+
+    def __init__(self, client):
+        """
+        Args:
+            client: redis.Redis-compatible client (supports register_script or eval)
+        """
+        self.client = client
+        self._script = client.register_script(_REDIS_TAKE) if hasattr(client, "register_script") else None
+
+    def take(self, key: str, rule: BucketRule, cost: float, now: float, force: bool = False) -> Tuple[bool, float]:
+        args = [rule.capacity, rule.refill_per_second, cost, now, "1" if force else "0"]
+        if self._script is not None:
+            allowed, wait = self._script(keys=[key], args=args)
+        else:
+            allowed, wait = self.client.eval(_REDIS_TAKE, 1, key, *args)
+        return bool(int(allowed)), float(wait)
+
+def build_store(config: AgentConfig):
+    """Create the bucket store selected in config"""
+    if config.rate_limit_store == "sqlite":
+        return SQLiteBucketStore(config.rate_limit_sqlite_path)
+    if config.rate_limit_store == "redis":
+        import redis
+        return RedisBucketStore(redis.Redis.from_url(config.rate_limit_redis_url))
+    return MemoryBucketStore()
+
+class RateLimiter:
+    def __init__(self, rules: Dict[str, BucketRule], store=None, clock=time.time):
+        """
+        Token-bucket limiter weighted by model tokens
+
+        Args:
+            rules: Bucket rule per scope ("session", "api_key", "ip")
+            store: Bucket store (defaults to in-process memory)
+            clock: Time source, in seconds
+        """
+        self.rules = rules
+        self.store = store or MemoryBucketStore()
+        self.clock = clock
+
+    @classmethod
+    def from_config(cls, config: AgentConfig) -> 'RateLimiter':
+        rules = {scope: BucketRule(*limits) for scope, limits in config.rate_limits.items()}
+        return cls(rules, build_store(config))
+
+    def check(self, identities: Dict[str, Optional[str]], estimate: float) -> RateDecision:
+        """
+        Admit a request and reserve its estimated token cost
+
+        Args:
+            identities: Identity per scope, e.g. {"session": "abc", "ip": "1.2.3.4"}
+            estimate: Estimated model tokens for the request
+
+        Returns:
+            Decision; when denied, any reservations already made are refunded
+        """
+        now = self.clock()
+        charged = []
+        for scope, identity in identities.items():
+            rule = self.rules.get(scope)
+            if rule is None or not identity:
+                continue
+            key = f"rl:{scope}:{identity}"
+            allowed, wait = self.store.take(key, rule, estimate, now)
+            if not allowed:
+                for done in charged:
+                    self.store.take(done, self.rules[done.split(":")[1]], -estimate, now, force=True)
+                return RateDecision(False, wait, scope)
+            charged.append(key)
+        return RateDecision(True, charged=charged)
+
+    def settle(self, decision: RateDecision, estimate: float, actual: float):
+        """
+        Replace the estimated charge with the tokens Ollama actually reported
+
+        Args:
+            decision: Decision returned by check()
+            estimate: Estimate that was reserved
+            actual: prompt + completion tokens reported for the request
+        """
+        delta = actual - estimate
+        if not decision.allowed or not delta:
+            return
+        now = self.clock()
+        for key in decision.charged:
+            self.store.take(key, self.rules[key.split(":")[1]], delta, now, force=True)
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough prompt token estimate (about four characters per token)"""
+    return max(1, len(text or "") // 4)
+
+def estimate_request_tokens(data: Dict[str, Any]) -> int:
+    """Prompt token estimate for a /chat or /jobs body; every message of a job counts"""
+    messages = data.get("messages")
+    texts = [data.get("message")] + (messages if isinstance(messages, list) else [])
+    return estimate_tokens("".join(t for t in texts if isinstance(t, str)))
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter(config: Optional[AgentConfig] = None) -> RateLimiter:
+    """
+    Process-wide rate limiter
+
+    Shared so that background jobs settle their usage against the same
+    buckets the web layer charged when they were submitted.
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter.from_config(config or AgentConfig.from_env())
+    return _limiter
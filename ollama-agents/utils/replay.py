@@ -0,0 +1,224 @@
+# utils/replay.py
+"""
+Replay recorded agent traffic and report latency distributions.
+
+Record with AGENT_RECORD_PATH=traffic.jsonl, then:
+    python -m utils.replay traffic.jsonl                      # stub backend, recorded timings
+    python -m utils.replay traffic.jsonl --speed 4            # same arrivals, 4x faster
+    python -m utils.replay traffic.jsonl --target ollama      # real models via the agent
+    python -m utils.replay traffic.jsonl --target http://localhost:8000 --json > run.json
+
+Requests are sent open-loop at their recorded offsets divided by --speed
+(--speed 0 sends them back to back, limited only by --concurrency).
+Latency is measured from each request's scheduled time, so queueing in an
+overloaded system shows up in the numbers.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import contextvars
+import urllib.request
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.stub_backend import StubClient
+
+def load_records(path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Read recorded chat calls, oldest first, skipping damaged lines"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("message") is not None:
+                records.append(record)
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if values else 0.0,
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+
+class StubTarget:
+    def __init__(self, records: List[Dict[str, Any]]):
+        """
+        Drive a BaseAgent whose model and tools replay the recorded timings
+
+        The agent-layer code path (conversation building, retries, breakers,
+        tool execution) runs for real; only Ollama and the tools are stubbed.
+        """
+        from agents.base_agent import BaseAgent
+        from agents.tool_cache import CachePolicy
+
+        self.client = StubClient()
+        self.agent = BaseAgent(client=self.client)
+        # Tool timings of the record being replayed in this context, queued
+        # per tool name; tool threads run in a copy of the caller's context
+        self._tool_timings: contextvars.ContextVar = contextvars.ContextVar("replayed_tools")
+        self._lock = threading.Lock()
+        for name in sorted({e["name"] for r in records for e in r["events"] if e["kind"] == "tool"}):
+            # Not cached: every recorded call has to spend its recorded time
+            self.agent.register_tool(
+                {"type": "function", "function": {"name": name, "parameters": {"type": "object"}}},
+                self._tool(name),
+                CachePolicy(),
+            )
+
+    def _tool(self, name: str) -> Callable:
+        def replayed_tool(**kwargs):
+            with self._lock:
+                queue = self._tool_timings.get()[name]
+                event = queue.popleft() if queue else {"seconds": 0.0, "chars": 0, "error": False}
+            time.sleep(event["seconds"])
+            return "Error: replayed failure" if event.get("error") else "x" * event["chars"]
+        return replayed_tool
+
+    def __call__(self, record: Dict[str, Any]) -> str:
+        timings: Dict[str, deque] = defaultdict(deque)
+        for event in record["events"]:
+            if event["kind"] == "tool":
+                timings[event["name"]].append(event)
+        token = self._tool_timings.set(timings)
+        try:
+            self.client.play([e for e in record["events"] if e["kind"] == "model"])
+            return self.agent.chat(record["message"])
+        finally:
+            self._tool_timings.reset(token)
+
+class AgentTarget:
+    def __init__(self, name: str):
+        """Drive a registry agent against the configured Ollama backend"""
+        from agents.registry import get_agent
+        self.agent = get_agent(name)
+
+    def __call__(self, record: Dict[str, Any]) -> str:
+        return self.agent.chat(record["message"])
+
+class HttpTarget:
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        """POST each message to a running Flask or FastAPI app"""
+        self.url = base_url.rstrip("/") + "/chat"
+        self.timeout = timeout
+
+    def __call__(self, record: Dict[str, Any]) -> str:
+        body = json.dumps({"message": record["message"], "session_id": record.get("session") or "replay"})
+        request = urllib.request.Request(self.url, data=body.encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())["response"]
+
+def build_target(target: str, records: List[Dict[str, Any]], agent: str) -> Callable:
+    if target == "stub":
+        return StubTarget(records)
+    if target == "ollama":
+        return AgentTarget(agent)
+    return HttpTarget(target)
+
+def replay(records: List[Dict[str, Any]], target: Callable, speed: float = 1.0,
+           concurrency: int = 64) -> Dict[str, Any]:
+    """
+    Re-drive recorded traffic against a target
+
+    Args:
+        records: Recorded chat calls from load_records()
+        target: Callable taking a record and returning the answer
+        speed: Arrival-rate multiplier (0 = as fast as possible)
+        concurrency: Maximum requests in flight
+
+    Returns:
+        Latency summaries for the replay and the original recording
+    """
+    latencies: List[float] = []
+    queue_delays: List[float] = []
+    errors: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    t0 = records[0]["t"] if records else 0.0
+
+    def run(record: Dict[str, Any], scheduled: float):
+        started = time.perf_counter()
+        error = None
+        try:
+            target(record)
+        except Exception as e:
+            error = type(e).__name__
+        finished = time.perf_counter()
+        with lock:
+            queue_delays.append(started - scheduled)
+            if error:
+                errors[error] += 1
+            else:
+                latencies.append(finished - scheduled)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as pool:
+        for record in records:
+            scheduled = start + ((record["t"] - t0) / speed if speed else 0.0)
+            wait = scheduled - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            pool.submit(run, record, max(scheduled, start))
+    elapsed = time.perf_counter() - start
+
+    recorded = [r["seconds"] for r in records if not r.get("error")]
+    return {
+        "requests": len(records),
+        "completed": len(latencies),
+        "errors": dict(errors),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "queue_delay": summarize(queue_delays),
+        "recorded_latency": summarize(recorded),
+    }
+
+def _print_report(result: Dict[str, Any]):
+    print(f"requests: {result['requests']}  completed: {result['completed']}  "
+          f"errors: {sum(result['errors'].values())} {result['errors'] or ''}")
+    print(f"elapsed: {result['elapsed_seconds']:.2f} s  throughput: {result['throughput_rps']:.2f} req/s")
+    print(f"{'':<16}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for label, key in (("replay", "latency"), ("queue delay", "queue_delay"), ("recorded", "recorded_latency")):
+        row = result[key]
+        print(f"{label:<16}" + "".join(f"{row[q] * 1000:>9.1f}" for q in ("p50", "p90", "p95", "p99", "max")))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded agent traffic")
+    parser.add_argument("path", help="JSONL file written with AGENT_RECORD_PATH")
+    parser.add_argument("--target", default="stub",
+                        help="stub (recorded timings), ollama (real agent) or an app URL")
+    parser.add_argument("--agent", default="base", help="Registry agent for --target ollama")
+    parser.add_argument("--speed", type=float, default=1.0, help="Arrival-rate multiplier; 0 = back to back")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    records = load_records(args.path, args.limit)
+    if not records:
+        sys.exit(f"No recorded requests in {args.path}")
+    result = replay(records, build_target(args.target, records, args.agent), args.speed, args.concurrency)
+    result["target"] = args.target
+    result["speed"] = args.speed
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# utils/stub_backend.py
+"""
+Ollama-compatible stand-in for load tests and CI.
+
+StubClient answers chat() and embed() like ollama.Client without a model
+server: it sleeps for a configured (or scripted) time and returns canned
+content with plausible token counts. serve() exposes a StubClient over
+Ollama's HTTP API, so the web apps can run unchanged against it:
+
+    python -m utils.stub_backend --port 11435 --parallel 4
+    OLLAMA_HOST=http://127.0.0.1:11435 python serve.py flask
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+def _tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+class StubClient:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, tokens_per_second: float = 0.0,
+                 reply: str = "This is a stub response.", seed: Optional[int] = None,
+                 prompt_tokens_per_second: float = 0.0, parallel: int = 0):
+        """
+        Fake Ollama backend
+
+        Args:
+            latency: Base seconds per chat call (time to first token when streaming)
+            jitter: Extra uniformly random seconds added to each call
+            tokens_per_second: Generation speed for the reply (0 = instant)
+            reply: Content returned when no script is active
+            seed: Random seed for jitter
+            prompt_tokens_per_second: Prompt processing speed, so long prompts
+                                      take longer (0 = instant)
+            parallel: Requests generated at once, like OLLAMA_NUM_PARALLEL;
+                      further calls wait for a slot (0 = unlimited)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.reply = reply
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+
+    @contextmanager
+    def _slot(self):
+        if self._slots is None:
+            yield
+            return
+        with self._slots:
+            yield
+
+    def play(self, events: List[Dict[str, Any]]):
+        """
+        Script the next model calls made from this thread
+
+        Args:
+            events: Recorded model events ({"seconds", "chars", "tool_calls", ...};
+                    "content" sets the exact reply), consumed one per chat() call
+        """
+        self._local.script = deque(events)
+
+    def _next_event(self) -> Optional[Dict[str, Any]]:
+        script: Optional[Deque] = getattr(self._local, "script", None)
+        return script.popleft() if script else None
+
+    def _delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        return self.latency + extra
+
+    def chat(self, model: str = "", messages: Optional[List[Dict]] = None, tools: Optional[List] = None,
+             stream: bool = False, **kwargs) -> Any:
+        """Return a chat response (or a stream of chunks) after the configured delay"""
+        messages = messages or []
+        prompt_tokens = sum(_tokens(str(m.get("content") or "")) for m in messages)
+        event = self._next_event()
+        if event is not None:
+            delay = event.get("seconds", 0.0)
+            content = event["content"] if "content" in event else "x" * event.get("chars", 0)
+            tool_calls = [
+                {"function": {"name": c["name"], "arguments": c.get("arguments") or {}}}
+                for c in event.get("tool_calls") or []
+            ] if tools else []
+            completion_tokens = event.get("completion_tokens") or _tokens(content)
+            prompt_tokens = event.get("prompt_tokens") or prompt_tokens
+            with self._lock:
+                self.calls += 1
+        else:
+            delay = self._delay()
+            if self.prompt_tokens_per_second:
+                delay += prompt_tokens / self.prompt_tokens_per_second
+            content = self.reply
+            tool_calls = []
+            completion_tokens = _tokens(content)
+
+        if stream:
+            return self._stream(model, content, delay, prompt_tokens, completion_tokens, tool_calls)
+
+        with self._slot():
+            time.sleep(delay + (completion_tokens / self.tokens_per_second if self.tokens_per_second else 0.0))
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return {
+            "model": model,
+            "message": message,
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": completion_tokens,
+            "total_duration": int(delay * 1e9),
+        }
+
+    def _stream(self, model: str, content: str, delay: float, prompt_tokens: int,
+                completion_tokens: int, tool_calls: List[Dict]) -> Iterator[Dict[str, Any]]:
+        with self._slot():
+            time.sleep(delay)
+            words = content.split(" ") or [""]
+            per_word = (completion_tokens / self.tokens_per_second / len(words)) if self.tokens_per_second else 0.0
+            for i, word in enumerate(words):
+                if per_word:
+                    time.sleep(per_word)
+                yield {"model": model, "message": {"role": "assistant", "content": word if i == 0 else " " + word},
+                       "done": False}
+        final = {"role": "assistant", "content": ""}
+        if tool_calls:
+            final["tool_calls"] = tool_calls
+        yield {"model": model, "message": final, "done": True,
+               "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens}
+
+    def embed(self, model: str = "", input: Any = "", **kwargs) -> Dict[str, Any]:
+        """Deterministic 64-dimension embeddings derived from a hash of each text"""
+        texts = [input] if isinstance(input, str) else list(input)
+        embeddings = []
+        for text in texts:
+            digest = hashlib.sha512(text.encode("utf-8")).digest()
+            embeddings.append([b / 255.0 - 0.5 for b in digest])
+        return {"model": model, "embeddings": embeddings}
+
+    def list(self) -> Dict[str, Any]:
+        return {"models": [{"model": "stub", "name": "stub"}]}
+
+    def ps(self) -> Dict[str, Any]:
+        return {"models": []}
+
+class _Handler(BaseHTTPRequestHandler):
+    """Ollama's /api routes backed by the server's StubClient"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: Any, status: int = 200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        client = self.server.client
+        routes = {"/api/tags": client.list, "/api/ps": client.ps, "/api/version": lambda: {"version": "stub"}}
+        if self.path in routes:
+            self._send_json(routes[self.path]())
+        elif self.path == "/":
+            self._send_json("Ollama is running")
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        client = self.server.client
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+        if self.path == "/api/chat":
+            stream = body.get("stream", True)
+            result = client.chat(model=body.get("model", ""), messages=body.get("messages"),
+                                 tools=body.get("tools"), stream=stream)
+            if not stream:
+                self._send_json(result)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in result:
+                line = json.dumps(chunk).encode("utf-8") + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path == "/api/embed":
+            self._send_json(client.embed(model=body.get("model", ""), input=body.get("input", "")))
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+def serve(client: Optional[StubClient] = None, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve a StubClient over Ollama's HTTP API from a background thread
+
+    Args:
+        client: Backend to expose (default StubClient())
+        host: Interface to bind
+        port: Port to bind (0 = any free port)
+
+    Returns:
+        The running server; its URL is http://host:server.server_port.
+        Call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.client = client or StubClient()
+    threading.Thread(target=server.serve_forever, name="stub-backend", daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="Base seconds per chat call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--parallel", type=int, default=0, help="Concurrent generations (0 = unlimited)")
+    args = parser.parse_args(argv)
+
+    server = serve(StubClient(args.latency, args.jitter, args.tokens_per_second,
+                              prompt_tokens_per_second=args.prompt_tokens_per_second,
+                              parallel=args.parallel), args.host, args.port)
+    print(f"Stub Ollama listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,27 @@
 <#
-Simple build script to concatenate CSS and JS into `ollama-agents/app/static/build`.
+Build the static bundles in `ollama-agents/app/static/build`.
 Usage:
   .\scripts\build_static.ps1          # build bundles (no minify)
-  .\scripts\build_static.ps1 -Minify  # build bundles with simple minification
+  .\scripts\build_static.ps1 -Minify  # build minified bundles
 
-Note: This is a lightweight script intended for development. It performs
-basic concatenation and a very small whitespace/comment stripping when
-`-Minify` is supplied. For production-grade minification use tools such as
-`cssnano` and `terser`.
+The build itself lives in `ollama-agents/app/assets.py` and runs anywhere
+Python does (on Linux/macOS: `cd ollama-agents && python -m app.assets`).
+It writes content-hashed bundles, .gz/.br variants and manifest.json.
 #>
 param(
     [switch]$Minify
 )
 
 $scriptDir = Split-Path -Parent $MyInvocation.MyCommand.Definition
-$repoRoot = Resolve-Path (Join-Path $scriptDir "..")
-$staticDir = Join-Path $repoRoot "ollama-agents\app\static"
-$buildDir = Join-Path $staticDir "build"
+$appRoot = Resolve-Path (Join-Path $scriptDir "..\ollama-agents")
 
-if (-not (Test-Path $staticDir)) {
-    Write-Error "Static directory not found: $staticDir"
-    exit 1
-}
-
-New-Item -ItemType Directory -Force -Path $buildDir | Out-Null
-
-# CSS bundle
-$cssFiles = @(
-    Join-Path $staticDir 'style.css',
-    Join-Path $staticDir 'dropdown.css'
-)
-$cssOut = Join-Path $buildDir 'main.bundle.css'
+$buildArgs = @("-m", "app.assets")
+if (-not $Minify) { $buildArgs += "--no-minify" }
 
-$cssContents = @()
-foreach ($f in $cssFiles) {
-    if (Test-Path $f) {
-        $cssContents += Get-Content -Raw -Encoding UTF8 $f
-        $cssContents += "\n" # separator
-    } else {
-        Write-Host "Warning: CSS file missing, skipping: $f"
-    }
+Push-Location $appRoot
+try {
+    & python @buildArgs
+    if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
+} finally {
+    Pop-Location
 }
-
-$cssText = $cssContents -join "\n"
-if ($Minify) {
-    # Very small "minify": remove /* ... */ comments and blank lines
-    $cssText = [regex]::Replace($cssText, '/\*.*?\*/', '', [System.Text.RegularExpressions.RegexOptions]::Singleline)
-    $cssText = ($cssText -split "\r?\n" | ForEach-Object { $_.Trim() } | Where-Object { $_ -ne '' }) -join "`n"
-}
-
-Set-Content -Path $cssOut -Value $cssText -Encoding UTF8 -Force
-Write-Host "Wrote CSS bundle: $cssOut"
-
-# JS bundle
-$jsFiles = @(
-    Join-Path $staticDir 'dropdown.js'
-)
-$jsOut = Join-Path $buildDir 'main.bundle.js'
-
-$jsContents = @()
-foreach ($f in $jsFiles) {
-    if (Test-Path $f) {
-        $jsContents += Get-Content -Raw -Encoding UTF8 $f
-        $jsContents += "\n" # separator
-    } else {
-        Write-Host "Warning: JS file missing, skipping: $f"
-    }
-}
-
-$jsText = $jsContents -join "\n"
-if ($Minify) {
-    # Naive JS minify: remove /* */ and // comments and collapse blank lines
-    $jsText = [regex]::Replace($jsText, '/\*.*?\*/', '', [System.Text.RegularExpressions.RegexOptions]::Singleline)
-    $jsText = [regex]::Replace($jsText, '//.*?$', '', [System.Text.RegularExpressions.RegexOptions]::Multiline)
-    $jsText = ($jsText -split "\r?\n" | ForEach-Object { $_.Trim() } | Where-Object { $_ -ne '' }) -join "`n"
-}
-
-Set-Content -Path $jsOut -Value $jsText -Encoding UTF8 -Force
-Write-Host "Wrote JS bundle: $jsOut"
-
-Write-Host "Build complete."
-if ($Minify) { Write-Host "Note: minification performed with a simple regex-based pass. For production, use a proper minifier." }